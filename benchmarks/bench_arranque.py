@@ -0,0 +1,94 @@
+"""
+Benchmark de arranque: cuánto tarda importar los puntos de entrada.
+
+Importa cada módulo en un intérprete nuevo (varias veces, se toma la
+mediana) y comprueba que:
+  - el tiempo quede dentro del presupuesto (--presupuesto-ms),
+  - no se hayan cargado dependencias pesadas en el import
+    (pandas, pdfplumber, openai, pydantic, pypdf, prometheus_client),
+  - importar config no cree carpetas ni lea el .env/JSON.
+
+Sale con código 1 si algo se pasa del presupuesto, para usarlo en CI.
+
+Uso:
+    python -m benchmarks.bench_arranque --presupuesto-ms 150
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+MODULOS = (
+    "config",
+    "src.agente_supervisor",
+    "src.ui_consola_cafe",
+)
+PESADOS = ("pandas", "pdfplumber", "pdfminer", "openai", "pydantic", "pypdf", "prometheus_client")
+
+_SONDA = """
+import json, sys, time
+t0 = time.perf_counter()
+import {modulo}
+dt = time.perf_counter() - t0
+cfg = sys.modules["config"]
+print(json.dumps({{
+    "segundos": dt,
+    "pesados": [m for m in {pesados!r} if m in sys.modules],
+    "config_resuelta": getattr(cfg, "_CONFIG", None) is not None,
+}}))
+"""
+
+
+def medir(modulo: str, repeticiones: int) -> dict:
+    codigo = _SONDA.format(modulo=modulo, pesados=PESADOS)
+    tiempos = []
+    ultimo = {}
+    for _ in range(repeticiones):
+        salida = subprocess.run(
+            [sys.executable, "-c", codigo],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        )
+        ultimo = json.loads(salida.stdout.strip().splitlines()[-1])
+        tiempos.append(ultimo["segundos"])
+    return {
+        "modulo": modulo,
+        "mediana_ms": round(1000 * statistics.median(tiempos), 1),
+        "pesados": ultimo["pesados"],
+        "config_resuelta": ultimo["config_resuelta"],
+    }
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Tiempo de arranque de los puntos de entrada.")
+    p.add_argument("--presupuesto-ms", type=float, default=150.0,
+                   help="Tiempo máximo de import permitido por módulo (mediana).")
+    p.add_argument("--repeticiones", type=int, default=7)
+    args = p.parse_args(argv)
+
+    fallas = 0
+    for modulo in MODULOS:
+        r = medir(modulo, args.repeticiones)
+        problemas = []
+        if r["mediana_ms"] > args.presupuesto_ms:
+            problemas.append(f"supera {args.presupuesto_ms:.0f} ms")
+        if r["pesados"]:
+            problemas.append("importa " + ", ".join(r["pesados"]))
+        if r["config_resuelta"]:
+            problemas.append("resuelve CONFIG al importar")
+
+        estado = "OK " if not problemas else "MAL"
+        print(f"[{estado}] {modulo:<24} {r['mediana_ms']:>7.1f} ms  {'; '.join(problemas)}")
+        fallas += bool(problemas)
+
+    return 1 if fallas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
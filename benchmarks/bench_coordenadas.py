@@ -0,0 +1,110 @@
+"""
+Motores del PDF: "regex" (texto armado) vs. "coordenadas" (grilla de palabras).
+
+Para cada motor de extractor_pdf.MOTORES_PDF mide el tiempo por factura de
+parse_pdf_invoice (mejor de --repeticiones) y, para "coordenadas", cuánto
+tarda armar la grilla de una página y cada búsqueda etiqueta -> valor.
+Cuenta, por campo, en cuántas facturas los motores dan distinto y cuál
+coincide con el XML.
+
+Uso:
+    python -m benchmarks.bench_coordenadas --corpus datos_adjuntos
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from benchmarks.bench_pipeline import BASE_DIR, _extraer_parejas, _zips
+
+CAMPOS = ("cufe", "nit_emisor", "fecha_emision", "subtotal", "impuestos", "total")
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark de motores de extracción PDF CAFE.")
+    p.add_argument("--corpus", type=Path, required=True, help="Carpeta con ZIPs.")
+    p.add_argument("--limite", type=int, default=None, help="Máximo de ZIPs a usar.")
+    p.add_argument("--repeticiones", type=int, default=3)
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, str(BASE_DIR))
+    from src import extractor_coordenadas as coord
+    from src.extractor_pdf import MOTORES_PDF, abrir_pdf, parse_pdf_invoice
+    from src.extractor_xml import parse_xml_invoice
+    from src.normalizacion import normalizar_monto, normalizar_nit
+
+    with tempfile.TemporaryDirectory(prefix="cafe_bench_coord_") as tmp:
+        parejas = _extraer_parejas(_zips(args.corpus, args.limite), Path(tmp))
+        contenidos = [(pdf, pdf.read_bytes(), parse_xml_invoice(xml)) for pdf, xml in parejas]
+        n = len(contenidos) or 1
+        print(f"{len(contenidos)} PDF\n")
+        print(f"{'motor':<12} {'ms/fact':>9}")
+
+        resultados = {}
+        for motor in MOTORES_PDF:
+            segundos = float("inf")
+            for _ in range(args.repeticiones):
+                t0 = time.perf_counter()
+                resultados[motor] = [
+                    parse_pdf_invoice(pdf, contenido=datos, motor=motor)
+                    for pdf, datos, _ in contenidos
+                ]
+                segundos = min(segundos, time.perf_counter() - t0)
+            print(f"{motor:<12} {segundos / n * 1e3:>9.2f}")
+
+        # Grilla y búsquedas (la página ya leída por pdfplumber)
+        paginas = armado = busquedas = 0
+        consultas = 0
+        for pdf_path, datos, _ in contenidos:
+            with abrir_pdf(pdf_path, datos) as pdf:
+                for page in pdf.pages:
+                    palabras = page.extract_words()
+                    t0 = time.perf_counter()
+                    indice = coord.IndicePalabras(palabras, float(page.width))
+                    armado += time.perf_counter() - t0
+                    paginas += 1
+                    t0 = time.perf_counter()
+                    for campo, regex in (
+                        ("cufe", coord.PALABRA_CUFE), ("nit_emisor", coord.PALABRA_NIT),
+                        ("subtotal", coord.PALABRA_MONTO), ("impuestos", coord.PALABRA_MONTO),
+                        ("total", coord.PALABRA_MONTO),
+                    ):
+                        coord._valores([indice], campo, regex)
+                        consultas += 1
+                    busquedas += time.perf_counter() - t0
+        print(f"\ngrilla: {armado / max(paginas, 1) * 1e3:.3f} ms/página, "
+              f"búsqueda: {busquedas / max(consultas, 1) * 1e3:.3f} ms/campo\n")
+
+        # Diferencias entre motores y cuál coincide con el XML
+        distintos, con_xml = Counter(), Counter()
+        for i, (_, _, xml) in enumerate(contenidos):
+            a, b = resultados["regex"][i], resultados["coordenadas"][i]
+            for campo in CAMPOS:
+                if a[campo] == b[campo]:
+                    continue
+                distintos[campo] += 1
+                if campo == "nit_emisor":
+                    esperado = normalizar_nit(xml.get(campo))
+                    norma = normalizar_nit
+                elif campo in ("subtotal", "impuestos", "total"):
+                    esperado = normalizar_monto(xml.get(campo))
+                    norma = normalizar_monto
+                else:
+                    esperado, norma = xml.get(campo), (lambda v: v)
+                for motor, valor in (("regex", a[campo]), ("coordenadas", b[campo])):
+                    if valor is not None and norma(valor) == esperado:
+                        con_xml[(campo, motor)] += 1
+        print(f"{'campo':<14} {'distintos':>9} {'regex=XML':>10} {'coord=XML':>10}")
+        for campo in CAMPOS:
+            print(f"{campo:<14} {distintos[campo]:>9} {con_xml[(campo, 'regex')]:>10} "
+                  f"{con_xml[(campo, 'coordenadas')]:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Consultas sobre el índice SQLite de resultados (src/indice_resultados.py).
+
+Llena un índice temporal con --facturas facturas sintéticas (NIT, fechas,
+totales y campos a revisar con la forma de las reales) y mide, para cada
+consulta típica, la primera página, una página siguiente (cursor) y el
+conteo, en ms (mejor de --repeticiones).
+
+Uso:
+    python -m benchmarks.bench_indice --facturas 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from benchmarks.bench_pipeline import BASE_DIR
+
+
+def _resultados(n: int, nits: int, semilla: int = 7):
+    rnd = random.Random(semilla)
+    lista_nits = [str(rnd.randint(800_000_000, 999_999_999)) for _ in range(nits)]
+    for i in range(n):
+        campos = []
+        if rnd.random() < 0.15:
+            campos = rnd.sample(["subtotal", "impuestos", "total", "nit_emisor", "fecha_emision"],
+                                rnd.randint(1, 2))
+        fecha = f"{rnd.randint(2022, 2025)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}"
+        yield {
+            "id_factura": f"f{i:08d}",
+            "xml_raw": {},
+            "conciliacion": {
+                "nit_emisor": {"valor_resuelto": rnd.choice(lista_nits)},
+                "cufe": {"valor_resuelto": f"{rnd.getrandbits(192):048x}"},
+                "fecha_emision": {"valor_resuelto": fecha},
+                "total": {"valor_resuelto": Decimal(rnd.randint(10_000, 90_000_000_00)).scaleb(-2)},
+            },
+            "requiere_revision_global": bool(campos),
+            "campos_a_revisar": campos,
+            "error": None,
+        }, f"lote{i // 50:06d}", "revision" if campos else "ok"
+
+
+def _medir(fn, repeticiones: int) -> tuple[float, object]:
+    mejor, salida = float("inf"), None
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        salida = fn()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor, salida
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark del índice de resultados CAFE.")
+    p.add_argument("--facturas", type=int, default=200_000)
+    p.add_argument("--nits", type=int, default=2_000, help="Emisores distintos.")
+    p.add_argument("--repeticiones", type=int, default=5)
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, str(BASE_DIR))
+    from src.indice_resultados import IndiceResultados, _fila
+
+    with tempfile.TemporaryDirectory(prefix="cafe_bench_indice_") as tmp:
+        with IndiceResultados(Path(tmp) / "indice.sqlite") as indice:
+            t0 = time.perf_counter()
+            filas, nit, cufe = [], None, None
+            for res, lote, estado in _resultados(args.facturas, args.nits):
+                filas.append(_fila(res, lote, "", estado))
+                if len(filas) == 10_000:
+                    indice._guardar(filas)
+                    filas = []
+                nit = nit or res["conciliacion"]["nit_emisor"]["valor_resuelto"]
+                cufe = res["conciliacion"]["cufe"]["valor_resuelto"]
+            indice._guardar(filas)
+            carga = time.perf_counter() - t0
+            print(f"{args.facturas} facturas indexadas en {carga:.1f} s "
+                  f"({args.facturas / carga:,.0f}/s)\n")
+
+            consultas = (
+                ("NIT", {"nit": nit}),
+                ("NIT + trimestre + total", {"nit": nit, "desde": "2025-01-01",
+                                             "hasta": "2025-03-31", "campo": "total"}),
+                ("CUFE", {"cufe": cufe}),
+                ("rango de fechas", {"desde": "2024-02-01", "hasta": "2024-02-07"}),
+                ("rango de totales", {"total_min": "1000000", "total_max": "1005000"}),
+                ("estado revisión", {"estado": "revision"}),
+                ("campo a revisar", {"campo": "impuestos"}),
+            )
+            print(f"{'consulta':<26} {'página 1':>9} {'página 2':>9} {'contar':>9} {'filas':>9}")
+            for nombre, filtros in consultas:
+                t1, pagina = _medir(lambda: indice.consultar(**filtros), args.repeticiones)
+                t2 = float("nan")
+                if pagina["siguiente"] is not None:
+                    t2, _ = _medir(
+                        lambda: indice.consultar(cursor=pagina["siguiente"], **filtros),
+                        args.repeticiones,
+                    )
+                tc, n = _medir(lambda: indice.contar(**filtros), args.repeticiones)
+                print(f"{nombre:<26} {t1 * 1e3:>7.2f}ms {t2 * 1e3:>7.2f}ms {tc * 1e3:>7.2f}ms {n:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+Microbenchmark de normalizacion.py: escalar vs. por lote.
+
+Para NIT, montos, fechas y montos en centavos (punto fijo) mide, en µs por valor:
+  - referencia:  la implementación anterior (sin caché; fechas probando
+                 strptime con excepciones),
+  - escalar frío: con la caché LRU vacía (cada valor distinto se calcula),
+  - escalar:      con la caché ya caliente (caso típico: PDF y XML repiten
+                  valores y los proveedores se repiten entre facturas),
+  - lote (lista) y lote (Series): normalizar_nits/montos/fechas.
+y verifica que todas den exactamente lo mismo que la referencia.
+
+Los valores son sintéticos con la forma de los que salen de los
+extractores; --distintos controla cuántos valores distintos hay.
+
+Uso:
+    python -m benchmarks.bench_normalizacion --n 20000 --distintos 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from benchmarks.bench_pipeline import BASE_DIR
+
+
+# ==== Referencia (implementación previa a la caché) ====
+def _nit_referencia(nit):
+    import re
+
+    if not nit:
+        return None
+    return re.sub(r"\D", "", nit) or None
+
+
+def _monto_referencia(monto):
+    import re
+
+    if monto is None:
+        return None
+    texto = monto.strip().replace(" ", "")
+    if not texto:
+        return None
+    if re.match(r"^\d+([.,]\d{1,2})?$", texto):
+        try:
+            return Decimal(texto.replace(",", "."))
+        except InvalidOperation:
+            return None
+    solo_digitos = re.sub(r"[.,]", "", texto)
+    if not solo_digitos:
+        return None
+    try:
+        return Decimal(solo_digitos)
+    except InvalidOperation:
+        return None
+
+
+def _fecha_referencia(fecha):
+    if not fecha:
+        return None
+    for fmt in ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"]:
+        try:
+            return datetime.strptime(fecha.strip(), fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+def _centavos_referencia(monto):
+    d = _monto_referencia(monto)
+    return 0 if d is None else int(d * 100)
+
+
+# ==== Datos ====
+def _valores(n: int, distintos: int, semilla: int = 7) -> dict[str, list]:
+    rnd = random.Random(semilla)
+
+    def nit():
+        base = f"{rnd.randint(800_000_000, 999_999_999)}"
+        return rnd.choice([base, f"{base[:3]}.{base[3:6]}.{base[6:]}-{rnd.randint(0, 9)}", f"NIT {base}"])
+
+    def monto():
+        n_ = rnd.randint(1_000, 90_000_000)
+        return rnd.choice([f"{n_}.00", f"{n_:,}".replace(",", "."), f"{n_:,}.00", f"{n_},50", str(n_)])
+
+    def fecha():
+        y, m, d = rnd.randint(2020, 2025), rnd.randint(1, 12), rnd.randint(1, 28)
+        return rnd.choice([f"{y}-{m:02d}-{d:02d}", f"{d:02d}/{m:02d}/{y}", f"{d:02d}-{m:02d}-{y}", "", "N/A"])
+
+    datos = {}
+    for nombre, gen in (("nit", nit), ("monto", monto), ("fecha", fecha)):
+        pool = [gen() for _ in range(distintos)] + [None]
+        datos[nombre] = [rnd.choice(pool) for _ in range(n)]
+    return datos
+
+
+def _medir(fn, repeticiones: int, antes=None) -> tuple[float, object]:
+    mejor, salida = float("inf"), None
+    for _ in range(repeticiones):
+        if antes:
+            antes()
+        t0 = time.perf_counter()
+        salida = fn()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor, salida
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Microbenchmark de normalización CAFE.")
+    p.add_argument("--n", type=int, default=20000, help="Valores por campo.")
+    p.add_argument("--distintos", type=int, default=500, help="Valores distintos por campo.")
+    p.add_argument("--repeticiones", type=int, default=5)
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, str(BASE_DIR))
+    import pandas as pd
+
+    from src import normalizacion as N
+
+    casos = (
+        ("nit", _nit_referencia, N.normalizar_nit, N.normalizar_nits, N._nit_desde_texto),
+        ("monto", _monto_referencia, N.normalizar_monto, N.normalizar_montos, N._monto_desde_texto),
+        ("fecha", _fecha_referencia, N.normalizar_fecha, N.normalizar_fechas, N._fecha_desde_texto),
+        # Punto fijo: mismo valor que el Decimal de referencia, en centavos
+        ("monto¢", _centavos_referencia, N.normalizar_monto_centavos,
+         lambda v: N.normalizar_montos_centavos(v)[0], N._centavos_desde_texto),
+    )
+    datos = _valores(args.n, args.distintos)
+    print(f"{args.n} valores por campo, {args.distintos} distintos (µs por valor)\n")
+    print(f"{'campo':<6} {'referencia':>10} {'esc. frío':>10} {'escalar':>10} {'lote':>10} {'lote Series':>12}  igual")
+
+    fallos = 0
+    for nombre, referencia, escalar, lote, cacheada in casos:
+        valores = datos[nombre.rstrip("¢")]
+        serie = pd.Series(valores, dtype=object)
+        esperado = [referencia(v) for v in valores]
+
+        t_ref, _ = _medir(lambda: [referencia(v) for v in valores], args.repeticiones)
+        t_frio, _ = _medir(lambda: [escalar(v) for v in valores], args.repeticiones, antes=cacheada.cache_clear)
+        t_esc, r_esc = _medir(lambda: [escalar(v) for v in valores], args.repeticiones)
+        t_lote, r_lote = _medir(lambda: lote(valores), args.repeticiones)
+        t_serie, r_serie = _medir(lambda: lote(serie), args.repeticiones)
+
+        if nombre == "monto¢":
+            r_esc = [0 if c is None else c for c in r_esc]
+        igual = all(
+            [str(x) for x in r] == [str(x) for x in esperado] and r == esperado
+            for r in (r_esc, list(r_lote), list(r_serie))
+        )
+        fallos += not igual
+        n = len(valores) or 1
+        print(
+            f"{nombre:<6} {t_ref / n * 1e6:>10.2f} {t_frio / n * 1e6:>10.2f} {t_esc / n * 1e6:>10.2f} "
+            f"{t_lote / n * 1e6:>10.2f} {t_serie / n * 1e6:>12.2f}  {'OK' if igual else 'FALLA'}"
+        )
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Benchmark reproducible del pipeline CAFE.
+
+Mide por separado, cada etapa en su propio subproceso (RSS pico limpio):
+  - xml:          parse_xml_invoice
+  - pdf:          parse_pdf_invoice
+  - conciliacion: conciliar_factura sobre extracciones ya hechas
+  - agente:       AgenteSupervisor.ciclo_principal de punta a punta
+
+Cada corrida agrega una línea por etapa a data/logs/bench_historial.jsonl
+con el commit actual, facturas/seg y RSS pico, para comparar entre commits.
+
+La etapa agente acepta --workers y --planificacion (costo | nombre) y
+reporta la utilización lograda de los workers, la cola final y, con
+workers > 1, el RSS pico por worker y cuántas veces se reciclaron.
+
+Uso:
+    python -m benchmarks.generar_corpus --facturas 1000 --salida corpus_1k
+    python -m benchmarks.bench_pipeline --corpus corpus_1k
+    python -m benchmarks.bench_pipeline --corpus corpus_1k --etapas agente --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ETAPAS = ("xml", "pdf", "conciliacion", "agente")
+HISTORIAL_DEFECTO = BASE_DIR / "data" / "logs" / "bench_historial.jsonl"
+
+
+def rss_pico_mb() -> float:
+    """RSS pico del proceso actual en MB."""
+    try:
+        import resource
+
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta KB; macOS reporta bytes
+        return pico / 1024 / (1024 if sys.platform == "darwin" else 1)
+    except ImportError:
+        # Windows: psutil expone el pico del working set
+        import psutil
+
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def commit_actual() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return "desconocido"
+
+
+def _zips(corpus: Path, limite: int | None) -> list[Path]:
+    zips = sorted(corpus.glob("*.zip"))
+    return zips[:limite] if limite else zips
+
+
+def _extraer_parejas(zips: list[Path], destino: Path) -> list[tuple[Path, Path]]:
+    parejas = []
+    for zip_path in zips:
+        with zipfile.ZipFile(zip_path) as z:
+            z.extractall(destino / zip_path.stem)
+        carpeta = destino / zip_path.stem
+        for pdf in carpeta.glob("*.pdf"):
+            xml = pdf.with_suffix(".xml")
+            if xml.exists():
+                parejas.append((pdf, xml))
+    return parejas
+
+
+def _config_temporal(tmp: Path, corpus: Path) -> dict:
+    from config import CONFIG
+
+    cfg = copy.deepcopy(CONFIG)
+    cfg["rutas"].update(
+        data_raw=tmp / "raw",
+        data_processed=tmp / "processed",
+        data_logs=tmp / "logs",
+        datos_adjuntos=corpus,
+        datos_adjuntos_default=corpus,
+    )
+    for clave in ("data_raw", "data_processed", "data_logs"):
+        cfg["rutas"][clave].mkdir(parents=True, exist_ok=True)
+    # El benchmark no mide la red: la IA queda apagada
+    cfg.setdefault("ia", {})["enabled"] = False
+    return cfg
+
+
+def medir_etapa(
+    etapa: str,
+    corpus: Path,
+    limite: int | None,
+    workers: int = 1,
+    planificacion: str = "costo",
+) -> dict:
+    """Corre una etapa en este proceso y devuelve sus números."""
+    sys.path.insert(0, str(BASE_DIR))
+    zips = _zips(corpus, limite)
+
+    extra = {}
+    with tempfile.TemporaryDirectory(prefix="cafe_bench_") as tmp_str:
+        tmp = Path(tmp_str)
+
+        if etapa == "agente":
+            from src.agente_supervisor import AgenteSupervisor
+
+            carpeta = tmp / "zips"
+            carpeta.mkdir()
+            for z in zips:
+                (carpeta / z.name).symlink_to(z.resolve())
+            cfg = _config_temporal(tmp, carpeta)
+            cfg.setdefault("ejecucion", {}).update(workers=workers, planificacion=planificacion)
+
+            inicio = time.perf_counter()
+            agente = AgenteSupervisor(config=cfg, carpeta_zips=carpeta)
+            resumen = agente.ciclo_principal()
+            segundos = time.perf_counter() - inicio
+            est = agente.estadisticas_ejecucion
+            extra = {
+                "workers": workers,
+                "planificacion": planificacion,
+                "utilizacion": est.get("utilizacion"),
+                "cola_final_seg": est.get("cola_final_seg"),
+                "rss_pico_worker_mb": est.get("rss_pico_mb"),
+                "reciclajes": est.get("reciclajes"),
+            }
+            facturas = (
+                resumen["facturas_ok"]
+                + resumen["facturas_con_revision"]
+                + resumen["facturas_error"]
+            )
+        else:
+            from src.extractor_pdf import parse_pdf_invoice
+            from src.extractor_xml import parse_xml_invoice
+            from src.conciliacion import conciliar_factura
+
+            parejas = _extraer_parejas(zips, tmp)
+            facturas = len(parejas)
+
+            if etapa == "conciliacion":
+                cfg = _config_temporal(tmp, corpus)
+                extraidas = [
+                    (parse_pdf_invoice(pdf), parse_xml_invoice(xml)) for pdf, xml in parejas
+                ]
+                inicio = time.perf_counter()
+                for fac_pdf, fac_xml in extraidas:
+                    conciliar_factura(fac_pdf, fac_xml, cfg)
+                segundos = time.perf_counter() - inicio
+            else:
+                funcion = parse_xml_invoice if etapa == "xml" else parse_pdf_invoice
+                indice = 1 if etapa == "xml" else 0
+                inicio = time.perf_counter()
+                for pareja in parejas:
+                    funcion(pareja[indice])
+                segundos = time.perf_counter() - inicio
+
+    return {
+        "etapa": etapa,
+        "facturas": facturas,
+        "segundos": round(segundos, 4),
+        "facturas_por_seg": round(facturas / segundos, 2) if segundos else None,
+        "rss_pico_mb": round(rss_pico_mb(), 1),
+        **extra,
+    }
+
+
+def _ultimo_por_etapa(historial: Path, corpus: str) -> dict:
+    previos = {}
+    if historial.exists():
+        for linea in historial.read_text(encoding="utf-8").splitlines():
+            try:
+                reg = json.loads(linea)
+            except ValueError:
+                continue
+            if reg.get("corpus") == corpus:
+                previos[reg["etapa"]] = reg
+    return previos
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark del pipeline CAFE.")
+    p.add_argument("--corpus", type=Path, required=True, help="Carpeta con ZIPs.")
+    p.add_argument("--limite", type=int, default=None, help="Máximo de ZIPs a usar.")
+    p.add_argument("--etapas", default=",".join(ETAPAS),
+                   help=f"Etapas separadas por coma ({', '.join(ETAPAS)}).")
+    p.add_argument("--historial", type=Path, default=HISTORIAL_DEFECTO)
+    p.add_argument("--workers", type=int, default=1, help="Workers de la etapa agente.")
+    p.add_argument("--planificacion", choices=("costo", "nombre"), default="costo",
+                   help="Orden de despacho de la etapa agente.")
+    p.add_argument("--_hijo", default=None, help=argparse.SUPPRESS)
+    args = p.parse_args(argv)
+
+    # Modo hijo: mide una etapa y escribe el JSON por stdout
+    if args._hijo:
+        print(json.dumps(medir_etapa(
+            args._hijo, args.corpus, args.limite, args.workers, args.planificacion
+        )))
+        return
+
+    corpus_id = str(args.corpus.resolve())
+    previos = _ultimo_por_etapa(args.historial, corpus_id)
+    commit = commit_actual()
+    args.historial.parent.mkdir(parents=True, exist_ok=True)
+
+    for etapa in [e.strip() for e in args.etapas.split(",") if e.strip()]:
+        if etapa not in ETAPAS:
+            raise SystemExit(f"Etapa desconocida: {etapa}")
+
+        cmd = [sys.executable, "-m", "benchmarks.bench_pipeline",
+               "--corpus", str(args.corpus), "--_hijo", etapa,
+               "--workers", str(args.workers), "--planificacion", args.planificacion]
+        if args.limite:
+            cmd += ["--limite", str(args.limite)]
+        salida = subprocess.run(cmd, cwd=BASE_DIR, capture_output=True, text=True)
+        if salida.returncode != 0:
+            print(salida.stderr, file=sys.stderr)
+            raise SystemExit(f"Falló la etapa {etapa}")
+
+        reg = json.loads(salida.stdout.strip().splitlines()[-1])
+        reg.update(commit=commit, corpus=corpus_id, fecha=datetime.now().isoformat(timespec="seconds"))
+        with args.historial.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(reg) + "\n")
+
+        linea = (
+            f"{etapa:<13} {reg['facturas']:>8} fact  {reg['segundos']:>9.3f} s  "
+            f"{reg['facturas_por_seg'] or 0:>9.1f} fact/s  {reg['rss_pico_mb']:>7.1f} MB"
+        )
+        if reg.get("utilizacion") is not None:
+            linea += f"  util {reg['utilizacion']:.0%} (cola final {reg['cola_final_seg']:.1f} s)"
+        if reg.get("rss_pico_worker_mb") is not None:
+            linea += f"  worker {reg['rss_pico_worker_mb']:.1f} MB ({reg['reciclajes']} reciclajes)"
+        previo = previos.get(etapa)
+        if previo and previo.get("facturas_por_seg") and reg["facturas_por_seg"]:
+            delta = 100 * (reg["facturas_por_seg"] / previo["facturas_por_seg"] - 1)
+            linea += f"  ({delta:+.1f}% vs {previo['commit']})"
+        print(linea)
+
+
+if __name__ == "__main__":
+    main()
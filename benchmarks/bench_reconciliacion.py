@@ -0,0 +1,149 @@
+"""
+Reconciliar lo guardado vs. volver a procesar el corpus.
+
+Procesa el corpus (sin IA) con la configuración actual y mide:
+  - reconciliar_guardados sin cambiar nada (no debe reescribir nada),
+  - reconciliar_guardados con otra tolerancia de montos y prioridad de
+    textos libres,
+y verifica que los archivos que quedan son idénticos, byte a byte, a los
+de procesar el corpus de cero con esa otra configuración.
+
+Antes, en cada formato de resultado, reconcilia sin cambiar la
+configuración facturas con montos del XML de más de dos decimales o
+negativos (extractor_xml los entrega como Decimal): no debe reescribir
+ninguna.
+
+Uso:
+    python -m benchmarks.generar_corpus --facturas 2000 --salida corpus_2k
+    python -m benchmarks.bench_reconciliacion --corpus corpus_2k --tolerancia 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import filecmp
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_pipeline import BASE_DIR, _config_temporal
+
+
+def _distintos(a: Path, b: Path) -> int:
+    """Archivos que difieren (o faltan de un lado) entre dos árboles."""
+    comparacion = filecmp.dircmp(a, b)
+    n = len(comparacion.left_only) + len(comparacion.right_only)
+    _, diferentes, errores = filecmp.cmpfiles(a, b, comparacion.common_files, shallow=False)
+    n += len(diferentes) + len(errores)
+    return n + sum(_distintos(a / d, b / d) for d in comparacion.common_dirs)
+
+
+# (monto del PDF, monto del XML) que las reglas de texto de normalizar_monto
+# leerían distinto si el XML guardado como texto no vuelve a Decimal
+MONTOS_XML = (
+    ("1234.57", "1234.567"),
+    ("-5.00", "-5.00"),
+    ("10.12", "10.125"),
+    ("3094000.00", "3094000.00"),
+)
+
+
+def _verificar_montos_xml(tmp: Path) -> int:
+    """Facturas reescritas al reconciliar, sin cambiar nada, montos XML raros."""
+    from decimal import Decimal
+
+    from config import CONFIG
+    from src.agente_supervisor import AgenteSupervisor
+    from src.conciliacion import conciliar_factura
+    from src.reconciliacion import reconciliar_carpeta
+    from src.serializacion import EXTENSIONES, guardar_resultado
+
+    reescritas = 0
+    for formato, ext in EXTENSIONES.items():
+        carpeta = tmp / f"montos_{formato}"
+        carpeta.mkdir(parents=True)
+        resultados = []
+        for i, (pdf, xml) in enumerate(MONTOS_XML):
+            pdf_raw = {"subtotal": pdf, "impuestos": pdf, "total": pdf}
+            xml_raw = {campo: Decimal(xml) for campo in pdf_raw}
+            conciliacion, revision = conciliar_factura(pdf_raw, xml_raw, CONFIG)
+            res = {
+                "id_factura": f"f{i}",
+                "pdf_raw": pdf_raw,
+                "xml_raw": xml_raw,
+                "conciliacion": conciliacion,
+                "requiere_revision_global": revision,
+                "campos_a_revisar": [c for c, d in conciliacion.items() if d["requiere_revision"]],
+                "error": None,
+            }
+            guardar_resultado(carpeta / f"f{i}_conciliacion{ext}", res, formato)
+            resultados.append(res)
+        AgenteSupervisor._escribir_csv_zip(carpeta, resultados)
+        reescritas += len(reconciliar_carpeta(carpeta, CONFIG)["cambiados"])
+    return reescritas
+
+
+def _correr(config: dict, corpus: Path, reconciliar: bool) -> float:
+    from src.agente_supervisor import AgenteSupervisor
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        agente = AgenteSupervisor(config=config, carpeta_zips=corpus)
+        t0 = time.perf_counter()
+        if reconciliar:
+            agente.reconciliar_guardados()
+        else:
+            agente.ciclo_principal()
+        return time.perf_counter() - t0
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark de la reconciliación de resultados CAFE.")
+    p.add_argument("--corpus", type=Path, required=True, help="Carpeta con ZIPs.")
+    p.add_argument("--tolerancia", default="1000", help="Tolerancia de montos a probar.")
+    p.add_argument("--workers", type=int, default=1)
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, str(BASE_DIR))
+    from src.reconciliacion import carpetas_con_resultados, rutas_resultados
+
+    with tempfile.TemporaryDirectory(prefix="cafe_bench_rec_") as tmp:
+        tmp = Path(tmp)
+        montos_xml = _verificar_montos_xml(tmp)
+        actual = _config_temporal(tmp / "actual", args.corpus)
+        actual.setdefault("ejecucion", {})["workers"] = args.workers
+        nueva = _config_temporal(tmp / "nueva", args.corpus)
+        nueva["ejecucion"]["workers"] = args.workers
+        nueva["comparacion"]["tolerancia_montos"] = args.tolerancia
+        prioridad = nueva.setdefault("prioridad_fuente", {})
+        prioridad["textos_libres"] = "xml" if prioridad.get("textos_libres", "pdf") == "pdf" else "pdf"
+
+        procesar = _correr(actual, args.corpus, reconciliar=False)
+        facturas = sum(
+            len(rutas_resultados(c)) for c in carpetas_con_resultados(actual["rutas"]["data_processed"])
+        ) or 1
+        igual = _correr(actual, args.corpus, reconciliar=True)
+        # Misma carpeta de resultados, otra configuración
+        nueva_sobre_actual = {**nueva, "rutas": actual["rutas"]}
+        cambio = _correr(nueva_sobre_actual, args.corpus, reconciliar=True)
+        referencia = _correr(nueva, args.corpus, reconciliar=False)
+        distintos = _distintos(actual["rutas"]["data_processed"], nueva["rutas"]["data_processed"])
+
+    print(f"{facturas} facturas, {args.workers} workers\n")
+    print(f"{'corrida':<28} {'s':>8} {'µs/fact':>9}")
+    for nombre, segundos in (
+        ("procesar corpus", procesar),
+        ("reconciliar (sin cambios)", igual),
+        ("reconciliar (otra config)", cambio),
+        ("procesar con otra config", referencia),
+    ):
+        print(f"{nombre:<28} {segundos:>8.2f} {segundos / facturas * 1e6:>9.0f}")
+    print(f"\narchivos distintos de procesar con la otra config: {distintos}")
+    print(f"facturas reescritas con montos XML de 3 decimales o negativos: {montos_xml}")
+    return 1 if distintos or montos_xml else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Tamaño y velocidad de los formatos de resultado por factura.
+
+Procesa las parejas del corpus una sola vez (sin IA) y, para cada formato
+de serializacion.EXTENSIONES, mide bytes totales, tiempo de codificar y
+de decodificar, y verifica el ida y vuelta:
+  - compacto(-zstd): el dict leído es idéntico al de procesar_pareja.
+  - todos: forma_json(leído) == lo que da el .json histórico.
+
+Uso:
+    python -m benchmarks.generar_corpus --facturas 2000 --salida corpus_2k
+    python -m benchmarks.bench_serializacion --corpus corpus_2k
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_pipeline import BASE_DIR, _config_temporal, _extraer_parejas, _zips
+
+
+def _resultados(corpus: Path, limite: int | None, tmp: Path) -> list[dict]:
+    from src.agente_supervisor import AgenteSupervisor
+
+    agente = AgenteSupervisor(config=_config_temporal(tmp, corpus))
+    resultados = []
+    for pdf, xml in _extraer_parejas(_zips(corpus, limite), tmp / "parejas"):
+        res = agente.procesar_pareja(pdf, xml)
+        res.pop("_tiempos", None)
+        res.pop("_patrones", None)
+        resultados.append(res)
+    return resultados
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark de formatos de resultado CAFE.")
+    p.add_argument("--corpus", type=Path, required=True, help="Carpeta con ZIPs.")
+    p.add_argument("--limite", type=int, default=None, help="Máximo de ZIPs a usar.")
+    p.add_argument("--repeticiones", type=int, default=3)
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, str(BASE_DIR))
+    from src.serializacion import (
+        EXTENSIONES,
+        codificar_resultado,
+        decodificar_resultado,
+        forma_json,
+    )
+
+    with tempfile.TemporaryDirectory(prefix="cafe_bench_ser_") as tmp:
+        resultados = _resultados(args.corpus, args.limite, Path(tmp))
+    esperado_json = [forma_json(r) for r in resultados]
+    print(f"{len(resultados)} facturas\n")
+    print(f"{'formato':<15} {'bytes/fact':>10} {'vs json':>8} {'codif µs':>9} {'decod µs':>9}  ida y vuelta")
+
+    base = None
+    for formato in EXTENSIONES:
+        cod = dec = float("inf")
+        for _ in range(args.repeticiones):
+            t0 = time.perf_counter()
+            blobs = [codificar_resultado(r, formato) for r in resultados]
+            t1 = time.perf_counter()
+            leidos = [decodificar_resultado(b, formato) for b in blobs]
+            t2 = time.perf_counter()
+            cod, dec = min(cod, t1 - t0), min(dec, t2 - t1)
+
+        total = sum(len(b) for b in blobs)
+        base = base or total
+        exacto = formato == "json" or leidos == resultados
+        ok = exacto and [forma_json(r) for r in leidos] == esperado_json
+        n = len(resultados) or 1
+        print(
+            f"{formato:<15} {total / n:>10.0f} {total / base:>7.0%} "
+            f"{cod / n * 1e6:>9.1f} {dec / n * 1e6:>9.1f}  {'OK' if ok else 'FALLA'}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Simulador de políticas: tiempo de carga y de simulación, y verificación.
+
+Lee los resultados guardados en --resultados, simula una rejilla de
+políticas (tolerancias x prioridad de montos x prioridad de NIT x prioridad
+de textos libres) y, para cada una, lo compara con conciliar_facturas sobre
+los pdf_raw / xml_raw guardados con esa configuración: facturas en
+revisión, cambios frente a la política actual, revisiones por campo,
+valores resueltos que cambian y facturas en revisión por NIT.
+
+Uso:
+    python -m benchmarks.bench_simulador --resultados data/processed \
+        --tolerancias 0,0.01,1,1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from benchmarks.bench_pipeline import BASE_DIR
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark del simulador de políticas CAFE.")
+    p.add_argument("--resultados", type=Path, required=True, help="Carpeta data/processed.")
+    p.add_argument("--tolerancias", default="0,0.01,1,1000")
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, str(BASE_DIR))
+    from config import CONFIG
+    from src.agente_supervisor import AgenteSupervisor
+    from src.conciliacion import conciliar_facturas
+    from src.reconciliacion import carpetas_con_resultados, rutas_resultados
+    from src.serializacion import leer_resultado
+    from src.simulador_politicas import Politica, cargar_historial, rejilla, simular
+
+    actual = Politica.desde_config(CONFIG)
+    politicas = rejilla(
+        actual, tolerancias=args.tolerancias.split(","),
+        montos=["xml", "pdf"], nit=["xml", "pdf"], textos_libres=["pdf", "xml"],
+    )
+    t0 = time.perf_counter()
+    historial = cargar_historial(args.resultados)
+    t1 = time.perf_counter()
+    informe = simular(historial, politicas, actual)
+    t2 = time.perf_counter()
+    n = len(historial) or 1
+    print(f"{len(historial)} facturas, {len(politicas)} políticas")
+    print(f"carga: {(t1 - t0) / n * 1e6:.0f} µs/fact, "
+          f"simulación: {(t2 - t1) / n / (len(politicas) + 1) * 1e9:.0f} ns/fact/política\n")
+
+    resultados = [
+        res for carpeta in carpetas_con_resultados(args.resultados)
+        for res in map(leer_resultado, rutas_resultados(carpeta))
+        if not res.get("error") and res.get("conciliacion")
+    ]
+    pares = [(res["pdf_raw"], res["xml_raw"]) for res in resultados]
+    nits = [AgenteSupervisor._registro(res, "", "").nit or "" for res in resultados]
+
+    def conciliar(politica):
+        config = copy.deepcopy(CONFIG)
+        config["comparacion"]["tolerancia_montos"] = politica.tolerancia_montos
+        config.setdefault("prioridad_fuente", {}).update(
+            montos=politica.montos, nit=politica.nit, textos_libres=politica.textos_libres
+        )
+        return conciliar_facturas(pares, config)
+
+    base = conciliar(actual)
+    distintas = 0
+    for politica, simulada in zip(politicas, informe["politicas"]):
+        salida = conciliar(politica)
+        por_campo = Counter(
+            campo for conc, _ in salida for campo, det in conc.items() if det["requiere_revision"]
+        )
+        esperado = {
+            "facturas_revision": sum(rev for _, rev in salida),
+            "a_revision": sum(rev and not antes for (_, rev), (_, antes) in zip(salida, base)),
+            "a_ok": sum(antes and not rev for (_, rev), (_, antes) in zip(salida, base)),
+            "valores_cambiados": sum(
+                str(conc[c]["valor_resuelto"]) != str(antes[c]["valor_resuelto"])
+                for (conc, _), (antes, _) in zip(salida, base) for c in conc
+            ),
+            "por_campo": {c: por_campo[c] for c in simulada["por_campo"]},
+            "por_nit": dict(Counter(nit for nit, (_, rev) in zip(nits, salida) if rev)),
+        }
+        diferentes = [k for k, v in esperado.items() if simulada[k] != v]
+        if diferentes:
+            distintas += 1
+            print(f"✗ {politica.etiqueta()}: {', '.join(diferentes)}")
+    print(f"políticas que no coinciden con conciliar_facturas: {distintas} de {len(politicas)}")
+    return 1 if distintas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Lectura del XML: modo "bytes" (mmap + regex de bytes) vs. "texto".
+
+Para cada modo de extractor_xml.MODOS_XML mide, por factura:
+  - tiempo de parse_xml_invoice (mejor de --repeticiones),
+  - memoria pico asignada durante la llamada (tracemalloc),
+y verifica que ambos modos devuelvan exactamente el mismo dict.
+
+Uso:
+    python -m benchmarks.generar_corpus --facturas 2000 --salida corpus_2k
+    python -m benchmarks.bench_xml --corpus corpus_2k
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.bench_pipeline import BASE_DIR, _extraer_parejas, _zips
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark de lectura XML CAFE.")
+    p.add_argument("--corpus", type=Path, required=True, help="Carpeta con ZIPs.")
+    p.add_argument("--limite", type=int, default=None, help="Máximo de ZIPs a usar.")
+    p.add_argument("--repeticiones", type=int, default=5)
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, str(BASE_DIR))
+    from src.extractor_xml import MODOS_XML, parse_xml_invoice
+
+    with tempfile.TemporaryDirectory(prefix="cafe_bench_xml_") as tmp:
+        xmls = [xml for _, xml in _extraer_parejas(_zips(args.corpus, args.limite), Path(tmp))]
+        n = len(xmls) or 1
+        kb = sum(x.stat().st_size for x in xmls) / n / 1024
+        print(f"{len(xmls)} XML, {kb:.1f} KB promedio\n")
+        print(f"{'modo':<6} {'µs/fact':>9} {'pico KB/fact':>13}  igual")
+
+        referencia = None
+        for modo in MODOS_XML:
+            segundos = float("inf")
+            for _ in range(args.repeticiones):
+                t0 = time.perf_counter()
+                resultados = [parse_xml_invoice(x, modo=modo) for x in xmls]
+                segundos = min(segundos, time.perf_counter() - t0)
+
+            picos = 0
+            tracemalloc.start()
+            for x in xmls:
+                tracemalloc.reset_peak()
+                base, _ = tracemalloc.get_traced_memory()
+                parse_xml_invoice(x, modo=modo)
+                _, pico = tracemalloc.get_traced_memory()
+                picos += pico - base
+            tracemalloc.stop()
+
+            referencia = referencia or resultados
+            igual = resultados == referencia
+            print(
+                f"{modo:<6} {segundos / n * 1e6:>9.1f} {picos / n / 1024:>13.1f}  "
+                f"{'OK' if igual else 'FALLA'}"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Prueba de carga del servicio HTTP (src/servicio_http.py).
+
+Levanta `cli_cafe servir` en un puerto libre (o usa --url de uno ya
+corriendo) y lanza --clientes clientes concurrentes, cada uno con su
+conexión keep-alive, que suben ZIPs del corpus y consultan el estado de
+sus trabajos hasta que terminan. Reporta la latencia (p50/p95/p99/máx) de
+los POST y de los GET de estado mientras hay trabajos en curso, y verifica
+que todos los trabajos terminen y que el detalle por factura se pueda leer.
+
+Uso:
+    python -m benchmarks.generar_corpus --facturas 200 --salida corpus_200
+    python -m benchmarks.carga_servicio --corpus corpus_200 --clientes 16 --envios 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from benchmarks.bench_pipeline import BASE_DIR, _zips
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentiles(valores: list[float]) -> str:
+    if not valores:
+        return "sin datos"
+    v = sorted(valores)
+
+    def p(q):
+        return v[min(len(v) - 1, int(q * len(v)))] * 1000
+
+    return f"p50 {p(.5):7.2f}  p95 {p(.95):7.2f}  p99 {p(.99):7.2f}  máx {v[-1] * 1000:7.2f} ms"
+
+
+class Cliente:
+    def __init__(self, host: str, puerto: int):
+        self.con = http.client.HTTPConnection(host, puerto, timeout=60)
+
+    def pedir(self, metodo: str, ruta: str, cuerpo: bytes | None = None, tipo: str = "") -> tuple:
+        cabeceras = {"Content-Type": tipo} if tipo else {}
+        t0 = time.perf_counter()
+        self.con.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+        r = self.con.getresponse()
+        datos = json.loads(r.read())
+        return r.status, datos, time.perf_counter() - t0
+
+
+def _cliente(host, puerto, envios: list[Path], lat: dict, lock, sondeo: float) -> list[dict]:
+    c = Cliente(host, puerto)
+    trabajos = []
+    for zip_path in envios:
+        estado, datos, seg = c.pedir(
+            "POST", f"/trabajos?nombre={zip_path.name}", zip_path.read_bytes(), "application/zip"
+        )
+        with lock:
+            lat["post"].append(seg)
+        if estado != 202:
+            raise RuntimeError(f"POST {zip_path.name}: {estado} {datos}")
+        trabajos.append(datos["id"])
+
+    finales = []
+    for id_trabajo in trabajos:
+        while True:
+            _, datos, seg = c.pedir("GET", f"/trabajos/{id_trabajo}")
+            with lock:
+                lat["get"].append(seg)
+            if datos["estado"] in ("terminado", "error"):
+                break
+            time.sleep(sondeo)
+        finales.append(datos)
+
+        # Detalle de la primera factura del trabajo
+        _, facturas, seg = c.pedir("GET", f"/trabajos/{id_trabajo}/facturas")
+        with lock:
+            lat["facturas"].append(seg)
+        con_detalle = [f for f in facturas if f["con_detalle"]]
+        if con_detalle:
+            f = con_detalle[0]
+            estado, _, seg = c.pedir(
+                "GET", f"/trabajos/{id_trabajo}/facturas/{f['id_factura']}?zip={f['zip']}"
+            )
+            with lock:
+                lat["detalle"].append(seg)
+            datos["detalle_ok"] = estado == 200
+    return finales
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Prueba de carga del servicio HTTP CAFE.")
+    p.add_argument("--corpus", type=Path, required=True, help="Carpeta con ZIPs.")
+    p.add_argument("--clientes", type=int, default=8, help="Clientes concurrentes.")
+    p.add_argument("--envios", type=int, default=32, help="ZIPs a subir en total.")
+    p.add_argument("--trabajos-paralelos", type=int, default=2)
+    p.add_argument("--sondeo", type=float, default=0.05, help="Segundos entre GET de estado.")
+    p.add_argument("--url", help="Servicio ya corriendo (si no, se levanta uno temporal).")
+    args = p.parse_args(argv)
+
+    zips = _zips(args.corpus, None)
+    if not zips:
+        print(f"No hay ZIPs en {args.corpus}", file=sys.stderr)
+        return 1
+    envios = [zips[i % len(zips)] for i in range(args.envios)]
+    por_cliente = [envios[i::args.clientes] for i in range(args.clientes)]
+
+    with tempfile.TemporaryDirectory(prefix="cafe_carga_") as tmp:
+        servidor = None
+        if args.url:
+            url = urlsplit(args.url)
+            host, puerto = url.hostname, url.port
+        else:
+            host, puerto = "127.0.0.1", _puerto_libre()
+            servidor = subprocess.Popen(
+                [sys.executable, "-m", "src.cli_cafe", "servir",
+                 "--puerto", str(puerto),
+                 "--trabajos-paralelos", str(args.trabajos_paralelos),
+                 "--dir-trabajos", str(Path(tmp) / "trabajos"),
+                 "--formato-salida", "compacto", "--sin-ia"],
+                cwd=BASE_DIR, stdout=subprocess.DEVNULL,
+            )
+        try:
+            for _ in range(200):
+                try:
+                    Cliente(host, puerto).pedir("GET", "/salud")
+                    break
+                except OSError:
+                    time.sleep(0.05)
+
+            lat = {"post": [], "get": [], "facturas": [], "detalle": []}
+            lock = threading.Lock()
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(args.clientes) as pool:
+                futuros = [
+                    pool.submit(_cliente, host, puerto, lote, lat, lock, args.sondeo)
+                    for lote in por_cliente if lote
+                ]
+                finales = [t for f in futuros for t in f.result()]
+            segundos = time.perf_counter() - t0
+        finally:
+            if servidor is not None:
+                servidor.terminate()
+                servidor.wait(timeout=30)
+
+    terminados = [t for t in finales if t["estado"] == "terminado"]
+    facturas = sum(
+        t["facturas_ok"] + t["facturas_con_revision"] + t["facturas_error"] for t in terminados
+    )
+    detalle_ok = all(t.get("detalle_ok", True) for t in terminados)
+    print(f"{len(envios)} ZIPs, {args.clientes} clientes, {args.trabajos_paralelos} trabajos en paralelo")
+    print(f"Trabajos terminados: {len(terminados)}/{len(finales)}  ·  {facturas} facturas "
+          f"en {segundos:.1f} s ({facturas / segundos:.1f} fact/s)\n")
+    for nombre, titulo in (("post", "POST /trabajos"), ("get", "GET estado"),
+                           ("facturas", "GET facturas"), ("detalle", "GET detalle")):
+        print(f"{titulo:<15} n={len(lat[nombre]):<6} {_percentiles(lat[nombre])}")
+    print(f"\nDetalle por factura: {'OK' if detalle_ok else 'FALLA'}")
+    return 0 if len(terminados) == len(finales) and detalle_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
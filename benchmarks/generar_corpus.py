@@ -0,0 +1,281 @@
+"""
+Generador de corpus sintético de facturas DIAN para benchmarks.
+
+Produce ZIPs con la misma forma que los de datos_adjuntos:
+  - XML AttachedDocument con el Invoice embebido en CDATA.
+  - PDF de texto (escrito a mano, sin dependencias) con NIT, fecha,
+    líneas, SUBTOTAL, IVA, TOTAL DE LA OPERACIÓN y CUFE.
+
+Es reproducible (semilla) y se escribe en streaming, así que sirve
+igual para 1.000 que para 1.000.000 de facturas.
+
+Uso:
+    python -m benchmarks.generar_corpus --facturas 1000 --salida corpus_1k
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import uuid
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+
+# ----------------------------------------------------------------------
+# PDF mínimo (texto Helvetica, WinAnsiEncoding)
+# ----------------------------------------------------------------------
+LINEAS_POR_PAGINA = 60
+
+
+def _escapar_pdf(texto: str) -> bytes:
+    crudo = texto.encode("cp1252", errors="replace")
+    return crudo.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def construir_pdf(lineas: list[str]) -> bytes:
+    """Arma un PDF válido con una línea de texto por renglón, paginando."""
+    paginas = [
+        lineas[i:i + LINEAS_POR_PAGINA]
+        for i in range(0, len(lineas), LINEAS_POR_PAGINA)
+    ] or [[]]
+
+    objetos: list[bytes] = []
+    # 1 catálogo, 2 árbol de páginas, 3 fuente; luego (página, contenido) por página
+    ids_paginas = [4 + 2 * i for i in range(len(paginas))]
+    objetos.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = b" ".join(b"%d 0 R" % i for i in ids_paginas)
+    objetos.append(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(paginas)))
+    objetos.append(
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+        b"/Encoding /WinAnsiEncoding >>"
+    )
+
+    for i, renglones in enumerate(paginas):
+        flujo = [b"BT /F1 9 Tf 12 TL 40 800 Td"]
+        for renglon in renglones:
+            flujo.append(b"(" + _escapar_pdf(renglon) + b") Tj T*")
+        flujo.append(b"ET")
+        contenido = b"\n".join(flujo)
+
+        objetos.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (ids_paginas[i] + 1)
+        )
+        objetos.append(
+            b"<< /Length %d >>\nstream\n" % len(contenido) + contenido + b"\nendstream"
+        )
+
+    salida = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, obj in enumerate(objetos, start=1):
+        offsets.append(len(salida))
+        salida += b"%d 0 obj\n" % n + obj + b"\nendobj\n"
+
+    inicio_xref = len(salida)
+    salida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    for off in offsets:
+        salida += b"%010d 00000 n \n" % off
+    salida += (
+        b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+        % (len(objetos) + 1, inicio_xref)
+    )
+    return bytes(salida)
+
+
+# ----------------------------------------------------------------------
+# Factura sintética
+# ----------------------------------------------------------------------
+def _miles(valor: Decimal) -> str:
+    """8092000 -> '8.092.000' (formato colombiano sin decimales)."""
+    return f"{int(valor):,}".replace(",", ".")
+
+
+def _miles_us(valor: Decimal) -> str:
+    """8092000 -> '8,092,000.00' (ruido: formato anglosajón)."""
+    return f"{valor:,.2f}"
+
+
+def generar_factura(rng: random.Random, n: int, args) -> dict:
+    """Crea los datos 'verdaderos' de una factura y sus desviaciones."""
+    id_factura = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    nit = str(rng.randint(800_000_000, 999_999_999))
+    fecha = date(2024, 1, 1) + timedelta(days=rng.randint(0, 700))
+
+    n_lineas = rng.randint(1, max(1, args.lineas_max))
+    lineas = []
+    for j in range(n_lineas):
+        cantidad = rng.randint(1, 20)
+        precio = Decimal(rng.randint(1, 5000) * 100)
+        lineas.append((f"Producto {j + 1:03d}", cantidad, precio, precio * cantidad))
+
+    subtotal = sum((l[3] for l in lineas), Decimal(0))
+    impuestos = (subtotal * Decimal("0.19")).quantize(Decimal(1))
+    total = subtotal + impuestos
+    cufe = hashlib.sha384(f"{id_factura}{nit}{total}".encode()).hexdigest()
+
+    factura = {
+        "id_factura": id_factura,
+        "numero": str(1000 + n),
+        "prefijo": "FE",
+        "nit": nit,
+        "fecha": fecha,
+        "lineas": lineas,
+        "subtotal": subtotal,
+        "impuestos": impuestos,
+        "total": total,
+        "cufe": cufe,
+        "pdf_subtotal": subtotal,
+        "ruido": rng.random() < args.ruido,
+        "discrepancia": rng.random() < args.discrepancias,
+    }
+    if factura["discrepancia"]:
+        # Diferencia siempre mayor a la tolerancia por defecto (1.0)
+        factura["pdf_subtotal"] = subtotal + Decimal(rng.randint(2, 500) * 1000)
+    return factura
+
+
+def construir_xml(f: dict, relleno_kb: int, rng: random.Random) -> bytes:
+    lineas_xml = "".join(
+        f"<cac:InvoiceLine><cbc:ID>{i + 1}</cbc:ID>"
+        f"<cbc:InvoicedQuantity unitCode=\"94\">{cant}</cbc:InvoicedQuantity>"
+        f"<cbc:LineExtensionAmount currencyID=\"COP\">{tot:.2f}</cbc:LineExtensionAmount>"
+        f"<cac:Item><cbc:Description>{desc}</cbc:Description></cac:Item>"
+        f"<cac:Price><cbc:PriceAmount currencyID=\"COP\">{precio:.2f}</cbc:PriceAmount></cac:Price>"
+        f"</cac:InvoiceLine>"
+        for i, (desc, cant, precio, tot) in enumerate(f["lineas"])
+    )
+    invoice = (
+        '<?xml version="1.0" encoding="utf-8" standalone="no"?>'
+        '<Invoice xmlns="urn:oasis:names:specification:ubl:schema:xsd:Invoice-2" '
+        'xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2" '
+        'xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2">'
+        f"<cbc:ID>{f['prefijo']}{f['numero']}</cbc:ID>"
+        f'<cbc:UUID schemeID="1" schemeName="CUFE-SHA384">{f["cufe"]}</cbc:UUID>'
+        f"<cbc:IssueDate>{f['fecha'].isoformat()}</cbc:IssueDate>"
+        "<cac:AccountingSupplierParty><cac:Party><cac:PartyTaxScheme>"
+        f'<cbc:CompanyID schemeID="4" schemeName="31">{f["nit"]}</cbc:CompanyID>'
+        "</cac:PartyTaxScheme></cac:Party></cac:AccountingSupplierParty>"
+        "<cac:TaxTotal>"
+        f'<cbc:TaxAmount currencyID="COP">{f["impuestos"]:.2f}</cbc:TaxAmount>'
+        "</cac:TaxTotal>"
+        "<cac:LegalMonetaryTotal>"
+        f'<cbc:LineExtensionAmount currencyID="COP">{f["subtotal"]:.2f}</cbc:LineExtensionAmount>'
+        f'<cbc:TaxExclusiveAmount currencyID="COP">{f["subtotal"]:.2f}</cbc:TaxExclusiveAmount>'
+        f'<cbc:TaxInclusiveAmount currencyID="COP">{f["total"]:.2f}</cbc:TaxInclusiveAmount>'
+        f'<cbc:PayableAmount currencyID="COP">{f["total"]:.2f}</cbc:PayableAmount>'
+        "</cac:LegalMonetaryTotal>"
+        f"{lineas_xml}</Invoice>"
+    )
+    # Firma falsa para acercar el tamaño al de los XML reales (~40 KB)
+    firma = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdef0123456789+/")
+                    for _ in range(relleno_kb * 1024))
+    doc = (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<AttachedDocument xmlns="urn:oasis:names:specification:ubl:schema:xsd:AttachedDocument-2" '
+        'xmlns:cac="urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2" '
+        'xmlns:cbc="urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2" '
+        'xmlns:ds="http://www.w3.org/2000/09/xmldsig#">'
+        f"<ext:UBLExtensions><ds:Signature><ds:SignatureValue>{firma}</ds:SignatureValue>"
+        "</ds:Signature></ext:UBLExtensions>"
+        f"<cbc:ID>{f['numero']}</cbc:ID>"
+        f"<cbc:IssueDate>{f['fecha'].isoformat()}</cbc:IssueDate>"
+        f"<cbc:ParentDocumentID>{f['prefijo']}{f['numero']}</cbc:ParentDocumentID>"
+        "<cac:Attachment><cac:ExternalReference><cbc:MimeCode>text/xml</cbc:MimeCode>"
+        f"<cbc:Description><![CDATA[{invoice}]]></cbc:Description>"
+        "</cac:ExternalReference></cac:Attachment></AttachedDocument>"
+    )
+    return doc.encode("utf-8")
+
+
+def construir_lineas_pdf(f: dict) -> list[str]:
+    fmt = _miles_us if f["ruido"] else _miles
+    d = f["fecha"]
+    lineas = [
+        "FACTURA ELECTRÓNICA DE VENTA",
+        f"No. {f['prefijo']}{f['numero']}",
+        f"EMPRESA SINTÉTICA {f['nit'][-4:]} S.A.S.",
+        f"NIT {f['nit']}",
+        f"Fecha de emisión: {d.day:02d}/{d.month:02d}/{d.year}",
+        "Descripción  Cantidad  Valor unitario  Valor total",
+    ]
+    for desc, cant, precio, tot in f["lineas"]:
+        lineas.append(f"{desc}  {cant}  {fmt(precio)}  {fmt(tot)}")
+    lineas += [
+        f"SUBTOTAL {fmt(f['pdf_subtotal'])}",
+        f"IVA {fmt(f['impuestos'])}",
+        f"TOTAL DE LA OPERACIÓN {fmt(f['total'])}",
+    ]
+    # Con ruido se omite el CUFE (como en algunos PDF escaneados)
+    if not f["ruido"]:
+        lineas.append(f"CUFE: {f['cufe']}")
+    return lineas
+
+
+def generar_corpus(salida: Path, args) -> int:
+    salida.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(args.semilla)
+    manifiesto = (salida / "manifiesto.jsonl").open("w", encoding="utf-8")
+
+    zip_actual = None
+    try:
+        for n in range(args.facturas):
+            f = generar_factura(rng, n, args)
+
+            if n % args.por_zip == 0:
+                if zip_actual is not None:
+                    zip_actual.close()
+                zip_actual = zipfile.ZipFile(
+                    salida / f"{f['id_factura']}.zip", "w", zipfile.ZIP_DEFLATED
+                )
+
+            zip_actual.writestr(f"{f['id_factura']}.xml", construir_xml(f, args.relleno_kb, rng))
+            zip_actual.writestr(f"{f['id_factura']}.pdf", construir_pdf(construir_lineas_pdf(f)))
+
+            manifiesto.write(json.dumps({
+                "id_factura": f["id_factura"],
+                "nit": f["nit"],
+                "lineas": len(f["lineas"]),
+                "ruido": f["ruido"],
+                "discrepancia": f["discrepancia"],
+            }) + "\n")
+
+            if args.facturas >= 10_000 and (n + 1) % 10_000 == 0:
+                print(f"[CORPUS] {n + 1}/{args.facturas}")
+    finally:
+        if zip_actual is not None:
+            zip_actual.close()
+        manifiesto.close()
+
+    return args.facturas
+
+
+def _parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="Genera un corpus sintético de facturas DIAN.")
+    p.add_argument("--salida", type=Path, required=True, help="Carpeta destino de los ZIP.")
+    p.add_argument("--facturas", type=int, default=1000)
+    p.add_argument("--por-zip", type=int, default=1, help="Parejas PDF/XML por ZIP.")
+    p.add_argument("--lineas-max", type=int, default=8, help="Máximo de líneas por factura.")
+    p.add_argument("--ruido", type=float, default=0.1,
+                   help="Fracción de PDFs con formato alterno y sin CUFE.")
+    p.add_argument("--discrepancias", type=float, default=0.05,
+                   help="Fracción de facturas con subtotal distinto entre PDF y XML.")
+    p.add_argument("--relleno-kb", type=int, default=30,
+                   help="KB de firma falsa por XML (los reales rondan 40 KB).")
+    p.add_argument("--semilla", type=int, default=42)
+    return p
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    n = generar_corpus(args.salida, args)
+    print(f"[CORPUS] {n} facturas generadas en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Prueba local del modo distribuido (cola de arriendos).
+
+Lanza K procesos `cli_cafe distribuido` sobre la misma carpeta de ZIPs y
+la misma cola, opcionalmente mata uno a mitad de camino (SIGKILL, sin
+liberar arriendos), y verifica que el resumen global fusionado sea igual
+al de una corrida secuencial con `cli_cafe procesar`.
+
+Uso:
+    python -m benchmarks.generar_corpus --facturas 200 --salida corpus_200
+    python -m benchmarks.prueba_distribuida --corpus corpus_200 --procesos 4 --matar-tras 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def _cli(*args: str) -> list[str]:
+    return [sys.executable, "-m", "src.cli_cafe", *args]
+
+
+def _opciones(corpus: Path, tmp: Path, nombre: str) -> list[str]:
+    return [
+        "--entrada", str(corpus),
+        "--salida", str(tmp / nombre / "processed"),
+        "--dir-raw", str(tmp / nombre / "raw"),
+        "--dir-logs", str(tmp / nombre / "logs"),
+        "--formato-salida", "ninguno",
+        "--sin-ia",
+    ]
+
+
+def _leer_resumen(tmp: Path, nombre: str) -> dict:
+    ruta = tmp / nombre / "logs" / "resumen_global_agente.json"
+    return json.loads(ruta.read_text(encoding="utf-8"))
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="Prueba local del modo distribuido de CAFE.")
+    p.add_argument("--corpus", type=Path, required=True, help="Carpeta con ZIPs.")
+    p.add_argument("--procesos", type=int, default=3, help="Workers distribuidos a lanzar.")
+    p.add_argument("--matar-tras", type=float, default=None,
+                   help="Segundos tras los que se mata (SIGKILL) al primer worker.")
+    p.add_argument("--ttl", type=float, default=5.0, help="TTL de los arriendos (segundos).")
+    args = p.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="cafe_dist_") as tmp:
+        tmp = Path(tmp)
+
+        inicio = time.perf_counter()
+        subprocess.run(
+            _cli("procesar", *_opciones(args.corpus, tmp, "secuencial")),
+            cwd=BASE_DIR, check=False, stdout=subprocess.DEVNULL,
+        )
+        t_secuencial = time.perf_counter() - inicio
+        esperado = _leer_resumen(tmp, "secuencial")
+
+        # Todos comparten logs y cola; cada uno extrae en su propio raw
+        dir_cola = tmp / "distribuido" / "logs" / "cola"
+        inicio = time.perf_counter()
+        procesos = []
+        for i in range(args.procesos):
+            opciones = _opciones(args.corpus, tmp, "distribuido")
+            opciones[opciones.index("--dir-raw") + 1] = str(tmp / f"raw_{i}")
+            procesos.append(subprocess.Popen(
+                _cli("distribuido", *opciones, "--dir-cola", str(dir_cola),
+                     "--worker-id", f"w{i}", "--ttl", str(args.ttl)),
+                cwd=BASE_DIR, stdout=subprocess.DEVNULL,
+            ))
+
+        if args.matar_tras is not None:
+            time.sleep(args.matar_tras)
+            if procesos[0].poll() is None:
+                procesos[0].kill()
+                print("[PRUEBA] Worker w0 terminado con SIGKILL")
+
+        for proc in procesos:
+            proc.wait()
+        t_distribuido = time.perf_counter() - inicio
+
+        # Garantiza el resumen aunque el worker que cerró el último ZIP haya muerto
+        subprocess.run(
+            _cli("fusionar", *_opciones(args.corpus, tmp, "distribuido"),
+                 "--dir-cola", str(dir_cola)),
+            cwd=BASE_DIR, check=False, stdout=subprocess.DEVNULL,
+        )
+        obtenido = _leer_resumen(tmp, "distribuido")
+
+        por_worker = {
+            parcial.stem: sum(
+                len(json.loads(linea)["registros"])
+                for linea in parcial.read_text(encoding="utf-8").splitlines()
+                if linea.strip()
+            )
+            for parcial in sorted((dir_cola / "parciales").glob("*.jsonl"))
+        }
+
+    iguales = obtenido == esperado
+    print(f"[PRUEBA] Secuencial:  {t_secuencial:.1f} s")
+    print(f"[PRUEBA] Distribuido: {t_distribuido:.1f} s con {args.procesos} workers")
+    print(f"[PRUEBA] Facturas por worker (incluye reprocesos): {por_worker}")
+    print(f"[PRUEBA] Resumen fusionado {'IGUAL' if iguales else 'DISTINTO'} al secuencial")
+    return 0 if iguales else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
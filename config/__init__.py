@@ -1,17 +1,22 @@
+"""
+Configuración del proyecto CAFE.
+
+Importar este paquete no tiene efectos secundarios: el .env, el JSON y las
+rutas se resuelven la primera vez que se accede a CONFIG (o se llama a
+obtener_config()). Las carpetas de trabajo las crea quien las usa, con
+asegurar_carpetas().
+"""
+
 from __future__ import annotations
 
 import json
 import os
 from pathlib import Path
 from typing import Any, Dict
-from dotenv import load_dotenv
 
 # Carpeta raíz del proyecto = carpeta padre de config/
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Cargar .env desde la raíz del proyecto
-load_dotenv(BASE_DIR / ".env")
-
 # Archivo JSON de configuración
 CONFIG_FILE = Path(__file__).resolve().parent / "config_basica.json"
 
@@ -47,9 +52,19 @@ def _default_config() -> Dict[str, Any]:
             "nit": "xml",
             "textos_libres": "pdf",
         },
+        # aritmetica: "decimal" o "centavos" (enteros; misma salida, ver conciliacion.py)
         "comparacion": {
             "tolerancia_montos": 1.0,
             "tolerancia_fechas_dias": 0,
+            "aritmetica": "decimal",
+        },
+        # Lectura del XML: "bytes" (mmap; solo se decodifican los valores
+        # encontrados) o "texto" (decodifica el archivo completo)
+        "extraccion": {
+            "xml_modo": "bytes",
+            # Motor del PDF: "regex" (texto armado) o "coordenadas"
+            # (etiqueta -> valor por posición de las palabras)
+            "pdf_motor": "regex",
         },
         # Para el módulo IA (api key por variable de entorno)
         "ia": {
@@ -59,46 +74,159 @@ def _default_config() -> Dict[str, Any]:
         "openai": {
             "api_key": "",
         },
+        # Compuerta de la IA (src/compuerta_ia.py): solo se llama al modelo si
+        # puede cambiar la conciliación; historial vacío = data/logs/historial_ia.json.
+        # Umbrales: texto mínimo del PDF, proveedor con al menos min_llamadas
+        # y menos de min_utilidad útiles se omite (una de cada `explorar` sí)
+        "compuerta_ia": {
+            "enabled": True,
+            "historial": "",
+            "min_caracteres": 200,
+            "min_legibles": 0.6,
+            "min_llamadas": 5,
+            "min_utilidad": 0.1,
+            "explorar": 20,
+            "tokens_estimados": 2500,
+            "segundos_estimados": 4.0,
+        },
+        # Paralelismo del agente (1 = secuencial) y orden de despacho:
+        # "costo" = ZIPs/parejas más pesados primero; "nombre" = alfabético.
+        # Con workers > 1, cada worker se recicla tras N tareas o al pasar
+        # de rss_max_mb (0 = sin límite). Presupuesto de tiempo en segundos
+        # por factura y por etapa ({"extraccion_pdf": 30, ...}); la factura
+        # que se pasa queda con error "timeout:<etapa>" (0 / {} = sin límite)
+        "ejecucion": {
+            "workers": 1,
+            "planificacion": "costo",
+            "reciclar_tras_tareas": 0,
+            "rss_max_mb": 1024,
+            "timeout_factura_seg": 0,
+            "timeout_etapas_seg": {},
+        },
+        # Salida por factura: "json" (JSON + CSV por ZIP) o "ninguno".
+        # La escritura va en un hilo aparte con cola acotada (contrapresión).
+        "salida": {
+            "formato": "json",
+            "escritura_diferida": True,
+            "cola_escritura": 8,
+            "lote_escritura": 4,
+        },
+        # Métricas Prometheus: puerto HTTP local y/o archivo .prom
+        "metricas": {
+            "enabled": False,
+            "host": "127.0.0.1",
+            "puerto": 0,
+            "textfile": "",
+        },
+        # Diario de ejecución para reanudar una corrida interrumpida
+        "diario": {
+            "enabled": True,
+            "reanudar": True,
+            "fsync_cada": 64,
+            "fsync_seg": 1.0,
+        },
+        # Modo distribuido: cola de arriendos compartida (vacío = data/logs/cola)
+        "distribuido": {
+            "dir_cola": "",
+            "ttl_seg": 300,
+        },
+        # Índice SQLite de resultados para consultas (src/indice_resultados.py);
+        # ruta vacía = data/logs/indice_resultados.sqlite
+        "indice": {
+            "enabled": False,
+            "ruta": "",
+        },
+        # Caché de resultados por contenido de la pareja PDF/XML
+        # (src/cache_parejas.py); dir vacío = data/logs/cache_parejas
+        "cache_parejas": {
+            "enabled": False,
+            "dir": "",
+        },
+        # Plantillas por proveedor para leer el PDF por posición
+        # (src/plantillas_pdf.py); dir vacío = data/logs/plantillas_pdf
+        "plantillas_pdf": {
+            "enabled": False,
+            "dir": "",
+        },
+        # Servicio HTTP local (src/servicio_http.py); dir_trabajos vacío =
+        # data/logs/servicio. permitir_rutas: aceptar {"ruta": ...} del disco local
+        "servicio": {
+            "host": "127.0.0.1",
+            "puerto": 8765,
+            "trabajos_paralelos": 2,
+            "max_mb": 512,
+            "permitir_rutas": True,
+            "dir_trabajos": "",
+        },
     }
 
 
-# 1) Base defaults
-CONFIG: Dict[str, Any] = _default_config()
+def cargar_config() -> Dict[str, Any]:
+    """Construye la configuración: defaults + JSON + .env. No crea carpetas."""
+    from dotenv import load_dotenv
+
+    # Cargar .env desde la raíz del proyecto
+    load_dotenv(BASE_DIR / ".env")
+
+    # 1) Base defaults
+    config = _default_config()
+
+    # 2) Cargar JSON si existe
+    if CONFIG_FILE.exists():
+        with CONFIG_FILE.open("r", encoding="utf-8") as f:
+            cfg_json = json.load(f)
+        config = _deep_update(config, cfg_json)
+
+    # 3) Convertir rutas (str) -> Path y crear alias
+    rutas = config.get("rutas", {})
+    for k, v in list(rutas.items()):
+        if isinstance(v, str) and v.strip():
+            rutas[k] = Path(v)
+
+    # alias por compatibilidad
+    if "datos_adjuntos_default" not in rutas:
+        rutas["datos_adjuntos_default"] = rutas.get("datos_adjuntos")
+
+    # base_dir si no venía
+    if "base_dir" not in rutas:
+        # intenta inferir desde data_raw
+        dr = rutas.get("data_raw")
+        rutas["base_dir"] = dr.parents[2] if isinstance(dr, Path) else BASE_DIR
+
+    config["rutas"] = rutas
+
+    # 4) API KEY: si no está en JSON, tomar del entorno
+    if not config.get("openai", {}).get("api_key"):
+        config.setdefault("openai", {})
+        config["openai"]["api_key"] = os.getenv("OPENAI_API_KEY", "")
+
+    return config
 
-# 2) Cargar JSON si existe
-if CONFIG_FILE.exists():
-    with CONFIG_FILE.open("r", encoding="utf-8") as f:
-        cfg_json = json.load(f)
-    CONFIG = _deep_update(CONFIG, cfg_json)
 
-# 3) Convertir rutas (str) -> Path y crear alias
-rutas = CONFIG.get("rutas", {})
-for k, v in list(rutas.items()):
-    if isinstance(v, str) and v.strip():
-        rutas[k] = Path(v)
+def asegurar_carpetas(config: Dict[str, Any]) -> None:
+    """Crea las carpetas de trabajo (raw, processed, logs) si no existen."""
+    rutas = config.get("rutas", {})
+    for key in ("data_raw", "data_processed", "data_logs"):
+        p = rutas.get(key)
+        if isinstance(p, Path):
+            p.mkdir(parents=True, exist_ok=True)
 
-# alias por compatibilidad
-if "datos_adjuntos_default" not in rutas:
-    rutas["datos_adjuntos_default"] = rutas.get("datos_adjuntos")
 
-# base_dir si no venía
-if "base_dir" not in rutas:
-    # intenta inferir desde data_raw
-    dr = rutas.get("data_raw")
-    rutas["base_dir"] = dr.parents[2] if isinstance(dr, Path) else BASE_DIR
+_CONFIG: Dict[str, Any] | None = None
 
-CONFIG["rutas"] = rutas
 
-# 4) API KEY: si no está en JSON, tomar del entorno
-if not CONFIG.get("openai", {}).get("api_key"):
-    CONFIG.setdefault("openai", {})
-    CONFIG["openai"]["api_key"] = os.getenv("OPENAI_API_KEY", "")
+def obtener_config() -> Dict[str, Any]:
+    """Configuración global, resuelta en el primer acceso."""
+    global _CONFIG
+    if _CONFIG is None:
+        _CONFIG = cargar_config()
+    return _CONFIG
 
-# 5) Asegurar carpetas clave
-for key in ("data_raw", "data_processed", "data_logs"):
-    p = rutas.get(key)
-    if isinstance(p, Path):
-        p.mkdir(parents=True, exist_ok=True)
 
-# Export opcional
-RUTAS = rutas
+def __getattr__(name: str) -> Any:
+    # `from config import CONFIG` / `RUTAS` siguen funcionando, pero perezosos
+    if name == "CONFIG":
+        return obtener_config()
+    if name == "RUTAS":
+        return obtener_config()["rutas"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
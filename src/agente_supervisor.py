@@ -1,18 +1,53 @@
 from pathlib import Path
 import json
 import zipfile
-import pandas as pd
+import zlib
 import os
+import time
+from collections import Counter
+from typing import NamedTuple
 
-from .extractor_xml import parse_xml_invoice
-from .extractor_pdf import parse_pdf_invoice
+from .extractor_pdf import MOTORES_PDF
+from .extractor_xml import MODOS_XML, parse_xml_invoice
 from .conciliacion import conciliar_factura
-from config import CONFIG
+from .cola_trabajo import ColaArrendamientos, fusionar_parciales
+from .cache_parejas import _huella_contexto, abrir_cache_parejas
+from .compuerta_ia import abrir_compuerta_ia
+from .diario import DiarioEjecucion, DiarioNulo
+from .ejecucion import Tarea, ejecutar_tareas
+from .escritor import EscritorDiferido, EscritorDirecto
+from .indice_resultados import IndiceNulo, abrir_indice
+from .metricas import cronometrar, obtener_metricas
+from .patrones import tomar_aciertos
+from .plantillas_pdf import abrir_plantillas
+from .planificacion import PLANIFICACIONES, ordenar_parejas, ordenar_zips
+from .serializacion import EXTENSIONES, guardar_resultado
+from config import asegurar_carpetas, obtener_config
 
 
 from .ia_extractor import extraer_campos_pdf_con_ia
 
 
+# Formatos de salida por factura soportados por actuar_guardar_resultados_zip
+# (ver serializacion.py); "ninguno" solo deja el resumen global
+FORMATOS_SALIDA = (*EXTENSIONES, "ninguno")
+
+
+class RegistroFactura(NamedTuple):
+    """
+    Lo mínimo de una factura ya procesada y guardada. Alcanza para armar
+    el resumen global y las listas de la interfaz sin tener en memoria
+    los resultados completos (el detalle se lee de `ruta` cuando haga falta).
+    """
+
+    id_factura: str
+    zip: str
+    estado: str  # "ok" | "revision" | "error"
+    nit: str | None
+    campos_a_revisar: tuple
+    ruta: str
+
+
 class AgenteSupervisor:
     """
     Agente supervisor del proceso de conciliación de facturas.
@@ -27,11 +62,14 @@ class AgenteSupervisor:
         base_dir: Path | None = None,
         config: dict | None = None,
         carpeta_zips: Path | None = None,
+        workers: int | None = None,
+        particion: tuple[int, int] | None = None,
     ):
         # Config por defecto
         if config is None:
-            config = CONFIG
+            config = obtener_config()
         self.config = config
+        asegurar_carpetas(config)
 
         # Directorio base
         if base_dir is None:
@@ -50,6 +88,39 @@ class AgenteSupervisor:
         self.dir_zips = carpeta_zips
         self.carpeta_zips = carpeta_zips  # alias opcional
 
+        # Paralelismo: 1 = secuencial en este proceso; N = pool de N procesos
+        if workers is None:
+            workers = config.get("ejecucion", {}).get("workers", 1)
+        self.workers = max(1, int(workers))
+
+        # Orden de despacho: "costo" (lo más pesado primero) o "nombre"
+        self.planificacion = config.get("ejecucion", {}).get("planificacion", "costo")
+        if self.planificacion not in PLANIFICACIONES:
+            raise ValueError(f"Planificación desconocida: {self.planificacion}")
+        # Utilización lograda en la última ejecución (ver ejecucion.py)
+        self.estadisticas_ejecucion: dict = {}
+        # Aciertos por regla de extracción en la última ejecución (ver patrones.py)
+        self.aciertos_patrones: Counter = Counter()
+        # Consultas a la caché de parejas en la última ejecución (True = acierto)
+        self.consultas_cache: Counter = Counter()
+
+        # Partición (k, n): este agente solo toma los ZIP cuyo hash % n == k,
+        # para repartir una misma carpeta entre varias máquinas.
+        self.particion = particion
+
+        # "json" = un JSON por factura + CSV por ZIP; "ninguno" = solo resumen
+        self.formato_salida = config.get("salida", {}).get("formato", "json")
+        if self.formato_salida not in FORMATOS_SALIDA:
+            raise ValueError(f"Formato de salida desconocido: {self.formato_salida}")
+
+        # Lectura del XML: "bytes" (mmap, decodifica solo los valores) o "texto"
+        self.modo_xml = config.get("extraccion", {}).get("xml_modo", "bytes")
+        if self.modo_xml not in MODOS_XML:
+            raise ValueError(f"Modo de lectura XML desconocido: {self.modo_xml}")
+        motor_pdf = config.get("extraccion", {}).get("pdf_motor", "regex")
+        if motor_pdf not in MOTORES_PDF:
+            raise ValueError(f"Motor de extracción PDF desconocido: {motor_pdf}")
+
         # Contadores globales (se recalculan al final)
         self.facturas_ok = 0
         self.facturas_con_revision = 0
@@ -62,6 +133,27 @@ class AgenteSupervisor:
         # Detalle para saber QUÉ revisar por factura
         self.detalle_revision = {}  # {id_factura: ["campo1", "campo2", ...]}
 
+        # Un RegistroFactura por factura de la última ejecución
+        self.registros: list[RegistroFactura] = []
+
+        # Métricas Prometheus (no-op si CONFIG["metricas"]["enabled"] es False)
+        self.metricas = obtener_metricas(config)
+
+        # Diario de la corrida en curso (lo abre ciclo_principal)
+        self.diario = DiarioNulo()
+
+        # Índice SQLite de resultados (lo abre _procesar_zips si CONFIG["indice"])
+        self.indice = IndiceNulo()
+
+        # Resultados ya calculados por contenido de la pareja (cache_parejas.py)
+        self.cache_parejas = abrir_cache_parejas(config)
+
+        # Plantillas por proveedor para leer el PDF por posición (plantillas_pdf.py)
+        self.plantillas = abrir_plantillas(config)
+
+        # Decide si una llamada a la IA puede cambiar el resultado (compuerta_ia.py)
+        self.compuerta = abrir_compuerta_ia(config)
+
     # ==== Percepción ====
     def percibir_zips_pendientes(self):
         """
@@ -72,6 +164,9 @@ class AgenteSupervisor:
             return []
 
         zips = sorted(self.dir_zips.glob("*.zip"))
+        if self.particion is not None:
+            k, n = self.particion
+            zips = [z for z in zips if zlib.crc32(z.name.encode("utf-8")) % n == k]
         return zips
 
     # ==== Acciones básicas ====
@@ -104,19 +199,40 @@ class AgenteSupervisor:
           - error (None o string)
         """
         id_factura = pdf_path.stem
+        # Segundos por etapa; viajan en res["_tiempos"] (ver registrar_metricas).
+        # Igual los aciertos de cada regex de extracción, en res["_patrones"].
+        tiempos = {}
 
         try:
+            # 0) Misma pareja (por contenido) ya procesada: resultado guardado
+            contenido_pdf = contenido_xml = clave = None
+            if self.cache_parejas.activa:
+                with cronometrar(tiempos, "cache"):
+                    contenido_pdf, contenido_xml, clave = self.cache_parejas.leer(pdf_path, xml_path)
+                    previo = self.cache_parejas.buscar(clave)
+                if previo is not None:
+                    previo["id_factura"] = id_factura
+                    previo.update(_tiempos=tiempos, _patrones={}, _cache=True)
+                    return previo
+
             # 1) Extraer info de PDF y XML usando tus extractores
-            fac_pdf = parse_pdf_invoice(pdf_path)
-            fac_xml = parse_xml_invoice(xml_path)
+            ia_cfg = self.config.get("ia", {})
+            ia_enabled = ia_cfg.get("enabled", False)
+            # Tamaño y calidad del texto del PDF, solo si la compuerta los va a mirar
+            estadisticas_pdf = {} if ia_enabled and self.compuerta.activa else None
+            with cronometrar(tiempos, "extraccion_pdf"):
+                fac_pdf, uso_plantilla = self.plantillas.extraer(
+                    pdf_path, contenido_pdf, estadisticas_pdf
+                )
+            with cronometrar(tiempos, "extraccion_xml"):
+                fac_xml = parse_xml_invoice(xml_path, modo=self.modo_xml, contenido=contenido_xml)
 
             # =========================================================
             # 2) IA solo si faltan campos clave en el PDF
+            #    - y la compuerta cree que puede cambiar el resultado
             #    - NO pisa lo que ya tengas
             #    - Usa XML como "hint" opcional
             # =========================================================
-            ia_cfg = self.config.get("ia", {})
-            ia_enabled = ia_cfg.get("enabled", False)
 
             api_key = (
                 self.config.get("openai", {}).get("api_key")
@@ -125,17 +241,27 @@ class AgenteSupervisor:
             model = ia_cfg.get("model", os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
 
             CAMPOS_CLAVE = ["cufe", "numero", "nit_emisor", "total"]
+            compuerta = None  # decisión de la compuerta; viaja en res["_compuerta"]
 
             if ia_enabled and api_key:
                 faltantes = [c for c in CAMPOS_CLAVE if not fac_pdf.get(c)]
+                omitida = None
                 if faltantes:
+                    omitida = self.compuerta.decidir(faltantes, fac_xml, estadisticas_pdf)
+                if omitida:
+                    fac_pdf["_ia"] = {"omitida": omitida, "campos_faltantes_detectados": faltantes}
+                    compuerta = {"omitida": omitida}
+                elif faltantes:
+                    antes = dict(fac_pdf)
                     try:
-                        fac_pdf_ia = extraer_campos_pdf_con_ia(
-                            pdf_path=pdf_path,
-                            api_key=api_key,
-                            model=model,
-                            xml_hint=fac_xml,  # ayuda al modelo, sin obligarlo
-                        )
+                        with cronometrar(tiempos, "ia"):
+                            fac_pdf_ia = extraer_campos_pdf_con_ia(
+                                pdf_path=pdf_path,
+                                api_key=api_key,
+                                model=model,
+                                xml_hint=fac_xml,  # ayuda al modelo, sin obligarlo
+                            )
+                        uso_ia = fac_pdf_ia.pop("_uso", {}) or {}
 
                         # Rellenar SOLO vacíos
                         for k, v in fac_pdf_ia.items():
@@ -150,21 +276,47 @@ class AgenteSupervisor:
                             "nivel_confianza": fac_pdf_ia.get("nivel_confianza", None),
                             "observaciones": fac_pdf_ia.get("observaciones", []),
                             "campos_faltantes_detectados": faltantes,
+                            "tokens": uso_ia.get("tokens"),
                         }
 
+                        util = self.compuerta.fue_util(antes, fac_pdf, fac_xml)
+
                     except Exception as e_ia:
                         # Si IA falla, NO dañamos el flujo
                         fac_pdf["_ia"] = {
                             "modelo": model,
                             "error": f"IA fallo: {str(e_ia)}"
                         }
+                        util = None
+
+                    if self.compuerta.activa:
+                        compuerta = {
+                            "nit": (fac_xml or {}).get("nit_emisor"),
+                            "util": util,
+                            "tokens": fac_pdf["_ia"].get("tokens"),
+                            "segundos": tiempos.get("ia"),
+                        }
 
             # 3) Conciliar ambas fuentes campo por campo
-            conciliacion, requiere_revision_global = conciliar_factura(
-                fac_pdf,
-                fac_xml,
-                self.config,
+            with cronometrar(tiempos, "conciliacion"):
+                conciliacion, requiere_revision_global = conciliar_factura(
+                    fac_pdf,
+                    fac_xml,
+                    self.config,
+                )
+
+            # Plantilla del proveedor: aprende de esta factura o, si lo leído
+            # por posición no coincide con el camino general, lo corrige
+            corregido = self.plantillas.tras_conciliar(
+                uso_plantilla, fac_pdf, conciliacion, requiere_revision_global,
+                pdf_path, contenido_pdf,
             )
+            if corregido:
+                fac_pdf.update(corregido)
+                with cronometrar(tiempos, "conciliacion"):
+                    conciliacion, requiere_revision_global = conciliar_factura(
+                        fac_pdf, fac_xml, self.config
+                    )
 
             # Campos específicos a revisar (para que el resumen NO sea solo número)
             campos_a_revisar = [
@@ -172,7 +324,7 @@ class AgenteSupervisor:
                 if isinstance(det, dict) and det.get("requiere_revision") is True
             ]
 
-            return {
+            res = {
                 "id_factura": id_factura,
                 "pdf_raw": fac_pdf,
                 "xml_raw": fac_xml,
@@ -180,36 +332,90 @@ class AgenteSupervisor:
                 "requiere_revision_global": requiere_revision_global,
                 "campos_a_revisar": campos_a_revisar,
                 "error": None,
+                "_tiempos": tiempos,
+                "_patrones": tomar_aciertos(),
             }
+            if compuerta is not None:
+                res["_compuerta"] = compuerta
+            if self.cache_parejas.activa:
+                self.cache_parejas.guardar(clave, res)
+                res["_cache"] = False
+            return res
 
         except Exception as e:
             # No reventamos el flujo, marcamos la factura como error
-            return {
-                "id_factura": id_factura,
-                "pdf_raw": None,
-                "xml_raw": None,
-                "conciliacion": None,
-                "requiere_revision_global": True,
-                "campos_a_revisar": [],
-                "error": str(e),
-            }
+            return self._resultado_error(id_factura, str(e), tiempos, tomar_aciertos())
+
+    @staticmethod
+    def _resultado_error(id_factura: str, error: str, tiempos: dict, patrones: dict) -> dict:
+        """Resultado de una factura que no se pudo procesar."""
+        return {
+            "id_factura": id_factura,
+            "pdf_raw": None,
+            "xml_raw": None,
+            "conciliacion": None,
+            "requiere_revision_global": True,
+            "campos_a_revisar": [],
+            "error": error,
+            "_tiempos": tiempos,
+            "_patrones": patrones,
+        }
 
-    def actuar_guardar_resultados_zip(self, carpeta_zip: Path, resultados: list):
+    @classmethod
+    def _resultado_vencido(cls, tarea: Tarea, etapa: str, segundos: float) -> dict:
+        """
+        Resultado de una factura cortada por el vigilante de tiempos de
+        ejecucion.py: error "timeout:<etapa>" y los segundos que alcanzó.
+        """
+        return cls._resultado_error(
+            tarea.pdf_path.stem, f"timeout:{etapa}", {etapa: segundos}, {}
+        )
+
+    def actuar_guardar_resultados_zip(self, carpeta_zip: Path, resultados: list) -> list:
         """
         Guarda:
-          - Un JSON por factura.
+          - Un JSON por factura (o su versión compacta, ver serializacion.py).
           - Un CSV resumen por ZIP.
+        Devuelve un RegistroFactura por cada resultado guardado.
+        Con formato de salida "ninguno" no escribe nada (ruta vacía).
         """
+        registros = self._registros_zip(carpeta_zip, resultados)
+        if self.formato_salida != "ninguno":
+            self._escribir_zip((carpeta_zip, resultados, registros))
+        return registros
+
+    def _registros_zip(self, carpeta_zip: Path, resultados: list) -> list:
+        """Registros de un ZIP con la ruta donde queda (o quedará) cada JSON."""
+        if self.formato_salida == "ninguno":
+            return [self._registro(res, carpeta_zip.name, "") for res in resultados]
+
+        carpeta_out = self.dir_processed / carpeta_zip.name
+        ext = EXTENSIONES[self.formato_salida]
+        return [
+            self._registro(res, carpeta_zip.name, carpeta_out / f"{res['id_factura']}_conciliacion{ext}")
+            for res in resultados
+        ]
+
+    def _escribir_zip(self, trabajo: tuple):
+        """Escribe JSON + CSV de (carpeta_zip, resultados, registros)."""
+        carpeta_zip, resultados, registros = trabajo
+
         carpeta_out = self.dir_processed / carpeta_zip.name
         carpeta_out.mkdir(parents=True, exist_ok=True)
 
+        for res, reg in zip(resultados, registros):
+            guardar_resultado(reg.ruta, res, self.formato_salida)
+
+        self._escribir_csv_zip(carpeta_out, resultados)
+
+    @staticmethod
+    def _escribir_csv_zip(carpeta_out: Path, resultados: list):
+        """resumen_zip.csv de un ZIP: una fila por factura."""
+        import pandas as pd  # diferido: solo se necesita al guardar
+
         registros_resumen = []
 
         for res in resultados:
-            json_path = carpeta_out / f"{res['id_factura']}_conciliacion.json"
-            with json_path.open("w", encoding="utf-8") as f:
-                json.dump(res, f, ensure_ascii=False, indent=4, default=str)
-
             registros_resumen.append({
                 "id_factura": res["id_factura"],
                 "requiere_revision_global": res["requiere_revision_global"],
@@ -224,42 +430,506 @@ class AgenteSupervisor:
             encoding="utf-8-sig",
         )
 
+    @staticmethod
+    def _estado_resultado(res: dict) -> str:
+        """Estado final de una factura: 'error', 'revision' u 'ok'."""
+        if res.get("error"):
+            return "error"
+        if res.get("requiere_revision_global"):
+            return "revision"
+        return "ok"
+
+    @staticmethod
+    def _registro_desde_lista(r: list) -> RegistroFactura:
+        """RegistroFactura leído de un JSONL (ahí campos_a_revisar es lista)."""
+        return RegistroFactura(*r[:4], tuple(r[4]), r[5])
+
+    @classmethod
+    def _registro(cls, res: dict, nombre_zip: str, ruta: Path | str) -> RegistroFactura:
+        conciliacion = res.get("conciliacion") or {}
+        nit = (
+            (conciliacion.get("nit_emisor") or {}).get("valor_resuelto")
+            or (res.get("xml_raw") or {}).get("nit_emisor")
+        )
+        return RegistroFactura(
+            id_factura=res["id_factura"],
+            zip=nombre_zip,
+            estado=cls._estado_resultado(res),
+            nit=nit,
+            campos_a_revisar=tuple(res.get("campos_a_revisar") or ()),
+            ruta=str(ruta),
+        )
+
     # ==== Bucle principal ====
-    def ciclo_principal(self):
+    @staticmethod
+    def _evento_progreso(n_zip: int, zips_total: int, facturas: int, inicio: float) -> dict:
+        """Evento de avance para las interfaces (ZIP n de N, facturas/seg, ETA)."""
+        transcurrido = time.perf_counter() - inicio
+        eta = transcurrido / n_zip * (zips_total - n_zip) if n_zip else None
+        return {
+            "tipo": "zip",
+            "zip_actual": n_zip,
+            "zips_total": zips_total,
+            "facturas": facturas,
+            "facturas_por_seg": facturas / transcurrido if transcurrido > 0 else 0.0,
+            "eta_seg": eta,
+        }
+
+    def registrar_metricas(self, res: dict):
+        """Pasa a Prometheus los tiempos y aciertos de regex que trae el
+        resultado y los retira."""
+        aciertos = res.pop("_patrones", None) or {}
+        if aciertos:
+            self.aciertos_patrones.update(aciertos)
+            self.metricas.patrones(aciertos)
+        compuerta = res.pop("_compuerta", None)
+        if compuerta is not None:
+            self.compuerta.registrar(compuerta)
+        en_cache = res.pop("_cache", None)
+        if en_cache is not None:
+            self.consultas_cache[en_cache] += 1
+            self.metricas.cache("parejas", en_cache)
+        tiempos = res.pop("_tiempos", None) or {}
+        for etapa, segundos in tiempos.items():
+            if etapa == "ia":
+                tokens = ((res.get("pdf_raw") or {}).get("_ia") or {}).get("tokens")
+                self.metricas.ia(segundos, tokens)
+            else:
+                self.metricas.observar_etapa(etapa, segundos)
+        self.metricas.factura(self._estado_resultado(res))
+
+    def _generar_tareas(self, zips_pendientes, estado_zips: dict, cancelar=None):
+        """
+        Extrae los ZIP uno a uno y va entregando sus parejas como Tareas.
+        Es perezoso: el ZIP siguiente se extrae cuando el ejecutor pide más
+        (zips_pendientes, pares (zip_idx, zip_path) en orden de despacho,
+        puede ser un generador, p. ej. la cola distribuida).
+        """
+        for zip_idx, zip_path in zips_pendientes:
+            if cancelar is not None and cancelar.is_set():
+                return
+
+            print(f"\n[AGENTE] Procesando ZIP: {zip_path.name}")
+            with self.metricas.etapa("extraer_zip"):
+                carpeta_zip = self.extraer_zip(zip_path)
+            parejas = self.emparejar_facturas(carpeta_zip)
+            print(f"[AGENTE] Facturas emparejadas: {len(parejas)}")
+
+            # Al reanudar, las facturas ya registradas en el diario no se rehacen
+            hechas = self.diario.parejas_hechas(zip_path.name)
+            previas = [
+                (orden, hechas[pdf_path.stem])
+                for orden, (pdf_path, _) in enumerate(parejas)
+                if pdf_path.stem in hechas
+            ]
+
+            estado_zips[zip_idx] = {
+                "zip": zip_path,
+                "carpeta": carpeta_zip,
+                "faltan": len(parejas) - len(previas),
+                "resultados": previas,
+            }
+            self._en_cola += len(parejas) - len(previas)
+            self.metricas.cola(self._en_cola)
+
+            for orden, pdf_path, xml_path in ordenar_parejas(parejas, self.planificacion):
+                if pdf_path.stem not in hechas:
+                    yield Tarea(zip_idx, orden, carpeta_zip, pdf_path, xml_path)
+
+    def _cerrar_zip(
+        self,
+        zip_idx: int,
+        estado_zips: dict,
+        registros_por_zip: dict,
+        al_cerrar_zip=None,
+    ):
+        """
+        Guarda JSON + CSV de un ZIP (resultados en el orden de sus parejas)
+        a través del escritor diferido. al_cerrar_zip(zip_path, registros)
+        se llama solo si el ZIP quedó completo (no en los ZIPs a medias de
+        una cancelación) y cuando sus archivos ya están escritos.
+        """
+        estado = estado_zips.pop(zip_idx)
+        resultados = [res for _, res in sorted(estado["resultados"], key=lambda x: x[0])]
+        registros = self._registros_zip(estado["carpeta"], resultados)
+        registros_por_zip[zip_idx] = registros
+
+        def al_escribir():
+            # Un ZIP a medias (cancelación) no borra las filas que le faltan
+            completo = estado["carpeta"].name if estado["faltan"] == 0 else None
+            self.indice.indexar_zip(resultados, registros, completo)
+            if estado["faltan"] == 0:
+                self.diario.zip_cerrado(estado["zip"].name, registros)
+                if al_cerrar_zip is not None:
+                    al_cerrar_zip(estado["zip"], registros)
+
+        if self.formato_salida == "ninguno":
+            al_escribir()
+        else:
+            self._escritor.enviar((estado["carpeta"], resultados, registros), al_escribir)
+        self.metricas.exportar()
+
+    def _guardar_con_metricas(self, trabajo: tuple):
+        with self.metricas.etapa("guardado"):
+            self._escribir_zip(trabajo)
+
+    def _crear_escritor(self):
+        """Escritor de resultados según CONFIG["salida"] (diferido por defecto)."""
+        cfg = self.config.get("salida", {})
+        if not cfg.get("escritura_diferida", True):
+            return EscritorDirecto(self._guardar_con_metricas)
+        return EscritorDiferido(
+            self._guardar_con_metricas,
+            cola_max=cfg.get("cola_escritura", 8),
+            lote=cfg.get("lote_escritura", 4),
+        )
+
+    def _procesar_zips(
+        self,
+        zips,
+        zips_total: int,
+        progreso=None,
+        cancelar=None,
+        al_cerrar_zip=None,
+        registros_previos: dict | None = None,
+    ):
+        """
+        Procesa los ZIP que entregue `zips` (pares (zip_idx, zip_path), lista
+        o generador) y devuelve (registros en orden de zip_idx, cancelado).
+        registros_previos: {zip_idx: registros} de ZIPs ya cerrados (reanudación).
+        No calcula ni guarda el resumen.
+        """
+        estado_zips = {}        # zip_idx -> {"zip", "carpeta", "faltan", "resultados"}
+        registros_por_zip = dict(registros_previos or {})  # zip_idx -> [RegistroFactura, ...]
+        facturas_hechas = 0
+        self._en_cola = 0
+        self.aciertos_patrones.clear()
+        self.consultas_cache.clear()
+        self.compuerta.iniciar_corrida()
+        self.estadisticas_ejecucion.clear()
+        inicio = time.perf_counter()
+        if progreso:
+            progreso({"tipo": "inicio", "zips_total": zips_total})
+
+        def zips_listos():
+            # ZIPs ya extraídos a los que no les queda ninguna pareja pendiente
+            for zip_idx in sorted(i for i, e in estado_zips.items() if e["faltan"] == 0):
+                self._cerrar_zip(zip_idx, estado_zips, registros_por_zip, al_cerrar_zip)
+                if progreso:
+                    progreso(self._evento_progreso(
+                        len(registros_por_zip), zips_total, facturas_hechas, inicio
+                    ))
+
+        # Todo lo que se envía al escritor queda en disco al salir (también con error)
+        self.indice = abrir_indice(self.config)
+        self._escritor = self._crear_escritor()
+        try:
+            tareas = self._generar_tareas(zips, estado_zips, cancelar)
+            for tarea, res in ejecutar_tareas(
+                tareas,
+                self.procesar_pareja,
+                self.workers,
+                self.config,
+                cancelar=cancelar,
+                al_cambiar_en_vuelo=lambda n: self.metricas.workers(n, self.workers),
+                estadisticas=self.estadisticas_ejecucion,
+                vencida=self._resultado_vencido,
+            ):
+                self.registrar_metricas(res)
+                facturas_hechas += 1
+                self._en_cola -= 1
+                self.metricas.cola(self._en_cola)
+
+                estado = estado_zips[tarea.zip_idx]
+                self.diario.pareja(estado["zip"].name, res)
+                estado["resultados"].append((tarea.orden, res))
+                estado["faltan"] -= 1
+
+                if progreso:
+                    progreso({
+                        "tipo": "factura",
+                        "id_factura": res["id_factura"],
+                        "estado": self._estado_resultado(res),
+                    })
+                zips_listos()
+
+            # ZIPs sin parejas (o el último, si no hubo resultados después)
+            zips_listos()
+
+            cancelado = cancelar is not None and cancelar.is_set()
+            if cancelado:
+                # Lo ya procesado de ZIPs a medias también se guarda
+                for zip_idx in sorted(i for i, e in estado_zips.items() if e["resultados"]):
+                    self._cerrar_zip(zip_idx, estado_zips, registros_por_zip, al_cerrar_zip)
+        finally:
+            self._escritor.cerrar()
+            self.indice.cerrar()
+            self.indice = IndiceNulo()
+
+        est = self.estadisticas_ejecucion
+        if est:
+            print(
+                f"[AGENTE] Utilización de workers: {est['utilizacion']:.0%} "
+                f"({est['workers']} workers, cola final {est['cola_final_seg']:.1f} s)"
+            )
+        if est.get("memoria_workers"):
+            pico = est["rss_pico_mb"]
+            print(
+                f"[AGENTE] Memoria de workers: pico {pico if pico is not None else '?'} MB, "
+                f"{est['reciclajes']} reciclajes"
+            )
+        if est.get("vencidas"):
+            print(f"[AGENTE] ⚠ {est['vencidas']} facturas cortadas por tiempo (timeout)")
+        if self.aciertos_patrones:
+            reglas = ", ".join(f"{k}={v}" for k, v in sorted(self.aciertos_patrones.items()))
+            print(f"[AGENTE] Aciertos por regla de extracción: {reglas}")
+        if self.consultas_cache:
+            print(
+                f"[AGENTE] Caché de parejas: {self.consultas_cache[True]} aciertos de "
+                f"{sum(self.consultas_cache.values())} facturas"
+            )
+        resumen_ia = self.compuerta.resumen()
+        if resumen_ia:
+            print(f"[AGENTE] Compuerta IA: {resumen_ia}")
+        self.compuerta.guardar()
+
+        registros = [
+            reg for zip_idx in sorted(registros_por_zip) for reg in registros_por_zip[zip_idx]
+        ]
+        return registros, cancelado
+
+    def ciclo_principal(self, progreso=None, cancelar=None):
         """
         Bucle principal del agente:
           1. Detecta ZIPs en self.dir_zips.
           2. Por cada ZIP:
              - extrae el ZIP
              - empareja PDF/XML
-             - procesa cada pareja
-             - guarda JSON + CSV por ZIP
+             - procesa cada pareja (en paralelo si self.workers > 1)
+             - guarda JSON + CSV por ZIP cuando terminan todas sus parejas
           3. A partir de TODOS los resultados, calcula resumen global
              y lo guarda en data/logs/resumen_global_agente.json
+
+        progreso: callable opcional que recibe un dict por evento
+                  ({"tipo": "inicio"|"factura"|"zip", ...}).
+        cancelar: threading.Event opcional; si se activa, se guarda lo
+                  procesado hasta el momento y el resumen sale con
+                  "cancelado": True.
         """
         zips_pendientes = self.percibir_zips_pendientes()
         print(f"[AGENTE] ZIPs pendientes: {len(zips_pendientes)}")
 
-        todos_los_resultados = []
+        self.diario = self._abrir_diario()
+        try:
+            # ZIPs que el diario ya da por cerrados: solo se recuperan sus registros
+            cerrados = self.diario.zips_cerrados()
+            registros_previos = {
+                zip_idx: [self._registro_desde_lista(r) for r in cerrados[z.name]]
+                for zip_idx, z in enumerate(zips_pendientes)
+                if z.name in cerrados
+            }
+            if self.diario.reanudado:
+                print(
+                    f"[AGENTE] Reanudando corrida interrumpida: {len(registros_previos)} "
+                    f"ZIPs ya cerrados según el diario."
+                )
+
+            todos_los_registros, cancelado = self._procesar_zips(
+                [
+                    (zip_idx, z)
+                    for zip_idx, z in ordenar_zips(zips_pendientes, self.planificacion)
+                    if zip_idx not in registros_previos
+                ],
+                len(zips_pendientes),
+                progreso,
+                cancelar,
+                registros_previos=registros_previos,
+            )
+            resumen = self.calcular_resumen(todos_los_registros)
+            est = self.estadisticas_ejecucion
+            if est.get("memoria_workers"):
+                # Solo en modo paralelo: pico de RSS por worker y reciclajes
+                resumen["memoria_workers"] = {
+                    "rss_pico_mb": est["rss_pico_mb"],
+                    "reciclajes": est["reciclajes"],
+                    "por_worker": est["memoria_workers"],
+                }
+            if cancelado:
+                print("\n[AGENTE] ⚠ Ejecución cancelada: el resumen es parcial.")
+                resumen["cancelado"] = True
+
+            print("\n[AGENTE] Resumen global:", resumen)
+
+            self.guardar_resumen(resumen)
+            if not cancelado:
+                self.diario.fin()
+        finally:
+            self.diario.cerrar()
+            self.diario = DiarioNulo()
+
+        self.metricas.workers(0, self.workers)
+        self.metricas.exportar()
+        return resumen
 
-        for zip_path in zips_pendientes:
-            print(f"\n[AGENTE] Procesando ZIP: {zip_path.name}")
-            carpeta_zip = self.extraer_zip(zip_path)
-            parejas = self.emparejar_facturas(carpeta_zip)
-            print(f"[AGENTE] Facturas emparejadas: {len(parejas)}")
+    def _abrir_diario(self):
+        """Diario de la corrida según CONFIG["diario"] (DiarioNulo si está apagado)."""
+        cfg = self.config.get("diario", {})
+        if not cfg.get("enabled", True):
+            return DiarioNulo()
+
+        nombre = "diario_ejecucion"
+        if self.particion is not None:
+            nombre += "_{}-de-{}".format(*self.particion)
+        huella = {
+            "carpeta_zips": str(Path(self.dir_zips).resolve()),
+            "particion": list(self.particion) if self.particion else None,
+            "formato_salida": self.formato_salida,
+            "dir_processed": str(Path(self.dir_processed).resolve()),
+            # Versiones y configuración que cambian el resultado: con otras
+            # reglas no se reaprovecha lo hecho
+            "contexto": _huella_contexto(self.config),
+        }
+        return DiarioEjecucion(
+            self.dir_logs / f"{nombre}.jsonl",
+            huella,
+            reanudar=cfg.get("reanudar", True),
+            fsync_cada=cfg.get("fsync_cada", 64),
+            fsync_seg=cfg.get("fsync_seg", 1.0),
+        )
 
-            resultados_zip = []
-            for pdf_path, xml_path in parejas:
-                res = self.procesar_pareja(pdf_path, xml_path)
-                resultados_zip.append(res)
+    # ==== Modo distribuido ====
+    def dir_cola_por_defecto(self) -> Path:
+        dir_cola = self.config.get("distribuido", {}).get("dir_cola")
+        return Path(dir_cola) if dir_cola else self.dir_logs / "cola"
 
-            # Guarda JSON + CSV por carpeta de ese ZIP
-            self.actuar_guardar_resultados_zip(carpeta_zip, resultados_zip)
+    def ciclo_distribuido(
+        self,
+        dir_cola: Path | None = None,
+        worker_id: str | None = None,
+        ttl: float | None = None,
+        progreso=None,
+        cancelar=None,
+    ) -> dict | None:
+        """
+        Igual que ciclo_principal, pero varios agentes (procesos o máquinas)
+        comparten la carpeta de ZIPs a través de una cola de arriendos en
+        dir_cola (ver cola_trabajo.py). Cada ZIP lo procesa un solo agente;
+        si uno muere, su ZIP se reasigna cuando vence el arriendo.
+
+        Un agente sale cuando ya no queda ningún ZIP pendiente (propio o
+        ajeno): entonces fusiona los parciales de todos y escribe
+        resumen_global_agente.json (si varios terminan a la vez, todos
+        escriben el mismo resumen). Devuelve ese resumen, o None si se
+        canceló (se puede fusionar luego con fusionar_resumen_distribuido).
+        """
+        cfg = self.config.get("distribuido", {})
+        if dir_cola is None:
+            dir_cola = self.dir_cola_por_defecto()
+        if ttl is None:
+            ttl = float(cfg.get("ttl_seg", 300))
+
+        cola = ColaArrendamientos(dir_cola, worker_id=worker_id, ttl=ttl)
+        zips = self.percibir_zips_pendientes()
+        # Se intenta reclamar en orden de despacho; zip_idx sigue siendo alfabético
+        despacho = ordenar_zips(zips, self.planificacion)
+        idx_por_nombre = {z.name: i for i, z in despacho}
+        zips_despacho = [z for _, z in despacho]
+        print(f"[AGENTE] Worker {cola.worker_id}: {len(zips)} ZIPs en la carpeta compartida")
+
+        registros = []
+        try:
+            with cola.latido():
+                # Cada ronda procesa lo que se pudo reclamar. Si quedan ZIPs con
+                # arriendo ajeno, se espera y se reintenta: si ese worker murió,
+                # su arriendo vence y el ZIP se recupera en una ronda siguiente.
+                while True:
+                    regs, cancelado = self._procesar_zips(
+                        (
+                            (idx_por_nombre[z.name], z)
+                            for z in cola.reclamar_disponibles(zips_despacho, cancelar=cancelar)
+                        ),
+                        len(zips),
+                        progreso,
+                        cancelar,
+                        al_cerrar_zip=lambda zip_path, r: cola.completar(zip_path.name, r),
+                    )
+                    registros.extend(regs)
+                    if cancelado or not cola.pendientes(zips):
+                        break
+                    time.sleep(min(2.0, ttl / 3))
+        finally:
+            # Arriendos de ZIPs que no alcanzaron a completarse (cancelación o error)
+            cola.liberar()
+
+        print(f"[AGENTE] Worker {cola.worker_id}: {len(registros)} facturas propias")
+        self.metricas.workers(0, self.workers)
+        self.metricas.exportar()
+
+        if cancelado or cola.pendientes(zips):
+            print("[AGENTE] ⚠ Worker cancelado: quedan ZIPs pendientes en la cola.")
+            return None
+        return self.fusionar_resumen_distribuido(dir_cola)
+
+    def fusionar_resumen_distribuido(self, dir_cola: Path | None = None) -> dict:
+        """Une los parciales de todos los workers en resumen_global_agente.json."""
+        if dir_cola is None:
+            dir_cola = self.dir_cola_por_defecto()
+        registros = [self._registro_desde_lista(r) for r in fusionar_parciales(dir_cola)]
+
+        resumen = self.calcular_resumen(registros)
+        print("\n[AGENTE] Resumen global (fusionado):", resumen)
+        self.guardar_resumen(resumen)
+        return resumen
+
+    # ==== Reconciliación de lo ya guardado ====
+    def reconciliar_guardados(self, progreso=None) -> dict:
+        """
+        Vuelve a conciliar, con la configuración actual, los resultados ya
+        guardados en data/processed (sus pdf_raw / xml_raw), sin leer PDF
+        ni XML (ver reconciliacion.py). Reescribe solo lo que cambió,
+        actualiza el índice y guarda el resumen global.
+        """
+        from .reconciliacion import carpetas_con_resultados, reconciliar_carpetas
+
+        carpetas = carpetas_con_resultados(self.dir_processed)
+        print(f"[AGENTE] Reconciliando resultados guardados: {len(carpetas)} ZIPs en {self.dir_processed}")
+        if progreso:
+            progreso({"tipo": "inicio", "zips_total": len(carpetas)})
+
+        registros = []
+        conciliadas = reescritas = zips_reescritos = 0
+        inicio = time.perf_counter()
+        self.indice = abrir_indice(self.config)
+        try:
+            hechos = reconciliar_carpetas(carpetas, self.config, self.workers)
+            for n_zip, hecho in enumerate(hechos, start=1):
+                registros.extend(hecho["registros"])
+                conciliadas += hecho["conciliadas"]
+                if hecho["cambiados"]:
+                    reescritas += len(hecho["cambiados"])
+                    zips_reescritos += 1
+                    self.indice.indexar_zip(*zip(*hecho["cambiados"]))
+                if progreso:
+                    progreso(self._evento_progreso(n_zip, len(carpetas), len(registros), inicio))
+        finally:
+            self.indice.cerrar()
+            self.indice = IndiceNulo()
+
+        segundos = time.perf_counter() - inicio
+        print(
+            f"[AGENTE] Reconciliadas {conciliadas} facturas en {segundos:.1f} s; "
+            f"{reescritas} cambiaron ({zips_reescritos} ZIPs reescritos)"
+        )
+        resumen = self.calcular_resumen(registros)
+        print("\n[AGENTE] Resumen global (reconciliado):", resumen)
+        self.guardar_resumen(resumen)
+        return resumen
 
-            # Acumula para el resumen global
-            todos_los_resultados.extend(resultados_zip)
+    # ==== Resumen global ====
+    def calcular_resumen(self, registros: list) -> dict:
+        """Recalcula contadores, IDs y detalle de revisión a partir de los registros."""
+        self.registros = list(registros)
 
-        # === Recalcular resumen global a partir de todos_los_resultados ===
         self.facturas_ok = 0
         self.facturas_con_revision = 0
         self.facturas_error = 0
@@ -269,26 +939,26 @@ class AgenteSupervisor:
         self.ids_facturas_error = []
         self.detalle_revision = {}
 
-        for res in todos_los_resultados:
-            id_factura = res.get("id_factura")
+        for reg in self.registros:
+            id_factura = reg.id_factura
 
-            if res.get("error"):
+            if reg.estado == "error":
                 self.facturas_error += 1
                 if id_factura:
                     self.ids_facturas_error.append(id_factura)
 
-            elif res.get("requiere_revision_global"):
+            elif reg.estado == "revision":
                 self.facturas_con_revision += 1
                 if id_factura:
                     self.ids_facturas_con_revision.append(id_factura)
-                    self.detalle_revision[id_factura] = res.get("campos_a_revisar", [])
+                    self.detalle_revision[id_factura] = list(reg.campos_a_revisar)
 
             else:
                 self.facturas_ok += 1
                 if id_factura:
                     self.ids_facturas_ok.append(id_factura)
 
-        resumen = {
+        return {
             "facturas_ok": self.facturas_ok,
             "facturas_con_revision": self.facturas_con_revision,
             "facturas_error": self.facturas_error,
@@ -298,10 +968,7 @@ class AgenteSupervisor:
             "detalle_revision": self.detalle_revision,
         }
 
-        print("\n[AGENTE] Resumen global:", resumen)
-
+    def guardar_resumen(self, resumen: dict):
         resumen_path = self.dir_logs / "resumen_global_agente.json"
         with resumen_path.open("w", encoding="utf-8") as f:
             json.dump(resumen, f, ensure_ascii=False, indent=4)
-
-        return resumen
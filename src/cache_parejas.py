@@ -0,0 +1,151 @@
+"""
+Caché de resultados por pareja PDF/XML.
+
+Los proveedores reenvían los mismos documentos dentro de ZIPs con otro
+nombre y la ingesta de correo duplica adjuntos. Con CONFIG["cache_parejas"]
+encendida, procesar_pareja lee cada archivo una sola vez, calcula su huella
+(BLAKE2b) sobre esos mismos bytes y busca el resultado por
+
+    (huella PDF, huella XML, VERSION_EXTRACCION, VERSION_REGLAS,
+     configuración que cambia el resultado: comparación, prioridad de
+     fuentes, modelo de IA y compuerta (con sus umbrales de texto) si la IA
+     está activa, plantillas y motor del PDF)
+
+Si ya estaba, lo devuelve sin pasar por pdfplumber, las regex ni la IA; si
+no, los extractores trabajan sobre los bytes ya leídos (sin abrir el
+archivo otra vez) y el resultado se guarda.
+
+Cada resultado es un archivo en formato compacto (Decimal sin pérdida, ver
+serializacion.py) bajo dir/<2 primeros hex>/<clave>.cjson, escrito con
+os.replace: varios workers o procesos pueden compartir la carpeta. No se
+guardan facturas con error ni con fallo de IA (un reintento puede salir
+bien), ni aquellas en que la compuerta omitió la IA por "historial": esa
+decisión depende del historial de llamadas del proveedor, que cambia
+entre corridas.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from .conciliacion import VERSION_REGLAS
+from .patrones import VERSION_EXTRACCION
+from .serializacion import EXTENSIONES, codificar_resultado, decodificar_resultado
+
+FORMATO = "compacto"
+
+
+def leer_con_huella(ruta: Path) -> tuple[bytes, str]:
+    """Bytes del archivo y su huella, en una sola lectura."""
+    with open(ruta, "rb") as f:
+        contenido = f.read()
+    return contenido, hashlib.blake2b(contenido, digest_size=20).hexdigest()
+
+
+def _huella_contexto(config: dict) -> str:
+    """Versiones y configuración de las que depende el resultado de una pareja."""
+    ia_cfg = config.get("ia", {})
+    api_key = config.get("openai", {}).get("api_key") or os.getenv("OPENAI_API_KEY", "")
+    modelo_ia = None
+    if ia_cfg.get("enabled", False) and api_key:
+        compuerta = config.get("compuerta_ia", {})
+        modelo_ia = [
+            ia_cfg.get("model", os.getenv("OPENAI_MODEL", "gpt-4o-mini")),
+            compuerta.get("enabled", True),
+            # Umbrales del motivo "texto" (ver compuerta_ia.py)
+            compuerta.get("min_caracteres", 200),
+            compuerta.get("min_legibles", 0.6),
+        ]
+    contexto = [
+        VERSION_EXTRACCION,
+        VERSION_REGLAS,
+        config.get("comparacion", {}),
+        config.get("prioridad_fuente", {}),
+        modelo_ia,
+        config.get("plantillas_pdf", {}).get("enabled", False),
+        config.get("extraccion", {}).get("pdf_motor", "regex"),
+    ]
+    return json.dumps(contexto, sort_keys=True, default=str)
+
+
+def _se_puede_guardar(res: dict) -> bool:
+    if res.get("error"):
+        return False
+    ia = (res.get("pdf_raw") or {}).get("_ia") or {}
+    return not ia.get("error") and ia.get("omitida") != "historial"
+
+
+class CacheParejasNula:
+    """Sin caché: los extractores leen los archivos como siempre."""
+
+    activa = False
+
+    def leer(self, pdf_path: Path, xml_path: Path) -> tuple[bytes | None, bytes | None, str | None]:
+        return None, None, None
+
+    def buscar(self, clave: str | None) -> dict | None:
+        return None
+
+    def guardar(self, clave: str | None, res: dict):
+        pass
+
+
+class CacheParejas(CacheParejasNula):
+    activa = True
+
+    def __init__(self, directorio: Path, config: dict):
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._contexto = _huella_contexto(config)
+
+    def leer(self, pdf_path: Path, xml_path: Path) -> tuple[bytes, bytes, str]:
+        """(bytes del PDF, bytes del XML, clave de la pareja)."""
+        contenido_pdf, huella_pdf = leer_con_huella(pdf_path)
+        contenido_xml, huella_xml = leer_con_huella(xml_path)
+        clave = hashlib.blake2b(
+            f"{huella_pdf}:{huella_xml}:{self._contexto}".encode("utf-8"), digest_size=20
+        ).hexdigest()
+        return contenido_pdf, contenido_xml, clave
+
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / clave[:2] / f"{clave}{EXTENSIONES[FORMATO]}"
+
+    def buscar(self, clave: str | None) -> dict | None:
+        """Resultado guardado de la pareja, o None."""
+        if clave is None:
+            return None
+        try:
+            with open(self._ruta(clave), "rb") as f:
+                return decodificar_resultado(f.read(), FORMATO)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            return None  # archivo a medias o dañado: se recalcula y se reescribe
+
+    def guardar(self, clave: str | None, res: dict):
+        if clave is None or not _se_puede_guardar(res):
+            return
+        # Sin los datos de paso (_tiempos, _patrones...): son de esta corrida
+        datos = codificar_resultado({k: v for k, v in res.items() if not k.startswith("_")}, FORMATO)
+        ruta = self._ruta(clave)
+        temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+        try:
+            ruta.parent.mkdir(exist_ok=True)
+            with open(temporal, "wb") as f:
+                f.write(datos)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            # Sin caché la factura igual queda procesada
+            print(f"[AGENTE] ⚠ No se pudo guardar en la caché de parejas: {e}")
+
+
+def abrir_cache_parejas(config: dict):
+    """Caché según CONFIG["cache_parejas"] (CacheParejasNula si está apagada)."""
+    cfg = config.get("cache_parejas", {})
+    if not cfg.get("enabled", False):
+        return CacheParejasNula()
+    directorio = cfg.get("dir") or Path(config["rutas"]["data_logs"]) / "cache_parejas"
+    return CacheParejas(Path(directorio), config)
@@ -0,0 +1,522 @@
+"""
+Línea de comandos no interactiva del proyecto CAFE.
+
+Pensada para cron, contenedores y lotes grandes: no pregunta nada, todo
+llega por argumentos, y el código de salida refleja el resultado.
+
+    python -m src.cli_cafe procesar --entrada datos_adjuntos --workers 4 --json
+
+Varias máquinas (o procesos) sobre una carpeta compartida:
+
+    python -m src.cli_cafe distribuido --entrada /compartido/zips --dir-cola /compartido/cola
+    python -m src.cli_cafe fusionar --dir-cola /compartido/cola
+
+Consultas sobre los resultados guardados (índice SQLite, ver
+src/indice_resultados.py):
+
+    python -m src.cli_cafe consultar --reindexar --nit 900123456 \
+        --desde 2025-01-01 --hasta 2025-03-31 --campo total
+
+Tras cambiar la tolerancia o la prioridad de fuentes en config_basica.json,
+volver a conciliar lo ya guardado sin leer de nuevo PDF ni XML (ver
+src/reconciliacion.py):
+
+    python -m src.cli_cafe reconciliar --salida data/processed --workers 4
+
+Y antes de cambiarlas, cuántas facturas pasarían entre OK y revisión con
+cada política candidata, sin escribir nada (ver src/simulador_politicas.py):
+
+    python -m src.cli_cafe simular --tolerancias 0.01,1,100 --prioridad-montos xml,pdf
+
+Como servicio HTTP local (ver src/servicio_http.py):
+
+    python -m src.cli_cafe servir --puerto 8765 --trabajos-paralelos 2
+
+Códigos de salida:
+    0  todas las facturas OK
+    1  error fatal (carpeta inexistente, excepción no controlada)
+    2  argumentos inválidos (argparse)
+    3  hay facturas que requieren revisión (sin errores)
+    4  hay facturas con error
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import copy
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from config import obtener_config
+
+SALIDA_OK = 0
+SALIDA_FATAL = 1
+SALIDA_REVISION = 3
+SALIDA_ERRORES = 4
+
+
+def codigo_salida(resumen: dict) -> int:
+    if resumen.get("facturas_error"):
+        return SALIDA_ERRORES
+    if resumen.get("facturas_con_revision"):
+        return SALIDA_REVISION
+    return SALIDA_OK
+
+
+def _particion(valor: str) -> tuple[int, int]:
+    """'k/n' -> (k, n), con 0 <= k < n."""
+    try:
+        k, n = (int(x) for x in valor.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("usa el formato k/n, por ejemplo 0/4")
+    if n <= 0 or not 0 <= k < n:
+        raise argparse.ArgumentTypeError("se requiere 0 <= k < n")
+    return k, n
+
+
+def _monto(valor: str) -> Decimal:
+    """Monto de la línea de comandos -> Decimal finito."""
+    try:
+        monto = Decimal(valor.strip())
+    except InvalidOperation:
+        raise argparse.ArgumentTypeError(f"monto inválido: {valor!r}")
+    if not monto.is_finite():
+        raise argparse.ArgumentTypeError(f"monto no finito: {valor!r}")
+    return monto
+
+
+def _config_desde_args(args) -> dict:
+    """Copia de CONFIG con lo que venga por línea de comandos encima."""
+    config = copy.deepcopy(obtener_config())
+    rutas = config["rutas"]
+
+    if args.entrada:
+        rutas["datos_adjuntos"] = rutas["datos_adjuntos_default"] = args.entrada
+    if args.salida:
+        rutas["data_processed"] = args.salida
+    if args.dir_raw:
+        rutas["data_raw"] = args.dir_raw
+    if args.dir_logs:
+        rutas["data_logs"] = args.dir_logs
+
+    if args.formato_salida:
+        config.setdefault("salida", {})["formato"] = args.formato_salida
+    if args.workers is not None:
+        config.setdefault("ejecucion", {})["workers"] = args.workers
+    if args.ia is not None:
+        config.setdefault("ia", {})["enabled"] = args.ia
+    if getattr(args, "cache_dir", None):
+        config["cache_parejas"] = {"enabled": True, "dir": args.cache_dir}
+    if getattr(args, "reiniciar", False):
+        config.setdefault("diario", {})["reanudar"] = False
+
+    return config
+
+
+def _ejecutar_agente(args, correr, requiere_zips: bool = True) -> int:
+    """
+    Arma el agente desde los argumentos, ejecuta correr(agente) -> resumen
+    y reporta. Si correr devuelve None (worker distribuido cancelado) no
+    hay resumen global que reportar.
+    """
+    from .agente_supervisor import AgenteSupervisor
+
+    config = _config_desde_args(args)
+    carpeta_zips = config["rutas"]["datos_adjuntos_default"]
+    if requiere_zips and not Path(carpeta_zips).is_dir():
+        print(f"[CLI] La carpeta de ZIPs no existe: {carpeta_zips}", file=sys.stderr)
+        return SALIDA_FATAL
+
+    # Con --json, stdout queda solo para el resumen; los logs van a stderr
+    destino_logs = sys.stderr if args.json else sys.stdout
+
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(destino_logs):
+        agente = AgenteSupervisor(
+            config=config,
+            carpeta_zips=Path(carpeta_zips),
+            particion=getattr(args, "particion", None),
+        )
+        resumen = correr(agente)
+    segundos = time.perf_counter() - inicio
+
+    if resumen is None:
+        if args.json:
+            json.dump({"resumen": None, "codigo_salida": SALIDA_OK}, sys.stdout)
+            sys.stdout.write("\n")
+        else:
+            print(f"\nWorker detenido tras {segundos:.1f} s; la cola quedó con ZIPs pendientes.")
+        return SALIDA_OK
+
+    codigo = codigo_salida(resumen)
+    facturas = (
+        resumen["facturas_ok"] + resumen["facturas_con_revision"] + resumen["facturas_error"]
+    )
+
+    if args.json:
+        salida = {
+            "facturas": facturas,
+            "facturas_ok": resumen["facturas_ok"],
+            "facturas_con_revision": resumen["facturas_con_revision"],
+            "facturas_error": resumen["facturas_error"],
+            "segundos": round(segundos, 3),
+            "facturas_por_seg": round(facturas / segundos, 2) if segundos else None,
+            "workers": agente.workers,
+            "utilizacion": agente.estadisticas_ejecucion.get("utilizacion"),
+            "rss_pico_mb": agente.estadisticas_ejecucion.get("rss_pico_mb"),
+            "reciclajes": agente.estadisticas_ejecucion.get("reciclajes"),
+            "codigo_salida": codigo,
+        }
+        if not args.solo_conteos:
+            salida["resumen"] = resumen
+        json.dump(salida, sys.stdout, ensure_ascii=False)
+        sys.stdout.write("\n")
+    else:
+        print("\n=== RESUMEN GLOBAL DEL AGENTE ===")
+        print(f"Facturas OK:            {resumen['facturas_ok']}")
+        print(f"Facturas con revisión:  {resumen['facturas_con_revision']}")
+        print(f"Facturas con error:     {resumen['facturas_error']}")
+        print(f"Tiempo:                 {segundos:.1f} s ({agente.workers} workers)")
+
+    return codigo
+
+
+def comando_procesar(args) -> int:
+    return _ejecutar_agente(args, lambda agente: agente.ciclo_principal())
+
+
+def comando_distribuido(args) -> int:
+    return _ejecutar_agente(
+        args,
+        lambda agente: agente.ciclo_distribuido(
+            dir_cola=args.dir_cola, worker_id=args.worker_id, ttl=args.ttl
+        ),
+    )
+
+
+def comando_fusionar(args) -> int:
+    return _ejecutar_agente(
+        args, lambda agente: agente.fusionar_resumen_distribuido(args.dir_cola)
+    )
+
+
+def comando_reconciliar(args) -> int:
+    return _ejecutar_agente(
+        args, lambda agente: agente.reconciliar_guardados(), requiere_zips=False
+    )
+
+
+def _lista(valor: str) -> list[str]:
+    """'a,b,c' -> ['a', 'b', 'c']"""
+    return [x.strip() for x in valor.split(",") if x.strip()]
+
+
+def _tolerancias(valor: str) -> list[str]:
+    """'0.01,1,100' -> ['0.01', '1', '100'], cada una un monto finito >= 0."""
+    tolerancias = _lista(valor)
+    if not tolerancias:
+        raise argparse.ArgumentTypeError("se espera al menos una tolerancia")
+    for tolerancia in tolerancias:
+        if _monto(tolerancia) < 0:
+            raise argparse.ArgumentTypeError(f"tolerancia negativa: {tolerancia!r}")
+    return tolerancias
+
+
+def _fuentes(valor: str) -> list[str]:
+    """'xml,pdf' -> ['xml', 'pdf']; solo se admiten xml y pdf."""
+    fuentes = _lista(valor)
+    if not fuentes:
+        raise argparse.ArgumentTypeError("se espera xml, pdf o xml,pdf")
+    for fuente in fuentes:
+        if fuente not in ("xml", "pdf"):
+            raise argparse.ArgumentTypeError(f"fuente inválida: {fuente!r} (xml o pdf)")
+    return fuentes
+
+
+def comando_simular(args) -> int:
+    from .simulador_politicas import Politica, cargar_historial, rejilla, simular
+
+    config = obtener_config()
+    dir_processed = args.salida or config["rutas"]["data_processed"]
+    actual = Politica.desde_config(config)
+    politicas = rejilla(
+        actual,
+        tolerancias=args.tolerancias,
+        montos=args.prioridad_montos,
+        nit=args.prioridad_nit,
+        textos_libres=args.prioridad_textos,
+    )
+
+    inicio = time.perf_counter()
+    historial = cargar_historial(dir_processed, workers=args.workers or 1)
+    leido = time.perf_counter() - inicio
+    informe = simular(historial, politicas, actual)
+    print(f"[CLI] {informe['facturas']} facturas leídas de {dir_processed} en {leido:.1f} s; "
+          f"{len(politicas)} políticas simuladas en {time.perf_counter() - inicio - leido:.2f} s",
+          file=sys.stderr)
+
+    if args.json:
+        json.dump(informe, sys.stdout, ensure_ascii=False)
+        sys.stdout.write("\n")
+        return SALIDA_OK
+
+    filas = [("actual", informe["actual"])] + [
+        (str(k), p) for k, p in enumerate(informe["politicas"], start=1)
+    ]
+    print(f"\n=== SIMULACIÓN DE POLÍTICAS ({informe['facturas']} facturas conciliadas, "
+          f"{informe['errores']} con error, {informe['revision_guardada']} en revisión guardadas) ===")
+    print(f"{'#':<7} {'revisión':>9} {'OK->rev':>8} {'rev->OK':>8} {'valores':>8}  política")
+    for nombre, p in filas:
+        politica = Politica(**p["politica"])
+        print(f"{nombre:<7} {p['facturas_revision']:>9} {p['a_revision']:>8} {p['a_ok']:>8} "
+              f"{p['valores_cambiados']:>8}  {politica.etiqueta()}")
+
+    campos = list(informe["actual"]["por_campo"])
+    print("\nRevisiones por campo:")
+    anchos = [max(9, len(c)) for c in campos]
+    print(f"{'#':<7} " + " ".join(f"{c:>{a}}" for c, a in zip(campos, anchos)))
+    for nombre, p in filas:
+        print(f"{nombre:<7} " + " ".join(f"{p['por_campo'][c]:>{a}}" for c, a in zip(campos, anchos)))
+
+    # NIT donde más cambia el número de facturas en revisión
+    nits = set().union(*(p["por_nit"] for _, p in filas))
+    base = informe["actual"]["por_nit"]
+    cambio = {
+        nit: max(abs(p["por_nit"].get(nit, 0) - base.get(nit, 0)) for _, p in filas)
+        for nit in nits
+    }
+    top = sorted((n for n in nits if cambio[n]), key=lambda n: (-cambio[n], n))[: args.nits]
+    if top:
+        print(f"\nFacturas en revisión por NIT (los {len(top)} que más cambian):")
+        print(f"{'NIT':<14} " + " ".join(f"{nombre:>7}" for nombre, _ in filas))
+        for nit in top:
+            print(f"{nit or '-':<14} " + " ".join(f"{p['por_nit'].get(nit, 0):>7}" for _, p in filas))
+    return SALIDA_OK
+
+
+def comando_servir(args) -> int:
+    from .servicio_http import servir
+
+    config = _config_desde_args(args)
+    cfg = config.setdefault("servicio", {})
+    if args.host:
+        cfg["host"] = args.host
+    if args.puerto is not None:
+        cfg["puerto"] = args.puerto
+    if args.trabajos_paralelos is not None:
+        cfg["trabajos_paralelos"] = args.trabajos_paralelos
+    if args.dir_trabajos:
+        cfg["dir_trabajos"] = args.dir_trabajos
+    servir(config)
+    return SALIDA_OK
+
+
+def comando_consultar(args) -> int:
+    from .indice_resultados import IndiceResultados, ruta_indice
+
+    config = obtener_config()
+    ruta = args.indice or ruta_indice(config)
+    filtros = {
+        "nit": args.nit, "cufe": args.cufe, "desde": args.desde, "hasta": args.hasta,
+        "total_min": args.total_min, "total_max": args.total_max, "estado": args.estado,
+        "campo": args.campo, "zip": args.zip, "id_factura": args.id_factura,
+    }
+    filtros = {k: v for k, v in filtros.items() if v is not None}
+
+    with IndiceResultados(ruta) as indice:
+        if args.reindexar:
+            dir_processed = args.salida or config["rutas"]["data_processed"]
+            inicio = time.perf_counter()
+            n = indice.indexar_carpeta(dir_processed, completo=args.completo)
+            print(f"[CLI] Indexadas {n} facturas de {dir_processed} en "
+                  f"{time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+
+        if args.contar:
+            total = indice.contar(**filtros)
+            if args.json:
+                json.dump({"total": total}, sys.stdout)
+                sys.stdout.write("\n")
+            else:
+                print(total)
+            return SALIDA_OK
+
+        pagina = indice.consultar(limite=args.limite, cursor=args.cursor, **filtros)
+
+    if args.json:
+        json.dump(pagina, sys.stdout, ensure_ascii=False, default=str)
+        sys.stdout.write("\n")
+        return SALIDA_OK
+
+    for f in pagina["facturas"]:
+        print(
+            f"{f['id_factura']}  {f['zip']}  {f['estado']:<8}  {f['nit'] or '-'}  "
+            f"{f['fecha_emision'] or '-'}  {f['total'] if f['total'] is not None else '-'}  "
+            f"{','.join(f['campos_a_revisar'])}"
+        )
+    if pagina["siguiente"] is not None:
+        print(f"\nHay más resultados: --cursor {pagina['siguiente']}")
+    return SALIDA_OK
+
+
+def _opciones_agente(p: argparse.ArgumentParser):
+    """Opciones comunes a los subcomandos que arman un AgenteSupervisor."""
+    p.add_argument("--entrada", type=Path, help="Carpeta con los ZIP (por defecto la de CONFIG).")
+    p.add_argument("--salida", type=Path, help="Carpeta de resultados (data/processed).")
+    p.add_argument("--dir-raw", type=Path, help="Carpeta donde se extraen los ZIP (data/raw).")
+    p.add_argument("--dir-logs", type=Path, help="Carpeta del resumen global (data/logs).")
+    p.add_argument("--formato-salida", choices=("json", "compacto", "compacto-zstd", "ninguno"),
+                   help="json: JSON por factura + CSV por ZIP; compacto(-zstd): JSON "
+                        "compacto (comprimido); ninguno: solo el resumen.")
+    p.add_argument("--workers", type=int, help="Procesos en paralelo (1 = secuencial).")
+    p.add_argument("--cache-dir", type=Path,
+                   help="Carpeta de la caché de parejas: una pareja PDF/XML ya vista "
+                        "(mismo contenido) no se vuelve a procesar.")
+    grupo_ia = p.add_mutually_exclusive_group()
+    grupo_ia.add_argument("--ia", dest="ia", action="store_true", default=None,
+                          help="Activa el respaldo con IA.")
+    grupo_ia.add_argument("--sin-ia", dest="ia", action="store_false",
+                          help="Desactiva el respaldo con IA.")
+    p.add_argument("--json", action="store_true",
+                   help="Imprime el resumen en JSON por stdout (logs a stderr).")
+    p.add_argument("--solo-conteos", action="store_true",
+                   help="Con --json, omite las listas de IDs.")
+
+
+def construir_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src.cli_cafe",
+        description="CAFE - Captura Automatizada de Facturas Electrónicas (modo lote).",
+    )
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("procesar", help="Procesa una carpeta de ZIPs de punta a punta.")
+    _opciones_agente(p)
+    p.add_argument("--particion", type=_particion, metavar="K/N",
+                   help="Procesa solo la parte K de N de la carpeta (para varias máquinas).")
+    p.add_argument("--reiniciar", action="store_true",
+                   help="Ignora el diario de una corrida interrumpida y empieza de cero.")
+    p.set_defaults(funcion=comando_procesar)
+
+    p = sub.add_parser(
+        "distribuido",
+        help="Worker de una cola compartida: varios procesos/máquinas sobre la misma carpeta.",
+    )
+    _opciones_agente(p)
+    p.add_argument("--dir-cola", type=Path,
+                   help="Carpeta compartida de arriendos y parciales (por defecto data/logs/cola).")
+    p.add_argument("--worker-id", help="Identificador de este worker (por defecto host-pid).")
+    p.add_argument("--ttl", type=float,
+                   help="Segundos sin latido tras los que un arriendo se da por vencido.")
+    p.set_defaults(funcion=comando_distribuido)
+
+    p = sub.add_parser(
+        "fusionar", help="Une los parciales de una cola distribuida en el resumen global."
+    )
+    _opciones_agente(p)
+    p.add_argument("--dir-cola", type=Path,
+                   help="Carpeta compartida de arriendos y parciales (por defecto data/logs/cola).")
+    p.set_defaults(funcion=comando_fusionar)
+
+    p = sub.add_parser(
+        "reconciliar",
+        help="Vuelve a conciliar los resultados guardados con la configuración actual, "
+             "sin leer PDF ni XML.",
+    )
+    p.add_argument("--salida", type=Path, help="Carpeta de resultados (data/processed).")
+    p.add_argument("--dir-logs", type=Path, help="Carpeta del resumen global (data/logs).")
+    p.add_argument("--workers", type=int, help="Procesos en paralelo (uno por carpeta de ZIP).")
+    p.add_argument("--json", action="store_true",
+                   help="Imprime el resumen en JSON por stdout (logs a stderr).")
+    p.add_argument("--solo-conteos", action="store_true",
+                   help="Con --json, omite las listas de IDs.")
+    p.set_defaults(
+        funcion=comando_reconciliar, entrada=None, dir_raw=None, formato_salida=None, ia=None
+    )
+
+    p = sub.add_parser(
+        "simular",
+        help="Cuenta, sin escribir nada, las facturas en revisión con cada política "
+             "candidata (tolerancia y prioridad de fuentes).",
+    )
+    p.add_argument("--salida", type=Path, help="Carpeta de resultados (data/processed).")
+    p.add_argument("--tolerancias", type=_tolerancias, metavar="T1,T2,...",
+                   help="Tolerancias de montos a probar (por defecto la actual).")
+    p.add_argument("--prioridad-montos", type=_fuentes, metavar="xml,pdf",
+                   help="Prioridad para montos fuera de tolerancia.")
+    p.add_argument("--prioridad-nit", type=_fuentes, metavar="xml,pdf",
+                   help="Prioridad para cufe, número y NIT.")
+    p.add_argument("--prioridad-textos", type=_fuentes, metavar="xml,pdf",
+                   help="Prioridad para el resto de campos (textos libres).")
+    p.add_argument("--workers", type=int, help="Procesos para leer los resultados.")
+    p.add_argument("--nits", type=int, default=10,
+                   help="Cuántos NIT mostrar (los que más cambian).")
+    p.add_argument("--json", action="store_true", help="Informe completo en JSON por stdout.")
+    p.set_defaults(funcion=comando_simular)
+
+    p = sub.add_parser(
+        "consultar", help="Busca facturas ya procesadas en el índice SQLite de resultados."
+    )
+    p.add_argument("--indice", type=Path,
+                   help="Archivo del índice (por defecto data/logs/indice_resultados.sqlite).")
+    p.add_argument("--reindexar", action="store_true",
+                   help="Antes de consultar, indexa los resultados nuevos o cambiados.")
+    p.add_argument("--completo", action="store_true",
+                   help="Con --reindexar, vuelve a leer todos los resultados.")
+    p.add_argument("--salida", type=Path,
+                   help="Carpeta de resultados a indexar (data/processed).")
+    p.add_argument("--nit")
+    p.add_argument("--cufe")
+    p.add_argument("--desde", help="Fecha de emisión mínima (inclusive).")
+    p.add_argument("--hasta", help="Fecha de emisión máxima (inclusive).")
+    p.add_argument("--total-min", type=_monto, help="Total mínimo (inclusive).")
+    p.add_argument("--total-max", type=_monto, help="Total máximo (inclusive).")
+    p.add_argument("--estado", choices=("ok", "revision", "error"))
+    p.add_argument("--campo", help="Campo a revisar (p. ej. total, nit_emisor).")
+    p.add_argument("--zip", help="Nombre de la carpeta del ZIP.")
+    p.add_argument("--id-factura")
+    p.add_argument("--limite", type=int, default=50, help="Facturas por página.")
+    p.add_argument("--cursor", type=int, help="Cursor de la página siguiente.")
+    p.add_argument("--contar", action="store_true", help="Solo imprime cuántas hay.")
+    p.add_argument("--json", action="store_true", help="Página en JSON por stdout.")
+    p.set_defaults(funcion=comando_consultar)
+
+    p = sub.add_parser(
+        "servir", help="Servicio HTTP local: recibe ZIPs, devuelve un ID de trabajo y resultados JSON."
+    )
+    p.add_argument("--host", help="Interfaz donde escuchar (por defecto 127.0.0.1).")
+    p.add_argument("--puerto", type=int, help="Puerto HTTP (0 = uno libre).")
+    p.add_argument("--trabajos-paralelos", type=int,
+                   help="Trabajos que se procesan a la vez (procesos del pool).")
+    p.add_argument("--dir-trabajos", type=Path,
+                   help="Carpeta de los trabajos (por defecto data/logs/servicio).")
+    p.add_argument("--dir-logs", type=Path, help="Carpeta de logs (data/logs).")
+    p.add_argument("--formato-salida", choices=("json", "compacto", "compacto-zstd", "ninguno"),
+                   help="Formato de los resultados por factura de cada trabajo.")
+    p.add_argument("--workers", type=int, help="Procesos por trabajo (1 = secuencial).")
+    p.add_argument("--cache-dir", type=Path,
+                   help="Carpeta de la caché de parejas, compartida por todos los trabajos.")
+    grupo_ia = p.add_mutually_exclusive_group()
+    grupo_ia.add_argument("--ia", dest="ia", action="store_true", default=None,
+                          help="Activa el respaldo con IA.")
+    grupo_ia.add_argument("--sin-ia", dest="ia", action="store_false",
+                          help="Desactiva el respaldo con IA.")
+    p.set_defaults(funcion=comando_servir, entrada=None, salida=None, dir_raw=None)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = construir_parser().parse_args(argv)
+    try:
+        return args.funcion(args)
+    except Exception as e:
+        print(f"[CLI] Error fatal: {e}", file=sys.stderr)
+        return SALIDA_FATAL
+
+
+if __name__ == "__main__":
+    sys.exit(main())
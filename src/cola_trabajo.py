@@ -0,0 +1,218 @@
+"""
+Cola de trabajo distribuida basada en archivos de arriendo (lease).
+
+Varios agentes (en una o varias máquinas con un sistema de archivos
+compartido) se reparten los ZIP de una carpeta así:
+
+  <dir_cola>/<zip>.lease     arriendo vigente: se crea con O_CREAT|O_EXCL,
+                             así que solo un proceso lo obtiene. Su mtime
+                             se renueva (latido) mientras se procesa.
+  <dir_cola>/<zip>.hecho     ZIP terminado; contiene el worker que lo cerró.
+  <dir_cola>/parciales/<worker>.jsonl
+                             una línea por ZIP cerrado con sus registros.
+
+Si un worker muere, su arriendo deja de renovarse; cuando el mtime supera
+el TTL, otro worker lo "roba" (rename atómico: solo uno gana; si lo
+movido ya no es el arriendo vencido que vio, lo devuelve) y rehace el
+ZIP. Al final los parciales se fusionan en un único resumen global.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+
+def id_worker_por_defecto() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class ColaArrendamientos:
+    def __init__(self, dir_cola: Path, worker_id: str | None = None, ttl: float = 300.0):
+        self.dir_cola = Path(dir_cola)
+        self.worker_id = worker_id or id_worker_por_defecto()
+        self.ttl = float(ttl)
+
+        self.dir_parciales = self.dir_cola / "parciales"
+        self.dir_parciales.mkdir(parents=True, exist_ok=True)
+
+        self._mios: set[str] = set()  # nombres de ZIP con arriendo nuestro
+        self._lock = threading.Lock()
+
+    # ==== Rutas ====
+    def _lease(self, nombre_zip: str) -> Path:
+        return self.dir_cola / f"{nombre_zip}.lease"
+
+    def _hecho(self, nombre_zip: str) -> Path:
+        return self.dir_cola / f"{nombre_zip}.hecho"
+
+    def esta_hecho(self, nombre_zip: str) -> bool:
+        return self._hecho(nombre_zip).exists()
+
+    # ==== Arriendos ====
+    def _crear_lease(self, lease: Path) -> bool:
+        try:
+            fd = os.open(lease, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"worker": self.worker_id, "desde": time.time()}, f)
+        return True
+
+    def _vencido(self, lease: Path) -> bool:
+        try:
+            return time.time() - lease.stat().st_mtime > self.ttl
+        except FileNotFoundError:
+            return True
+
+    @staticmethod
+    def _huella(lease: Path) -> tuple | None:
+        """(mtime_ns, contenido) del arriendo, o None si no existe."""
+        try:
+            return lease.stat().st_mtime_ns, lease.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def intentar_reclamar(self, nombre_zip: str) -> bool:
+        """Toma el arriendo de un ZIP si está libre o vencido."""
+        if self.esta_hecho(nombre_zip):
+            return False
+
+        lease = self._lease(nombre_zip)
+        if not self._crear_lease(lease):
+            visto = self._huella(lease)
+            if visto is None or not self._vencido(lease):
+                return False
+            # Robar un arriendo vencido: solo un rename puede ganar
+            botin = lease.with_name(f"{lease.name}.{self.worker_id}.robado")
+            try:
+                os.rename(lease, botin)
+            except FileNotFoundError:
+                return False
+            # Entre la verificación y el rename otro worker pudo robarlo y
+            # crear uno nuevo (o el dueño renovarlo): si lo que se movió no es
+            # el arriendo vencido que se vio, se devuelve sin pisar uno que
+            # exista ya (link falla si existe).
+            if self._huella(botin) != visto or not self._vencido(botin):
+                try:
+                    os.link(botin, lease)
+                except FileExistsError:
+                    pass
+                botin.unlink(missing_ok=True)
+                return False
+            botin.unlink(missing_ok=True)
+            print(f"[COLA] Arriendo vencido recuperado: {nombre_zip}")
+            if not self._crear_lease(lease):
+                return False
+
+        # Pudo terminarse justo entre la verificación y el arriendo
+        if self.esta_hecho(nombre_zip):
+            lease.unlink(missing_ok=True)
+            return False
+
+        with self._lock:
+            self._mios.add(nombre_zip)
+        return True
+
+    def renovar(self):
+        """Latido: actualiza el mtime de todos nuestros arriendos."""
+        with self._lock:
+            mios = list(self._mios)
+        for nombre_zip in mios:
+            try:
+                os.utime(self._lease(nombre_zip))
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def latido(self):
+        """Hilo que renueva los arriendos cada TTL/3 mientras dure el bloque."""
+        parar = threading.Event()
+
+        def _latir():
+            while not parar.wait(self.ttl / 3):
+                self.renovar()
+
+        hilo = threading.Thread(target=_latir, daemon=True)
+        hilo.start()
+        try:
+            yield
+        finally:
+            parar.set()
+            hilo.join()
+
+    def pendientes(self, zips: Iterable[Path]) -> list[Path]:
+        return [z for z in zips if not self.esta_hecho(z.name)]
+
+    def reclamar_disponibles(self, zips: list[Path], cancelar=None) -> Iterator[Path]:
+        """
+        Una pasada sobre los ZIP: entrega uno a uno los que este worker logra
+        reclamar. Nunca espera: quien lo consume (el ejecutor) no puede
+        quedarse bloqueado con resultados en vuelo sin cerrar.
+        """
+        for zip_path in zips:
+            if cancelar is not None and cancelar.is_set():
+                return
+            if self.intentar_reclamar(zip_path.name):
+                yield zip_path
+
+    def completar(self, nombre_zip: str, registros: list):
+        """Publica los registros del ZIP y lo marca como hecho."""
+        linea = json.dumps(
+            {"zip": nombre_zip, "registros": [list(r) for r in registros]},
+            ensure_ascii=False,
+        )
+        parcial = self.dir_parciales / f"{self.worker_id}.jsonl"
+        with parcial.open("a", encoding="utf-8") as f:
+            f.write(linea + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        # .hecho se escribe completo y luego se renombra (atómico)
+        tmp = self._hecho(nombre_zip).with_suffix(f".hecho.{self.worker_id}.tmp")
+        tmp.write_text(self.worker_id, encoding="utf-8")
+        os.replace(tmp, self._hecho(nombre_zip))
+
+        self._lease(nombre_zip).unlink(missing_ok=True)
+        with self._lock:
+            self._mios.discard(nombre_zip)
+
+    def liberar(self):
+        """Suelta los arriendos que queden (p. ej. al cancelar)."""
+        with self._lock:
+            mios, self._mios = list(self._mios), set()
+        for nombre_zip in mios:
+            self._lease(nombre_zip).unlink(missing_ok=True)
+
+
+def fusionar_parciales(dir_cola: Path) -> list[list]:
+    """
+    Junta los registros de todos los workers. Si un ZIP se procesó más de
+    una vez (un worker murió tras publicar), gana el worker que lo marcó
+    como hecho. El orden es el de una corrida secuencial: por nombre de
+    ZIP y, dentro de cada ZIP, por orden de pareja.
+    """
+    dir_cola = Path(dir_cola)
+    por_worker_zip: dict[tuple[str, str], list] = {}
+    for parcial in sorted((dir_cola / "parciales").glob("*.jsonl")):
+        worker = parcial.stem
+        with parcial.open("r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    bloque = json.loads(linea)
+                except ValueError:
+                    continue  # línea truncada por una caída a mitad de escritura
+                por_worker_zip[(worker, bloque["zip"])] = bloque["registros"]
+
+    registros = []
+    for hecho in sorted(dir_cola.glob("*.hecho")):
+        nombre_zip = hecho.name[: -len(".hecho")]
+        worker = hecho.read_text(encoding="utf-8").strip()
+        registros.extend(por_worker_zip.get((worker, nombre_zip), []))
+    return registros
@@ -0,0 +1,206 @@
+"""
+Compuerta de la IA: antes de llamar al modelo, decide si la llamada puede
+cambiar el resultado de la factura.
+
+procesar_pareja llama a la IA cuando al PDF le falta alguno de los campos
+clave (cufe, numero, nit_emisor, total). El extractor de PDF no lee
+"numero", así que con la IA encendida se llamaba en casi todas las
+facturas, aunque el XML trajera esos campos y la conciliación diera lo
+mismo. Con CONFIG["compuerta_ia"] encendida la llamada se omite si:
+
+1. "xml_completo": para cada campo faltante, conciliar_campo da el mismo
+   valor resuelto y la misma revisión con el PDF vacío que con el valor
+   del XML (lo que más probablemente devuelve la IA, que recibe el XML
+   como pista). Es decir, el XML trae el campo y la prioridad de fuentes
+   lo resuelve con el XML.
+2. "texto": el texto del PDF es muy corto (escaneado) o poco legible
+   (glifos sin Unicode, "(cid:N)"); la IA lee ese mismo texto.
+3. "historial": de las llamadas anteriores para el mismo proveedor (NIT
+   del XML), casi ninguna cambió la conciliación. Una de cada `explorar`
+   omisiones por historial se llama igual, para que el historial se
+   renueve.
+
+Tras cada llamada se concilia con y sin lo que aportó la IA: si cambia algún
+valor resuelto o la revisión, la llamada fue "útil". El historial
+({nit: [llamadas, útiles]} más tokens y segundos acumulados) se guarda en
+data/logs/historial_ia.json al terminar la corrida. Con workers, cada
+worker lo lee al arrancar y el proceso principal lo actualiza con lo que
+traen los resultados en res["_compuerta"].
+
+Ahorro estimado por llamada omitida: tokens y segundos promedio de las
+llamadas reales del historial (tokens_estimados / segundos_estimados
+mientras no haya ninguna).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections import Counter
+from pathlib import Path
+
+from .conciliacion import conciliar_campo, conciliar_factura
+from .normalizacion import normalizar_nit
+
+MOTIVOS = ("xml_completo", "texto", "historial")
+VENTANA = 50  # llamadas por proveedor; al pasarla se reduce a la mitad (pesa lo reciente)
+
+
+def _resultado(conciliacion: dict, requiere_revision_global: bool) -> tuple:
+    return requiere_revision_global, {
+        campo: (det.get("valor_resuelto"), det.get("requiere_revision"))
+        for campo, det in conciliacion.items()
+    }
+
+
+class CompuertaNula:
+    """Sin compuerta: se llama a la IA siempre que falte un campo clave."""
+
+    activa = False
+
+    def decidir(self, faltantes: list, fac_xml: dict, estadisticas: dict | None) -> str | None:
+        return None
+
+    def fue_util(self, antes: dict, despues: dict, fac_xml: dict) -> bool | None:
+        return None
+
+    def registrar(self, datos: dict):
+        pass
+
+    def iniciar_corrida(self):
+        pass
+
+    def resumen(self) -> str | None:
+        return None
+
+    def guardar(self):
+        pass
+
+
+class CompuertaIA(CompuertaNula):
+    activa = True
+
+    def __init__(self, ruta: Path, config: dict):
+        cfg = config.get("compuerta_ia", {})
+        self.ruta = Path(ruta)
+        self.config = config
+        self.min_caracteres = cfg.get("min_caracteres", 200)
+        self.min_legibles = cfg.get("min_legibles", 0.6)
+        self.min_llamadas = cfg.get("min_llamadas", 5)
+        self.min_utilidad = cfg.get("min_utilidad", 0.1)
+        self.explorar = max(1, int(cfg.get("explorar", 20)))
+        self.tokens_estimados = cfg.get("tokens_estimados", 2500)
+        self.segundos_estimados = cfg.get("segundos_estimados", 4.0)
+        self._historial = self._leer()
+        self._vetadas = 0   # omisiones por historial (para explorar)
+        self.iniciar_corrida()
+
+    # ==== Historial ====
+    def _leer(self) -> dict:
+        try:
+            historial = json.loads(self.ruta.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            historial = {}
+        historial.setdefault("proveedores", {})
+        for clave in ("llamadas", "tokens", "llamadas_con_tokens", "segundos"):
+            historial.setdefault(clave, 0)
+        return historial
+
+    def guardar(self):
+        temporal = self.ruta.with_name(f"{self.ruta.name}.{os.getpid()}.tmp")
+        try:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            temporal.write_text(json.dumps(self._historial, ensure_ascii=False), encoding="utf-8")
+            os.replace(temporal, self.ruta)
+        except OSError as e:
+            print(f"[AGENTE] ⚠ No se pudo guardar el historial de la IA: {e}")
+
+    # ==== Decisión ====
+    def decidir(self, faltantes: list, fac_xml: dict, estadisticas: dict | None) -> str | None:
+        """None = llamar a la IA; si no, el motivo (ver MOTIVOS) para omitirla."""
+        fac_xml = fac_xml or {}
+        if not any(self._puede_cambiar(campo, fac_xml.get(campo)) for campo in faltantes):
+            return "xml_completo"
+
+        if estadisticas and (
+            estadisticas["caracteres"] < self.min_caracteres
+            or estadisticas["legibles"] < self.min_legibles
+        ):
+            return "texto"
+
+        llamadas, utiles = self._historial["proveedores"].get(
+            normalizar_nit(fac_xml.get("nit_emisor")) or "", (0, 0)
+        )
+        if llamadas >= self.min_llamadas and utiles / llamadas < self.min_utilidad:
+            self._vetadas += 1
+            if self._vetadas % self.explorar:
+                return "historial"
+        return None
+
+    def _puede_cambiar(self, campo: str, valor_xml) -> bool:
+        """¿Cambia la conciliación del campo si el PDF trae el valor del XML?"""
+        if valor_xml in (None, ""):
+            return True
+        vacio = conciliar_campo(campo, None, valor_xml, self.config)
+        lleno = conciliar_campo(campo, valor_xml, valor_xml, self.config)
+        return (vacio["valor_resuelto"], vacio["requiere_revision"]) != (
+            lleno["valor_resuelto"], lleno["requiere_revision"]
+        )
+
+    def fue_util(self, antes: dict, despues: dict, fac_xml: dict) -> bool:
+        """¿Lo que aportó la IA (despues vs antes) cambió la conciliación?"""
+        return _resultado(*conciliar_factura(antes, fac_xml, self.config)) != _resultado(
+            *conciliar_factura(despues, fac_xml, self.config)
+        )
+
+    # ==== Registro (proceso principal) ====
+    def iniciar_corrida(self):
+        self.llamadas = 0
+        self.omitidas: Counter = Counter()
+
+    def registrar(self, datos: dict):
+        """
+        Anota una decisión de res["_compuerta"]: {"omitida": motivo} o
+        {"nit", "util", "tokens", "segundos"} de una llamada hecha.
+        """
+        if datos.get("omitida"):
+            self.omitidas[datos["omitida"]] += 1
+            return
+        self.llamadas += 1
+        h = self._historial
+        h["llamadas"] += 1
+        h["segundos"] += datos.get("segundos") or 0
+        if datos.get("tokens"):
+            h["tokens"] += datos["tokens"]
+            h["llamadas_con_tokens"] += 1
+        if datos.get("util") is None:
+            return  # la IA falló: no dice nada del proveedor
+        nit = normalizar_nit(datos.get("nit")) or ""
+        llamadas, utiles = h["proveedores"].get(nit, (0, 0))
+        llamadas, utiles = llamadas + 1, utiles + bool(datos["util"])
+        if llamadas > VENTANA:
+            llamadas, utiles = llamadas / 2, utiles / 2
+        h["proveedores"][nit] = [llamadas, utiles]
+
+    def resumen(self) -> str | None:
+        """Línea de log con llamadas, omisiones y ahorro estimado de la corrida."""
+        omitidas = sum(self.omitidas.values())
+        if not (self.llamadas or omitidas):
+            return None
+        h = self._historial
+        tokens = h["tokens"] / h["llamadas_con_tokens"] if h["llamadas_con_tokens"] else self.tokens_estimados
+        segundos = h["segundos"] / h["llamadas"] if h["llamadas"] else self.segundos_estimados
+        motivos = ", ".join(f"{m}={self.omitidas[m]}" for m in MOTIVOS if self.omitidas[m])
+        return (
+            f"{self.llamadas} llamadas, {omitidas} omitidas ({motivos or '-'}); ahorro estimado "
+            f"~{omitidas * tokens:,.0f} tokens y ~{omitidas * segundos:,.0f} s"
+        )
+
+
+def abrir_compuerta_ia(config: dict):
+    """Compuerta según CONFIG["compuerta_ia"] (CompuertaNula si está apagada)."""
+    cfg = config.get("compuerta_ia", {})
+    if not cfg.get("enabled", True):
+        return CompuertaNula()
+    ruta = cfg.get("historial") or Path(config["rutas"]["data_logs"]) / "historial_ia.json"
+    return CompuertaIA(Path(ruta), config)
@@ -1,5 +1,61 @@
-from decimal import Decimal
-from src.normalizacion import normalizar_nit, normalizar_monto, normalizar_fecha
+from decimal import ROUND_FLOOR, Decimal
+from functools import lru_cache
+
+from src.normalizacion import (
+    normalizar_fecha,
+    normalizar_monto,
+    normalizar_monto_centavos,
+    normalizar_nit,
+)
+
+# config["comparacion"]["aritmetica"]: cómo se comparan los montos.
+#   "decimal":  Decimal (histórico).
+#   "centavos": enteros (centavos, rango int64) para igualdad y tolerancia;
+#               los Decimal de normalizar_monto solo se usan para armar la
+#               salida, que es idéntica. Un monto que no es un entero de
+#               centavos (fracción de centavo, NaN...) se compara con Decimal.
+ARITMETICAS = ("decimal", "centavos")
+
+# Versión de las reglas de conciliación. Súbela al cambiar cómo se decide
+# un campo: invalida la caché de parejas (ver cache_parejas.py).
+VERSION_REGLAS = 1
+
+# Campos que queremos conciliar a nivel de cabecera
+CAMPOS = [
+    "cufe",
+    "numero",
+    "nit_emisor",
+    "fecha_emision",
+    "fecha_vencimiento",
+    "subtotal",
+    "impuestos",
+    "total",
+]
+MONTOS = ["subtotal", "impuestos", "total"]
+FECHAS = ["fecha_emision", "fecha_vencimiento"]
+
+
+@lru_cache(maxsize=32)
+def _tolerancia(valor) -> Decimal:
+    return Decimal(str(valor))
+
+
+@lru_cache(maxsize=32)
+def _tolerancia_centavos(valor) -> int | None:
+    """Mayor diferencia en centavos (entera) que sigue dentro de la tolerancia."""
+    tolerancia = _tolerancia(valor)
+    if not tolerancia.is_finite():
+        return None
+    return int((tolerancia * 100).to_integral_value(rounding=ROUND_FLOOR))
+
+
+def _en_centavos(config: dict) -> bool:
+    return config.get("comparacion", {}).get("aritmetica") == "centavos"
+
+
+def _texto(valor):
+    return valor.strip() if isinstance(valor, str) else valor
+
 
 def conciliar_campo(campo: str, valor_pdf, valor_xml, config: dict) -> dict:
     """
@@ -12,19 +68,31 @@ def conciliar_campo(campo: str, valor_pdf, valor_xml, config: dict) -> dict:
     Este módulo es el núcleo del 'sistema inteligente' basado en reglas.
     """
 
+    # Montos en centavos (solo con aritmetica "centavos")
+    c_pdf = c_xml = None
+
     # 1. Normalización según tipo de campo
     if campo == "nit_emisor":
         v_pdf = normalizar_nit(valor_pdf)
         v_xml = normalizar_nit(valor_xml)
-    elif campo in ["subtotal", "impuestos", "total"]:
+    elif campo in MONTOS:
         v_pdf = normalizar_monto(valor_pdf)
         v_xml = normalizar_monto(valor_xml)
-    elif campo in ["fecha_emision", "fecha_vencimiento"]:
+        if _en_centavos(config):
+            c_pdf = normalizar_monto_centavos(valor_pdf)
+            c_xml = normalizar_monto_centavos(valor_xml)
+    elif campo in FECHAS:
         v_pdf = normalizar_fecha(valor_pdf)
         v_xml = normalizar_fecha(valor_xml)
     else:
-        v_pdf = valor_pdf.strip() if isinstance(valor_pdf, str) else valor_pdf
-        v_xml = valor_xml.strip() if isinstance(valor_xml, str) else valor_xml
+        v_pdf = _texto(valor_pdf)
+        v_xml = _texto(valor_xml)
+
+    return _decidir(campo, v_pdf, v_xml, c_pdf, c_xml, config)
+
+
+def _decidir(campo: str, v_pdf, v_xml, c_pdf, c_xml, config: dict) -> dict:
+    """Reglas de conciliar_campo sobre valores ya normalizados."""
 
     #REGLA ESPECIAL: fecha_vencimiento NO genera revisión
     if campo == "fecha_vencimiento":
@@ -54,7 +122,7 @@ def conciliar_campo(campo: str, valor_pdf, valor_xml, config: dict) -> dict:
     # 2. Ninguna fuente tiene valor
     if v_pdf is None and v_xml is None:
         # Para montos, asumimos que "no hay valor" no es crítico
-        if campo in ["subtotal", "impuestos", "total"]:
+        if campo in MONTOS:
             return {
                 "valor_pdf_normalizado": v_pdf,
                 "valor_xml_normalizado": v_xml,
@@ -77,7 +145,9 @@ def conciliar_campo(campo: str, valor_pdf, valor_xml, config: dict) -> dict:
         }
 
     # 3. Ambos coinciden
-    if v_pdf == v_xml:
+    # (en centavos si ambos montos lo permiten; si no, Decimal)
+    en_centavos = isinstance(c_pdf, int) and isinstance(c_xml, int)
+    if (c_pdf == c_xml) if en_centavos else (v_pdf == v_xml):
         return {
             "valor_pdf_normalizado": v_pdf,
             "valor_xml_normalizado": v_xml,
@@ -88,12 +158,20 @@ def conciliar_campo(campo: str, valor_pdf, valor_xml, config: dict) -> dict:
         }
 
     prioridad_cfg = config.get("prioridad_fuente", {})
-    tolerancia_montos = Decimal(str(config["comparacion"]["tolerancia_montos"]))
+    tolerancia_cfg = config["comparacion"]["tolerancia_montos"]
+    tolerancia_montos = _tolerancia(tolerancia_cfg)
 
     # 4. Montos con tolerancia
-    if campo in ["subtotal", "impuestos", "total"] and isinstance(v_pdf, Decimal) and isinstance(v_xml, Decimal):
-        diff = abs(v_pdf - v_xml)
-        if diff <= tolerancia_montos:
+    if campo in MONTOS and isinstance(v_pdf, Decimal) and isinstance(v_xml, Decimal):
+        tolerancia_c = _tolerancia_centavos(tolerancia_cfg) if en_centavos else None
+        if tolerancia_c is not None:
+            dentro = abs(c_pdf - c_xml) <= tolerancia_c
+            # El Decimal solo para el mensaje (misma escala que siempre)
+            diff = abs(v_pdf - v_xml) if dentro else None
+        else:
+            diff = abs(v_pdf - v_xml)
+            dentro = diff <= tolerancia_montos
+        if dentro:
             return {
                 "valor_pdf_normalizado": v_pdf,
                 "valor_xml_normalizado": v_xml,
@@ -141,18 +219,6 @@ def conciliar_factura(pdf_raw: dict, xml_raw: dict, config: dict):
       - requiere_revision_global: bool si algún campo requiere revisión
     """
 
-    # Campos que queremos conciliar a nivel de cabecera
-    CAMPOS = [
-        "cufe",
-        "numero",
-        "nit_emisor",
-        "fecha_emision",
-        "fecha_vencimiento",
-        "subtotal",
-        "impuestos",
-        "total",
-    ]
-
     conciliacion_por_campo = {}
     requiere_revision_global = False
 
@@ -172,3 +238,69 @@ def conciliar_factura(pdf_raw: dict, xml_raw: dict, config: dict):
 
     return conciliacion_por_campo, requiere_revision_global
 
+
+def _columna(valores: list, normalizar) -> list:
+    """
+    normalizar() sobre una columna; cada texto distinto se normaliza una
+    sola vez (solo textos: Decimal("5.0") == Decimal("5.00")).
+    """
+    vistos = {}
+    salida = []
+    for v in valores:
+        if type(v) is str:
+            n = vistos.get(v, vistos)
+            if n is vistos:
+                n = vistos[v] = normalizar(v)
+        else:
+            n = normalizar(v)
+        salida.append(n)
+    return salida
+
+
+def conciliar_facturas(pares: list, config: dict) -> list:
+    """
+    conciliar_factura para muchas facturas a la vez: pares es una lista de
+    (pdf_raw, xml_raw) y devuelve un (dict_conciliacion,
+    requiere_revision_global) por par, lo mismo que conciliar_factura.
+
+    La normalización va por columnas (un campo de todas las facturas) con
+    las funciones escalares de normalizacion.py, una sola vez por texto
+    distinto (_columna); las reglas se aplican después, factura por
+    factura. Las versiones por lote (pandas) no se usan: sobre columnas de
+    tipo object resultaron más lentas que las escalares con caché.
+    """
+    pares = [(pdf_raw or {}, xml_raw or {}) for pdf_raw, xml_raw in pares]
+    n = len(pares)
+    centavos = _en_centavos(config)
+
+    columnas = {}
+    for campo in CAMPOS:
+        pdf = [pdf_raw.get(campo) for pdf_raw, _ in pares]
+        xml = [xml_raw.get(campo) for _, xml_raw in pares]
+        c_pdf = c_xml = [None] * n
+        if campo == "nit_emisor":
+            normalizar = normalizar_nit
+        elif campo in MONTOS:
+            normalizar = normalizar_monto
+            if centavos:
+                c_pdf = _columna(pdf, normalizar_monto_centavos)
+                c_xml = _columna(xml, normalizar_monto_centavos)
+        elif campo in FECHAS:
+            normalizar = normalizar_fecha
+        else:
+            normalizar = _texto
+        v_pdf, v_xml = _columna(pdf, normalizar), _columna(xml, normalizar)
+        columnas[campo] = (v_pdf, v_xml, c_pdf, c_xml)
+
+    resultados = []
+    for i in range(n):
+        conciliacion_por_campo = {}
+        requiere_revision_global = False
+        for campo in CAMPOS:
+            v_pdf, v_xml, c_pdf, c_xml = columnas[campo]
+            detalle = _decidir(campo, v_pdf[i], v_xml[i], c_pdf[i], c_xml[i], config)
+            conciliacion_por_campo[campo] = detalle
+            if detalle["requiere_revision"]:
+                requiere_revision_global = True
+        resultados.append((conciliacion_por_campo, requiere_revision_global))
+    return resultados
@@ -0,0 +1,164 @@
+"""
+Diario de ejecución (append-only) para reanudar corridas interrumpidas.
+
+Cada línea es un JSON:
+  {"tipo": "inicio", "huella": {...}}             cabecera de la corrida
+  {"tipo": "pareja", "zip": ..., "res": {...}}    factura terminada
+  {"tipo": "zip", "zip": ..., "registros": [...]} ZIP cerrado (JSON/CSV escritos)
+  {"tipo": "fin"}                                 corrida completa
+
+Las líneas usan el JSON compacto de serializacion.py: los Decimal vuelven
+como Decimal al reanudar, igual que si la factura se hubiera procesado.
+
+Es seguro entre hilos: los ZIP cerrados se anotan desde el escritor
+diferido (escritor.py), una vez que sus archivos están en disco.
+
+Las escrituras se agrupan: fsync cada `fsync_cada` líneas o `fsync_seg`
+segundos, lo que ocurra primero. Perder las últimas líneas en una caída
+solo obliga a rehacer esas facturas; una línea truncada se ignora.
+
+Si al arrancar hay un diario sin "fin" y con la misma huella (carpeta,
+partición, salida, y las versiones y configuración que cambian el
+resultado, como en cache_parejas), la corrida se reanuda: los ZIP cerrados
+no se vuelven a abrir y las facturas ya hechas no se vuelven a parsear.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from pathlib import Path
+
+from .serializacion import a_json_compacto, desde_json_compacto
+
+
+class DiarioNulo:
+    """Sin diario: misma interfaz, no escribe ni recuerda nada."""
+
+    activo = False
+    reanudado = False
+
+    def zips_cerrados(self) -> dict:
+        return {}
+
+    def parejas_hechas(self, nombre_zip: str) -> dict:
+        return {}
+
+    def pareja(self, nombre_zip: str, res: dict):
+        pass
+
+    def zip_cerrado(self, nombre_zip: str, registros: list):
+        pass
+
+    def fin(self):
+        pass
+
+    def cerrar(self):
+        pass
+
+
+class DiarioEjecucion(DiarioNulo):
+    activo = True
+
+    def __init__(
+        self,
+        ruta: Path,
+        huella: dict,
+        reanudar: bool = True,
+        fsync_cada: int = 64,
+        fsync_seg: float = 1.0,
+    ):
+        self.ruta = Path(ruta)
+        self.fsync_cada = max(1, int(fsync_cada))
+        self.fsync_seg = float(fsync_seg)
+
+        self._zips: dict[str, list] = {}              # zip -> registros (listas)
+        self._parejas: dict[str, dict[str, dict]] = {}  # zip -> {id_factura: res}
+        self.reanudado = reanudar and self._cargar(huella)
+
+        self._sin_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+        self._lock = threading.Lock()
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        if self.reanudado:
+            self._f = self.ruta.open("a", encoding="utf-8")
+        else:
+            self._zips, self._parejas = {}, {}
+            self._f = self.ruta.open("w", encoding="utf-8")
+            self._escribir({"tipo": "inicio", "huella": huella})
+        self._sincronizar()
+
+    # ==== Lectura ====
+    def _cargar(self, huella: dict) -> bool:
+        """Lee un diario previo; True si corresponde a esta corrida y quedó a medias."""
+        if not self.ruta.exists():
+            return False
+
+        entradas = []
+        with self.ruta.open("r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    entradas.append(desde_json_compacto(linea))
+                except ValueError:
+                    continue  # línea truncada por la caída
+
+        if not entradas or entradas[0].get("tipo") != "inicio":
+            return False
+        if entradas[0].get("huella") != huella:
+            return False
+        if any(e.get("tipo") == "fin" for e in entradas):
+            return False
+
+        for e in entradas[1:]:
+            if e.get("tipo") == "pareja":
+                self._parejas.setdefault(e["zip"], {})[e["res"]["id_factura"]] = e["res"]
+            elif e.get("tipo") == "zip":
+                self._zips[e["zip"]] = e["registros"]
+                self._parejas.pop(e["zip"], None)
+        return True
+
+    def zips_cerrados(self) -> dict:
+        return self._zips
+
+    def parejas_hechas(self, nombre_zip: str) -> dict:
+        return self._parejas.get(nombre_zip, {})
+
+    # ==== Escritura ====
+    def _escribir(self, entrada: dict):
+        linea = a_json_compacto(entrada) + "\n"
+        with self._lock:
+            self._f.write(linea)
+            self._sin_fsync += 1
+            if (
+                self._sin_fsync >= self.fsync_cada
+                or time.monotonic() - self._ultimo_fsync >= self.fsync_seg
+            ):
+                self._sincronizar()
+
+    def _sincronizar(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._sin_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+
+    def pareja(self, nombre_zip: str, res: dict):
+        self._escribir({"tipo": "pareja", "zip": nombre_zip, "res": res})
+
+    def zip_cerrado(self, nombre_zip: str, registros: list):
+        self._escribir({
+            "tipo": "zip",
+            "zip": nombre_zip,
+            "registros": [list(r) for r in registros],
+        })
+
+    def fin(self):
+        self._escribir({"tipo": "fin"})
+        with self._lock:
+            self._sincronizar()
+
+    def cerrar(self):
+        with self._lock:
+            if not self._f.closed:
+                self._sincronizar()
+                self._f.close()
@@ -0,0 +1,505 @@
+"""
+Ejecución de las parejas PDF/XML del agente.
+
+- workers <= 1: en el mismo proceso, en orden (comportamiento histórico).
+- workers > 1: pool de procesos (pdfplumber es CPU puro y no suelta el GIL).
+  Cada worker arma su propio AgenteSupervisor una sola vez al arrancar
+  y recibe tareas pequeñas (rutas), no el agente entero. Las tareas
+  esperan en una cola común del proceso principal y se entregan de a una
+  al worker que queda libre: ninguno tiene trabajo asignado de antemano.
+
+Reciclaje de workers: pdfminer/pdfplumber retienen memoria entre PDFs
+grandes y en corridas de horas el RSS de cada worker solo sube. Tras cada
+tarea el worker mide su RSS (psutil) y, si pasó de
+CONFIG["ejecucion"]["rss_max_mb"] o ya hizo "reciclar_tras_tareas"
+tareas, termina limpio después de entregar el resultado; el proceso
+principal arranca otro en su lugar. El reciclaje nunca corta una tarea a
+medias. Los workers salen de un servidor "forkserver" (o "spawn" donde no
+lo hay) y no de un fork del proceso principal, que en corridas largas
+crece y cada reemplazo heredaría esa memoria. El pico de RSS de cada
+worker queda en las estadísticas de ejecución.
+
+Vigilante de tiempos: un PDF malformado puede dejar a pdfplumber minutos
+en una sola página. Con CONFIG["ejecucion"]["timeout_factura_seg"] y/o
+"timeout_etapas_seg" ({etapa: segundos}, etapas de cronometrar) el proceso
+principal mata al worker que se pase, la factura queda con error
+"timeout:<etapa>" y el resto del lote sigue en otro worker.
+
+Las tareas se consumen de forma perezosa y con un máximo en vuelo, así
+que se puede alimentar con un generador que va extrayendo ZIPs sin
+cargar el lote completo en memoria. El orden de despacho lo decide quien
+genera las tareas (ver planificacion.py).
+"""
+
+from __future__ import annotations
+
+import copy
+import multiprocessing
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+
+class Tarea(NamedTuple):
+    zip_idx: int          # posición del ZIP en la lista de pendientes
+    orden: int            # posición de la pareja dentro de su ZIP
+    carpeta_zip: Path
+    pdf_path: Path
+    xml_path: Path
+
+
+# ==== Lado worker ====
+_AGENTE = None
+
+
+def config_para_worker(config: dict) -> dict:
+    """Copia de la config apta para un worker (sin servidor de métricas)."""
+    cfg = copy.deepcopy(config)
+    cfg.setdefault("metricas", {})["enabled"] = False
+    return cfg
+
+
+def _iniciar_worker(config: dict):
+    global _AGENTE
+    from .agente_supervisor import AgenteSupervisor
+
+    _AGENTE = AgenteSupervisor(config=config)
+
+
+class _MedidorMemoria:
+    """RSS del proceso actual en MB (None si psutil no está disponible)."""
+
+    def __init__(self):
+        try:
+            import psutil
+
+            self._proceso = psutil.Process()
+        except ImportError:
+            self._proceso = None
+        self.pico_mb: float | None = None
+
+    def muestra(self) -> float | None:
+        if self._proceso is None:
+            return None
+        rss = self._proceso.memory_info().rss / (1024 * 1024)
+        self.pico_mb = max(self.pico_mb or 0.0, rss)
+        return rss
+
+
+def _bucle_worker(config: dict, conexion, max_tareas: int, rss_max_mb: float):
+    """
+    Proceso worker: recibe tareas por su conexión hasta recibir None o hasta
+    que toque reciclarse. Mensajes al proceso principal:
+      ("listo",)                        terminó de arrancar
+      ("inicio",)                       empieza una tarea
+      ("etapa", nombre)                 empieza una etapa (cronometrar)
+      ("res", tarea, res, segundos)
+      ("fin", {"tareas", "rss_pico_mb", "motivo"})
+    Cada send termina antes de seguir (sin hilos), así que si el vigilante
+    mata al worker a mitad de una tarea no queda un mensaje a medias.
+    """
+    from .metricas import observar_etapas
+
+    _iniciar_worker(config)
+    observar_etapas(lambda etapa: conexion.send(("etapa", etapa)))
+    medidor = _MedidorMemoria()
+    medidor.muestra()
+    conexion.send(("listo",))
+    hechas, motivo = 0, "fin"
+    while True:
+        try:
+            tarea = conexion.recv()
+        except EOFError:
+            break
+        if tarea is None:
+            break
+        conexion.send(("inicio",))
+        inicio = time.perf_counter()
+        res = _AGENTE.procesar_pareja(tarea.pdf_path, tarea.xml_path)
+        conexion.send(("res", tarea, res, time.perf_counter() - inicio))
+        hechas += 1
+
+        rss = medidor.muestra()
+        if max_tareas and hechas >= max_tareas:
+            motivo = "tareas"
+            break
+        if rss_max_mb and rss is not None and rss > rss_max_mb:
+            motivo = "memoria"
+            break
+    conexion.send(("fin", {
+        "tareas": hechas,
+        "rss_pico_mb": round(medidor.pico_mb, 1) if medidor.pico_mb is not None else None,
+        "motivo": motivo,
+    }))
+
+
+def _contexto():
+    """
+    Contexto de multiprocessing del pool: "forkserver" (con los módulos del
+    agente ya importados en el servidor) o "spawn" donde no existe.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload([f"{__package__}.agente_supervisor"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+class _Worker:
+    """Estado de un worker visto desde el proceso principal."""
+
+    def __init__(self, proceso, conexion):
+        self.proceso = proceso
+        self.conexion = conexion
+        self.listo = False  # ya armó su agente y puede recibir tareas
+        self.asignadas: deque[Tarea] = deque()  # a lo sumo una: la que está corriendo
+        self.hechas = 0
+        self.inicio_tarea: float | None = None
+        self.etapa: str | None = None
+        self.inicio_etapa = 0.0
+
+
+class PoolReciclable:
+    """
+    Pool de procesos, cada uno con su propia conexión (Pipe), donde un
+    worker puede retirarse (reciclaje) y el pool lo reemplaza. Las tareas
+    enviadas esperan en _pendientes hasta que algún worker arrancado quede
+    libre; cada worker tiene a lo sumo una.
+
+    Vigilante de tiempos: con timeout_factura y/o timeout_etapas
+    ({etapa: segundos}), el proceso principal lleva la hora en que cada
+    worker empezó su tarea y su etapa actual; si alguna se pasa del
+    presupuesto, mata al worker, entrega vencida(tarea, etapa, segundos)
+    como resultado de esa tarea, reparte las que tenía en cola y arranca
+    otro worker. El resto del lote sigue sin esperar.
+
+    Si un worker muere por su cuenta (p. ej. lo mata el sistema por
+    memoria) se lanza RuntimeError, como haría ProcessPoolExecutor con
+    BrokenProcessPool.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        config: dict,
+        max_tareas: int = 0,
+        rss_max_mb: float = 0,
+        timeout_factura: float = 0,
+        timeout_etapas: dict | None = None,
+        vencida: Callable[[Tarea, str, float], dict] | None = None,
+    ):
+        self.workers = workers
+        self._config = config_para_worker(config)
+        self._max_tareas = max(0, int(max_tareas))
+        self._rss_max_mb = float(rss_max_mb or 0)
+        self._timeout_factura = float(timeout_factura or 0)
+        self._timeout_etapas = {k: float(v) for k, v in (timeout_etapas or {}).items() if v}
+        self._vencida = vencida
+        self._ctx = _contexto()
+        self._workers: list[_Worker] = []
+        self._pendientes: deque[Tarea] = deque()
+        self._listos: deque[tuple[Tarea, dict, float]] = deque()
+        self._cerrando = False
+        self.memoria: list[dict] = []  # un dict por worker que terminó
+        self.reciclajes = 0
+        self.vencidas = 0
+        for _ in range(workers):
+            self._arrancar()
+
+    # ==== Workers ====
+    def _arrancar(self):
+        propia, del_worker = self._ctx.Pipe()
+        p = self._ctx.Process(
+            target=_bucle_worker,
+            args=(self._config, del_worker, self._max_tareas, self._rss_max_mb),
+            daemon=True,
+        )
+        p.start()
+        del_worker.close()  # así, si el worker muere, recv() da EOFError
+        self._workers.append(_Worker(p, propia))
+
+    def _quitar(self, w: _Worker, resumen: dict, reemplazar: bool):
+        """Saca un worker del pool; sus tareas en cola vuelven a repartirse."""
+        self._workers.remove(w)
+        w.conexion.close()
+        w.proceso.join()
+        self.memoria.append({"pid": w.proceso.pid, **resumen})
+        self._pendientes.extendleft(reversed(w.asignadas))
+        w.asignadas.clear()
+        if reemplazar and not self._cerrando:
+            self._arrancar()
+        self._despachar()
+
+    def _despachar(self):
+        """Entrega la siguiente tarea pendiente a cada worker libre."""
+        for w in self._workers:
+            if not self._pendientes:
+                return
+            if not w.listo or w.asignadas:
+                continue
+            tarea = self._pendientes.popleft()
+            w.asignadas.append(tarea)
+            try:
+                w.conexion.send(tarea)
+            except OSError:
+                continue  # murió: lo detecta _leer
+
+    def _leer(self, w: _Worker):
+        """Procesa los mensajes ya disponibles de un worker."""
+        while w in self._workers and w.conexion.poll():
+            try:
+                mensaje = w.conexion.recv()
+            except (EOFError, OSError):
+                raise RuntimeError(
+                    f"Un worker terminó inesperadamente (pid {w.proceso.pid}, "
+                    f"código {w.proceso.exitcode})"
+                )
+            ahora = time.monotonic()
+            tipo = mensaje[0]
+            if tipo == "listo":
+                w.listo = True
+                self._despachar()
+            elif tipo == "inicio":
+                w.inicio_tarea = w.inicio_etapa = ahora
+                w.etapa = None
+            elif tipo == "etapa":
+                w.etapa, w.inicio_etapa = mensaje[1], ahora
+            elif tipo == "res":
+                w.asignadas.popleft()
+                w.hechas += 1
+                w.inicio_tarea = w.etapa = None
+                self._listos.append(mensaje[1:])
+                self._despachar()
+            elif tipo == "fin":
+                resumen = mensaje[1]
+                if resumen["motivo"] != "fin" and not self._cerrando:
+                    self.reciclajes += 1
+                self._quitar(w, resumen, reemplazar=resumen["motivo"] != "fin")
+
+    # ==== Vigilante ====
+    def _vencimiento(self, w: _Worker) -> tuple[float, str] | None:
+        """(hora límite, etapa) de la tarea en curso de w, o None si no tiene."""
+        if w.inicio_tarea is None:
+            return None
+        limites = []
+        if self._timeout_factura:
+            limites.append((w.inicio_tarea + self._timeout_factura, w.etapa or "factura"))
+        if w.etapa in self._timeout_etapas:
+            limites.append((w.inicio_etapa + self._timeout_etapas[w.etapa], w.etapa))
+        return min(limites) if limites else None
+
+    def _vigilar(self) -> float | None:
+        """Mata a los workers vencidos; devuelve segundos hasta el próximo límite."""
+        ahora = time.monotonic()
+        proximo = None
+        for w in list(self._workers):
+            if w.conexion.poll():
+                self._leer(w)  # puede haber terminado justo antes del límite
+                if w not in self._workers:
+                    continue
+            vence = self._vencimiento(w)
+            if vence is None:
+                continue
+            limite, etapa = vence
+            if limite > ahora:
+                proximo = limite - ahora if proximo is None else min(proximo, limite - ahora)
+                continue
+            w.proceso.kill()
+            tarea = w.asignadas.popleft()
+            segundos = ahora - w.inicio_tarea
+            self.vencidas += 1
+            self._quitar(w, {"tareas": w.hechas, "rss_pico_mb": None, "motivo": "timeout"},
+                         reemplazar=True)
+            self._listos.append((tarea, self._vencida(tarea, etapa, segundos), segundos))
+        return proximo
+
+    # ==== Interfaz ====
+    def enviar(self, tarea: Tarea):
+        self._pendientes.append(tarea)
+        self._despachar()
+
+    def recibir(self) -> tuple[Tarea, dict, float]:
+        """Bloquea hasta el próximo resultado (tarea, res, segundos)."""
+        while not self._listos:
+            espera = self._vigilar()
+            if self._listos:
+                break
+            espera = 1.0 if espera is None else min(1.0, espera)
+            listos = wait(
+                [w.conexion for w in self._workers] + [w.proceso.sentinel for w in self._workers],
+                timeout=espera,
+            )
+            for w in list(self._workers):
+                if w.conexion in listos or w.proceso.sentinel in listos:
+                    self._leer(w)
+                if w in self._workers and not w.proceso.is_alive() and not w.conexion.poll():
+                    raise RuntimeError(
+                        f"Un worker terminó inesperadamente (pid {w.proceso.pid}, "
+                        f"código {w.proceso.exitcode})"
+                    )
+        return self._listos.popleft()
+
+    def cerrar(self):
+        """Pide a los workers que terminen y espera su resumen de memoria."""
+        self._cerrando = True
+        try:
+            for w in self._workers:
+                w.conexion.send(None)
+            while self._workers:
+                listos = wait([w.conexion for w in self._workers], timeout=1.0)
+                for w in list(self._workers):
+                    if w.conexion in listos:
+                        self._leer(w)
+                    elif not w.proceso.is_alive():
+                        self._leer(w)
+        finally:
+            self.terminar()
+
+    def terminar(self):
+        """Corta los workers que queden (error o interrupción)."""
+        for w in self._workers:
+            w.proceso.kill()
+        for w in self._workers:
+            w.proceso.join()
+            w.conexion.close()
+        self._workers.clear()
+
+
+def _resumir_utilizacion(
+    estadisticas: dict, workers: int, inicio: float, ocupado: float, inicio_cola_final
+):
+    """
+    utilizacion: tiempo ocupado de los workers / (workers * tiempo total).
+    cola_final_seg: tramo final en que ya no quedaban tareas por despachar
+    y había workers ociosos esperando a los últimos rezagados.
+    """
+    fin = time.perf_counter()
+    total = fin - inicio
+    estadisticas.update({
+        "workers": workers,
+        "segundos": round(total, 3),
+        "ocupado_seg": round(ocupado, 3),
+        "utilizacion": round(ocupado / (workers * total), 4) if total > 0 else 0.0,
+        "cola_final_seg": round(fin - inicio_cola_final, 3) if inicio_cola_final else 0.0,
+    })
+
+
+def _resumir_memoria(estadisticas: dict, pool: PoolReciclable):
+    """
+    memoria_workers: por worker (pid, tareas, rss_pico_mb, motivo de salida:
+    "fin", "tareas", "memoria" o "timeout"); rss_pico_mb: el mayor de todos;
+    vencidas: tareas cortadas por el vigilante de tiempos.
+    """
+    picos = [m["rss_pico_mb"] for m in pool.memoria if m["rss_pico_mb"] is not None]
+    estadisticas.update({
+        "reciclajes": pool.reciclajes,
+        "vencidas": pool.vencidas,
+        "rss_pico_mb": max(picos) if picos else None,
+        "memoria_workers": list(pool.memoria),
+    })
+
+
+# ==== Lado principal ====
+def ejecutar_tareas(
+    tareas: Iterable[Tarea],
+    procesar: Callable[[Path, Path], dict],
+    workers: int,
+    config: dict,
+    cancelar=None,
+    al_cambiar_en_vuelo: Callable[[int], None] | None = None,
+    estadisticas: dict | None = None,
+    vencida: Callable[[Tarea, str, float], dict] | None = None,
+) -> Iterator[tuple[Tarea, dict]]:
+    """
+    Genera (tarea, resultado) a medida que terminan.
+
+    procesar: función usada en modo secuencial (AgenteSupervisor.procesar_pareja).
+    cancelar: Event opcional; deja de tomar tareas nuevas y termina las que
+              ya estaban en vuelo.
+    al_cambiar_en_vuelo: callback con el número de tareas en ejecución
+              (para el gauge de utilización).
+    estadisticas: dict opcional que al terminar recibe la utilización
+              lograda (ver _resumir_utilizacion).
+    vencida: arma el resultado de una tarea que pasó su presupuesto de
+              tiempo, vencida(tarea, etapa, segundos). Con timeouts
+              configurados se usa el pool aunque workers <= 1, porque el
+              límite solo se puede imponer desde fuera del proceso.
+    """
+    inicio = time.perf_counter()
+    ocupado = 0.0
+    cfg = config.get("ejecucion", {})
+    timeout_factura = float(cfg.get("timeout_factura_seg", 0) or 0)
+    timeout_etapas = {k: v for k, v in (cfg.get("timeout_etapas_seg") or {}).items() if v}
+    con_vigilante = vencida is not None and bool(timeout_factura or timeout_etapas)
+    if con_vigilante:
+        workers = max(workers, 1)
+
+    if workers <= 1 and not con_vigilante:
+        try:
+            for tarea in tareas:
+                if cancelar is not None and cancelar.is_set():
+                    return
+                if al_cambiar_en_vuelo:
+                    al_cambiar_en_vuelo(1)
+                t0 = time.perf_counter()
+                res = procesar(tarea.pdf_path, tarea.xml_path)
+                ocupado += time.perf_counter() - t0
+                if al_cambiar_en_vuelo:
+                    al_cambiar_en_vuelo(0)
+                yield tarea, res
+        finally:
+            if estadisticas is not None:
+                _resumir_utilizacion(estadisticas, 1, inicio, ocupado, None)
+        return
+
+    max_en_vuelo = 2 * workers  # algo de cola común para que un worker libre no espere
+    iterador = iter(tareas)
+    agotado = False
+    inicio_cola_final = None
+    pool = None
+
+    try:
+        pool = PoolReciclable(
+            workers,
+            config,
+            max_tareas=cfg.get("reciclar_tras_tareas", 0),
+            rss_max_mb=cfg.get("rss_max_mb", 0),
+            timeout_factura=timeout_factura if con_vigilante else 0,
+            timeout_etapas=timeout_etapas if con_vigilante else None,
+            vencida=vencida,
+        )
+        en_vuelo = 0
+        while True:
+            while not agotado and en_vuelo < max_en_vuelo:
+                if cancelar is not None and cancelar.is_set():
+                    agotado = True
+                    break
+                try:
+                    tarea = next(iterador)
+                except StopIteration:
+                    agotado = True
+                    break
+                pool.enviar(tarea)
+                en_vuelo += 1
+
+            if al_cambiar_en_vuelo:
+                al_cambiar_en_vuelo(min(en_vuelo, workers))
+            if agotado and inicio_cola_final is None and en_vuelo < workers:
+                inicio_cola_final = time.perf_counter()
+            if not en_vuelo:
+                break
+
+            tarea, res, segundos = pool.recibir()
+            en_vuelo -= 1
+            ocupado += segundos
+            yield tarea, res
+        pool.cerrar()
+    finally:
+        if pool is not None:
+            pool.terminar()
+        if estadisticas is not None:
+            _resumir_utilizacion(estadisticas, workers, inicio, ocupado, inicio_cola_final)
+            if pool is not None:
+                _resumir_memoria(estadisticas, pool)
@@ -0,0 +1,93 @@
+"""
+Escritura diferida (write-behind) de los resultados por ZIP.
+
+El hilo principal arma los registros (las rutas de salida se conocen de
+antemano) y deja el trabajo de disco en una cola acotada; un hilo escritor
+la vacía por lotes. Si el disco se atrasa, la cola se llena y enviar()
+bloquea: esa es la contrapresión, y la memoria retenida queda acotada a
+`cola_max` ZIPs.
+
+Cada trabajo puede traer un callback `al_terminar` que corre en el hilo
+escritor DESPUÉS de escribir (p. ej. marcar el ZIP como cerrado en el
+diario): así nada se da por guardado antes de estarlo.
+
+cerrar() espera a que se escriba todo lo encolado. Si una escritura falla,
+el hilo sigue vaciando la cola (sin escribir) para no bloquear a nadie y
+el error se relanza en el hilo principal en el siguiente enviar()/cerrar().
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Any, Callable
+
+_FIN = object()
+
+
+class EscritorDirecto:
+    """Misma interfaz, pero escribe en el hilo que llama (sin diferir)."""
+
+    def __init__(self, escribir: Callable[[Any], None]):
+        self._escribir = escribir
+
+    def enviar(self, trabajo, al_terminar: Callable[[], None] | None = None):
+        self._escribir(trabajo)
+        if al_terminar is not None:
+            al_terminar()
+
+    def cerrar(self):
+        pass
+
+
+class EscritorDiferido(EscritorDirecto):
+    def __init__(
+        self,
+        escribir: Callable[[Any], None],
+        cola_max: int = 8,
+        lote: int = 4,
+        nombre: str = "escritor-resultados",
+    ):
+        super().__init__(escribir)
+        self.lote = max(1, int(lote))
+        self._cola: queue.Queue = queue.Queue(maxsize=max(1, int(cola_max)))
+        self._error: BaseException | None = None
+        self._hilo = threading.Thread(target=self._ciclo, name=nombre, daemon=True)
+        self._hilo.start()
+
+    def _verificar(self):
+        if self._error is not None:
+            raise RuntimeError(f"Falló la escritura de resultados: {self._error}") from self._error
+
+    def enviar(self, trabajo, al_terminar: Callable[[], None] | None = None):
+        self._verificar()
+        self._cola.put((trabajo, al_terminar))  # bloquea si la cola está llena
+
+    def cerrar(self):
+        """Espera a que se escriba todo lo pendiente y termina el hilo."""
+        if self._hilo.is_alive():
+            self._cola.put(_FIN)
+            self._hilo.join()
+        self._verificar()
+
+    def _ciclo(self):
+        while True:
+            lote = [self._cola.get()]
+            while len(lote) < self.lote and lote[-1] is not _FIN:
+                try:
+                    lote.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+
+            for item in lote:
+                if item is _FIN:
+                    return
+                if self._error is not None:
+                    continue  # tras un fallo solo se vacía la cola
+                trabajo, al_terminar = item
+                try:
+                    self._escribir(trabajo)
+                    if al_terminar is not None:
+                        al_terminar()
+                except BaseException as e:
+                    self._error = e
@@ -0,0 +1,235 @@
+"""
+Motor de extracción del PDF por coordenadas de palabras.
+
+Alternativa al motor "regex" de extractor_pdf (CONFIG["extraccion"]
+["pdf_motor"] = "coordenadas"). En lugar de buscar sobre el texto armado,
+donde el diseño puede intercalar otras columnas entre una etiqueta y su
+valor, trabaja con las palabras de pdfplumber y su caja:
+
+- IndicePalabras: por página, cada palabra entra en las celdas de una
+  grilla de CELDA_X x CELDA_Y puntos que toca su caja, más un índice por
+  texto de la palabra (en mayúsculas, hasta el primer ":"). Buscar qué hay
+  a la derecha o debajo de una caja solo recorre las celdas de ese
+  rectángulo (microsegundos por consulta).
+- Etiquetas: "SUBTOTAL", "IVA", "TOTAL DE LA OPERACIÓN", "NIT", "CUFE"; las
+  de varias palabras se encadenan con la palabra siguiente en la línea.
+- Valor: la palabra más cercana a la derecha en la misma línea con la forma
+  del campo (ver PALABRA_* en patrones.py); si no hay, la más cercana
+  debajo (hasta ALTO_DEBAJO líneas) que se solape en horizontal con la
+  etiqueta. "CUFE:abc..." pegado se lee de la misma palabra.
+
+Qué aparición gana es lo mismo que en el motor regex: la primera para
+CUFE, subtotal y total, la última para IVA, y para NIT y fecha la que
+coincide con el xml_hint (o la primera). Las fechas no tienen etiqueta:
+son las palabras dd/mm/aaaa en orden de lectura.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+from .extractor_pdf import _normalizar_monto_colombiano, estadisticas_texto, resultado_vacio
+from .patrones import (
+    NO_DIGITO,
+    PALABRA_CUFE,
+    PALABRA_FECHA,
+    PALABRA_MONTO,
+    PALABRA_NIT,
+    acierto,
+)
+
+CELDA_X = 48.0      # ancho de celda de la grilla (puntos)
+CELDA_Y = 12.0      # alto de celda: más o menos una línea de texto
+HOLGURA_X = 4.0     # tolerancia horizontal para "debajo de la etiqueta"
+ALTO_DEBAJO = 2.5   # cuántas líneas (alto de la etiqueta) se mira hacia abajo
+PUNTUACION = ":;,.)"  # se quita del final de la palabra antes de probar la forma
+
+ETIQUETAS = {
+    "cufe": (("CUFE",),),
+    "nit_emisor": (("NIT",),),
+    "subtotal": (("SUBTOTAL",),),
+    "impuestos": (("IVA",),),
+    "total": (("TOTAL", "DE", "LA", "OPERACIÓN"), ("TOTAL", "DE", "LA", "OPERACION")),
+}
+
+
+def _clave(texto: str) -> str:
+    """Texto de una palabra tal como se busca una etiqueta ("Nit:" -> "NIT")."""
+    return texto.split(":", 1)[0].upper()
+
+
+class IndicePalabras:
+    """Palabras de una página en una grilla espacial (ver docstring del módulo)."""
+
+    def __init__(self, palabras: list, ancho: float):
+        self.palabras = palabras
+        self.ancho = ancho
+        self._celdas: dict[tuple[int, int], list[int]] = defaultdict(list)
+        self._por_texto: dict[str, list[int]] = defaultdict(list)
+        for i, p in enumerate(palabras):
+            for cx in range(int(p["x0"] // CELDA_X), int(p["x1"] // CELDA_X) + 1):
+                for cy in range(int(p["top"] // CELDA_Y), int(p["bottom"] // CELDA_Y) + 1):
+                    self._celdas[(cx, cy)].append(i)
+            self._por_texto[_clave(p["text"])].append(i)
+
+    def con_texto(self, clave: str) -> list[int]:
+        """Índices de las palabras con esa clave, en orden de lectura."""
+        return self._por_texto.get(clave, [])
+
+    def _en_rectangulo(self, x0: float, top: float, x1: float, bottom: float) -> set[int]:
+        encontradas = set()
+        for cx in range(int(x0 // CELDA_X), int(x1 // CELDA_X) + 1):
+            for cy in range(int(top // CELDA_Y), int(bottom // CELDA_Y) + 1):
+                encontradas.update(self._celdas.get((cx, cy), ()))
+        return encontradas
+
+    def a_la_derecha(self, i: int) -> list[int]:
+        """Palabras de la misma línea a la derecha de la palabra i, de la más cercana a la más lejana."""
+        p = self.palabras[i]
+        centro = (p["top"] + p["bottom"]) / 2
+        media_altura = (p["bottom"] - p["top"]) / 2
+        candidatas = [
+            j for j in self._en_rectangulo(p["x1"], p["top"], self.ancho, p["bottom"])
+            if j != i
+            and self.palabras[j]["x0"] >= p["x1"] - 0.5
+            and abs((self.palabras[j]["top"] + self.palabras[j]["bottom"]) / 2 - centro) <= media_altura
+        ]
+        return sorted(candidatas, key=lambda j: self.palabras[j]["x0"])
+
+    def debajo(self, i: int) -> list[int]:
+        """Palabras debajo de la palabra i que se solapan con ella en horizontal, de la más cercana a la más lejana."""
+        p = self.palabras[i]
+        x0, x1 = p["x0"] - HOLGURA_X, p["x1"] + HOLGURA_X
+        fondo = p["bottom"] + (p["bottom"] - p["top"]) * ALTO_DEBAJO
+        candidatas = [
+            j for j in self._en_rectangulo(x0, p["bottom"], x1, fondo)
+            if self.palabras[j]["top"] >= p["bottom"] - 0.5
+            and self.palabras[j]["top"] <= fondo
+            and min(x1, self.palabras[j]["x1"]) > max(x0, self.palabras[j]["x0"])
+        ]
+        return sorted(candidatas, key=lambda j: (self.palabras[j]["top"], abs(self.palabras[j]["x0"] - p["x0"])))
+
+    def etiquetas(self, tokens: tuple) -> list[int]:
+        """
+        Última palabra de cada aparición de la etiqueta (tokens en una misma
+        línea, cada uno la palabra siguiente del anterior), en orden de lectura.
+        """
+        apariciones = []
+        for i in self.con_texto(tokens[0]):
+            actual = i
+            for token in tokens[1:]:
+                siguientes = self.a_la_derecha(actual)
+                if not siguientes or _clave(self.palabras[siguientes[0]]["text"]) != token:
+                    break
+                actual = siguientes[0]
+            else:
+                apariciones.append(actual)
+        return apariciones
+
+
+def indexar_pagina(page) -> IndicePalabras:
+    return IndicePalabras(page.extract_words(), float(page.width))
+
+
+def _forma(regex, texto: str):
+    return regex.fullmatch(texto.rstrip(PUNTUACION))
+
+
+def _valor_de_etiqueta(indice: IndicePalabras, i: int, regex):
+    """Coincidencia de la forma para el valor de la etiqueta i, o None."""
+    texto = indice.palabras[i]["text"]
+    if ":" in texto:
+        # Valor pegado a la etiqueta ("CUFE:abc...")
+        m = _forma(regex, texto.split(":", 1)[1])
+        if m:
+            return m
+    for vecinos in (indice.a_la_derecha(i), indice.debajo(i)):
+        for j in vecinos:
+            m = _forma(regex, indice.palabras[j]["text"])
+            if m:
+                return m
+    return None
+
+
+def _valores(indices: list, campo: str, regex) -> list:
+    """Coincidencias de la forma para cada aparición de las etiquetas del campo, en orden de lectura."""
+    encontrados = []
+    for indice in indices:
+        por_pagina = []
+        for tokens in ETIQUETAS[campo]:
+            por_pagina.extend(indice.etiquetas(tokens))
+        for i in sorted(set(por_pagina)):
+            m = _valor_de_etiqueta(indice, i, regex)
+            if m:
+                encontrados.append(m)
+    return encontrados
+
+
+def campos_pdf_por_coordenadas(
+    pdf,
+    xml_hint: Optional[Dict[str, Any]] = None,
+    estadisticas: Optional[dict] = None,
+) -> Dict[str, Any]:
+    """
+    Campos de la factura (mismas claves y formato que parse_pdf_invoice) a
+    partir de las palabras de las páginas del pdf ya abierto.
+    """
+    resultado = resultado_vacio()
+    indices = [indexar_pagina(page) for page in pdf.pages]
+    if estadisticas is not None:
+        estadisticas_texto(" ".join(p["text"] for i in indices for p in i.palabras), estadisticas)
+
+    # ---------------- CUFE ----------------
+    cufes = _valores(indices, "cufe", PALABRA_CUFE)
+    if cufes:
+        resultado["cufe"] = cufes[0].group("cufe")
+        acierto("pdf.coord.cufe")
+
+    # ---------------- NIT emisor ----------------
+    nits = [NO_DIGITO.sub("", m.group("nit")) for m in _valores(indices, "nit_emisor", PALABRA_NIT)]
+    nit_xml = None
+    if xml_hint and xml_hint.get("nit_emisor"):
+        nit_xml = NO_DIGITO.sub("", str(xml_hint["nit_emisor"]))
+    for nit in nits:
+        if nit_xml is None or nit == nit_xml:
+            resultado["nit_emisor"] = nit
+            acierto("pdf.coord.nit")
+            break
+
+    # ---------------- Fecha de emisión ----------------
+    fechas = []
+    for indice in indices:
+        for p in indice.palabras:
+            m = _forma(PALABRA_FECHA, p["text"])
+            if m:
+                f = m.group(0)
+                fechas.append(f"{f[6:10]}-{f[3:5]}-{f[0:2]}")
+    fecha_iso = None
+    if xml_hint and xml_hint.get("fecha_emision"):
+        try:
+            y_xml, m_xml, d_xml = map(int, str(xml_hint["fecha_emision"]).split("-"))
+            fecha_iso = next(
+                (f for f in fechas if tuple(map(int, f.split("-"))) == (y_xml, m_xml, d_xml)),
+                None,
+            )
+        except Exception:
+            fecha_iso = None
+    if not fecha_iso and fechas:
+        fecha_iso = fechas[0]
+    resultado["fecha_emision"] = fecha_iso
+    if fecha_iso:
+        acierto("pdf.coord.fecha")
+
+    # ---------------- Subtotal, IVA (la última) y total ----------------
+    for campo, nombre, cual in (("subtotal", "subtotal", 0), ("impuestos", "iva", -1), ("total", "total", 0)):
+        montos = _valores(indices, campo, PALABRA_MONTO)
+        if montos:
+            resultado[campo] = _normalizar_monto_colombiano(montos[cual].group("monto"))
+            acierto(f"pdf.coord.{nombre}")
+
+    if resultado["total"] is None and xml_hint and xml_hint.get("total"):
+        resultado["total"] = str(xml_hint["total"])
+        acierto("pdf.coord.total_desde_xml")
+
+    return resultado
@@ -1,17 +1,45 @@
 from __future__ import annotations
 
+import io
 from pathlib import Path
-import re
-import pdfplumber
 from typing import Optional, Dict, Any
 
+from .patrones import NO_DIGITO, NO_MONTO, PDF_CID, PDF_ENCABEZADO, PDF_RARO, acierto
 
-def _extract_text(pdf_path: Path) -> str:
+
+# "regex": PDF_ENCABEZADO sobre el texto armado de las páginas.
+# "coordenadas": etiqueta -> valor por posición de las palabras
+# (extractor_coordenadas.py).
+MOTORES_PDF = ("regex", "coordenadas")
+
+
+def abrir_pdf(pdf_path: Path, contenido: bytes | None = None):
+    """pdfplumber.open del archivo o de sus bytes ya leídos."""
+    import pdfplumber  # diferido: pdfminer es costoso de importar
+
+    return pdfplumber.open(pdf_path if contenido is None else io.BytesIO(contenido))
+
+
+def _extract_text(pdf_path: Path, contenido: bytes | None = None) -> str:
     """Devuelve el texto completo del PDF (todas las páginas unidas)."""
-    with pdfplumber.open(pdf_path) as pdf:
+    with abrir_pdf(pdf_path, contenido) as pdf:
         return "\n".join((page.extract_text() or "") for page in pdf.pages)
 
 
+def estadisticas_texto(texto: str, estadisticas: Optional[dict]):
+    """
+    Si estadisticas es un dict, le pone "caracteres" (sin espacios) y
+    "legibles" (fracción que no es "(cid:N)" ni un carácter raro) del texto.
+    Las usa la compuerta de la IA (compuerta_ia.py).
+    """
+    if estadisticas is None:
+        return
+    visible = "".join(texto.split())
+    ilegibles = sum(map(len, PDF_CID.findall(visible))) + len(PDF_RARO.findall(visible))
+    estadisticas["caracteres"] = len(visible)
+    estadisticas["legibles"] = 1 - ilegibles / len(visible) if visible else 0.0
+
+
 def _normalizar_monto_colombiano(valor_raw: Optional[str]) -> Optional[str]:
     """
     Convierte montos tipo '6.800.000' o '286,000.00' a '6800000.00'.
@@ -22,12 +50,12 @@ def _normalizar_monto_colombiano(valor_raw: Optional[str]) -> Optional[str]:
 
     s = valor_raw.strip()
     # dejar solo dígitos, puntos y comas
-    s = re.sub(r"[^\d\.,]", "", s)
+    s = NO_MONTO.sub("", s)
     if not s:
         return None
 
     # para simplificar: quitamos todo lo que no sea dígito
-    solo_digitos = re.sub(r"\D", "", s)
+    solo_digitos = NO_DIGITO.sub("", s)
     if not solo_digitos:
         return None
 
@@ -37,7 +65,10 @@ def _normalizar_monto_colombiano(valor_raw: Optional[str]) -> Optional[str]:
 
 def parse_pdf_invoice(
     pdf_path: str | Path,
-    xml_hint: Optional[Dict[str, Any]] = None
+    xml_hint: Optional[Dict[str, Any]] = None,
+    contenido: Optional[bytes] = None,
+    motor: str = "regex",
+    estadisticas: Optional[dict] = None,
 ) -> Dict[str, Any]:
     """
     Extrae campos básicos de la factura desde el PDF.
@@ -45,11 +76,30 @@ def parse_pdf_invoice(
     xml_hint = dict opcional con valores del XML
                (cufe, nit_emisor, fecha_emision, subtotal, impuestos, total)
                que usamos como guía para escoger la fecha correcta, etc.
+    contenido = bytes del PDF ya leídos (opcional; evita abrirlo de nuevo)
+    motor = ver MOTORES_PDF
+    estadisticas = dict opcional que recibe el tamaño y la calidad del
+                   texto (ver estadisticas_texto)
     """
     pdf_path = Path(pdf_path)
-    texto = _extract_text(pdf_path)
+    if motor == "coordenadas":
+        from .extractor_coordenadas import campos_pdf_por_coordenadas
+
+        with abrir_pdf(pdf_path, contenido) as pdf:
+            return campos_pdf_por_coordenadas(pdf, xml_hint, estadisticas)
+    texto = _extract_text(pdf_path, contenido)
+    estadisticas_texto(texto, estadisticas)
+    return campos_pdf_desde_texto(texto, xml_hint)
 
-    resultado: Dict[str, Any] = {
+
+def _anotar(posiciones: Optional[dict], campo: str, m, grupo: str):
+    if posiciones is not None:
+        posiciones[campo] = (m.start(), m.start(grupo), m.end(grupo))
+
+
+def resultado_vacio() -> Dict[str, Any]:
+    """Campos del PDF, todos sin valor."""
+    return {
         "cufe": None,
         "numero": None,
         "nit_emisor": None,
@@ -62,26 +112,69 @@ def parse_pdf_invoice(
         "items": [],
     }
 
+
+def campos_pdf_desde_texto(
+    texto: str,
+    xml_hint: Optional[Dict[str, Any]] = None,
+    posiciones: Optional[dict] = None,
+) -> Dict[str, Any]:
+    """
+    Campos de la factura a partir del texto del PDF (ver parse_pdf_invoice).
+
+    posiciones = dict opcional que recibe, por cada campo leído del texto,
+                 (inicio de la coincidencia, inicio del valor, fin del valor)
+                 en texto; lo usa plantillas_pdf.py para ubicar el valor y su
+                 etiqueta en la página.
+    """
+    resultado = resultado_vacio()
+
+    # Una sola pasada sobre el texto para todos los campos (ver patrones.py)
+    m_cufe = m_sub = m_iva = m_tot = None
+    m_nits = []
+    m_fechas = []
+    for m in PDF_ENCABEZADO.finditer(texto):
+        campo = m.lastgroup
+        if campo == "fecha":
+            m_fechas.append(m)
+        elif campo == "nit":
+            m_nits.append(m)
+        elif campo == "iva":
+            m_iva = m  # la última
+        elif campo == "cufe":
+            m_cufe = m_cufe or m
+        elif campo == "subtotal":
+            m_sub = m_sub or m
+        elif campo == "total":
+            m_tot = m_tot or m
+
     # ---------------- CUFE ----------------
-    m_cufe = re.search(r"CUFE[:\s]+([0-9a-fA-F]{40,})", texto)
     if m_cufe:
-        resultado["cufe"] = m_cufe.group(1).strip()
+        resultado["cufe"] = m_cufe.group("cufe").strip()
+        acierto("pdf.cufe")
+        _anotar(posiciones, "cufe", m_cufe, "cufe")
 
     # ---------------- NIT emisor ----------------
-    nit_candidates = re.findall(r"\bNIT?\s+(\d+)", texto, flags=re.IGNORECASE)
-    for nit in nit_candidates:
+    for m in m_nits:
+        nit = m.group("nit")
         if xml_hint and "nit_emisor" in xml_hint and xml_hint["nit_emisor"]:
-            nit_xml = re.sub(r"\D", "", str(xml_hint["nit_emisor"]))
+            nit_xml = NO_DIGITO.sub("", str(xml_hint["nit_emisor"]))
             if nit == nit_xml:
                 resultado["nit_emisor"] = nit
+                acierto("pdf.nit")
+                _anotar(posiciones, "nit_emisor", m, "nit")
                 break
         else:
             resultado["nit_emisor"] = nit
+            acierto("pdf.nit")
+            _anotar(posiciones, "nit_emisor", m, "nit")
             break
 
     # ---------------- Fecha de emisión ----------------
-    fechas = re.findall(r"\b(\d{2})/(\d{2})/(\d{4})\b", texto)
-    fecha_iso = None
+    fecha_iso = m_fecha = None
+    fechas = []
+    for m in m_fechas:
+        f = m.group("fecha")
+        fechas.append((f[0:2], f[3:5], f[6:10]))
 
     if xml_hint and xml_hint.get("fecha_emision"):
         # buscamos una fecha dd/mm/yyyy que coincida con la del XML
@@ -91,39 +184,41 @@ def parse_pdf_invoice(
         except Exception:
             target = None
 
-        for d, m_, y in fechas:
+        for (d, m_, y), m in zip(fechas, m_fechas):
             if target and (int(d), int(m_), int(y)) == target:
                 fecha_iso = f"{y}-{m_}-{d}"
+                m_fecha = m
                 break
 
     if not fecha_iso and fechas:
         d, m_, y = fechas[0]
         fecha_iso = f"{y}-{m_}-{d}"
+        m_fecha = m_fechas[0]
 
     resultado["fecha_emision"] = fecha_iso
+    if fecha_iso:
+        acierto("pdf.fecha")
+        _anotar(posiciones, "fecha_emision", m_fecha, "fecha")
 
     # ---------------- Subtotal ----------------
-    m_sub = re.search(r"SUBTOTAL\s+([\d\.\,]+)", texto, flags=re.IGNORECASE)
     if m_sub:
-        resultado["subtotal"] = _normalizar_monto_colombiano(m_sub.group(1))
+        resultado["subtotal"] = _normalizar_monto_colombiano(m_sub.group("subtotal"))
+        acierto("pdf.subtotal")
+        _anotar(posiciones, "subtotal", m_sub, "subtotal")
 
     # ---------------- Impuestos (IVA) ----------------
-    iva_val = None
-    for m_iva in re.finditer(r"\bIVA\b[^\d]*([\d\.\,]+)", texto):
-        iva_val = m_iva.group(1)
-
-    if iva_val:
-        resultado["impuestos"] = _normalizar_monto_colombiano(iva_val)
+    if m_iva:
+        resultado["impuestos"] = _normalizar_monto_colombiano(m_iva.group("iva"))
+        acierto("pdf.iva")
+        _anotar(posiciones, "impuestos", m_iva, "iva")
 
     # ---------------- Total ----------------
-    m_tot = re.search(
-        r"TOTAL DE LA OPERACI[ÓO]N\s+([\d\.\,]+)",
-        texto,
-        flags=re.IGNORECASE,
-    )
     if m_tot:
-        resultado["total"] = _normalizar_monto_colombiano(m_tot.group(1))
+        resultado["total"] = _normalizar_monto_colombiano(m_tot.group("total"))
+        acierto("pdf.total")
+        _anotar(posiciones, "total", m_tot, "total")
     elif xml_hint and xml_hint.get("total"):
         resultado["total"] = str(xml_hint["total"])
+        acierto("pdf.total_desde_xml")
 
     return resultado
@@ -1,7 +1,25 @@
+import io
+import mmap
+import os
+from contextlib import contextmanager
 from pathlib import Path
 from decimal import Decimal, InvalidOperation
-from typing import Union, Dict, Any
-import re
+from typing import Any, Dict, Optional, Union
+
+from .patrones import (
+    XML_BYTES,
+    XML_CUFE_UUID,
+    XML_FECHA,
+    XML_IMPUESTOS,
+    XML_NIT_EMISOR,
+    XML_NUMERO,
+    XML_PARENT_ID,
+    XML_QR,
+    XML_QR_DOCUMENTKEY,
+    XML_SUBTOTAL,
+    XML_TOTAL,
+    acierto,
+)
 
 
 def _parse_decimal(valor: str):
@@ -22,10 +40,75 @@ def _parse_decimal(valor: str):
         return None
 
 
-def parse_xml_invoice(xml_path: Union[str, Path]) -> Dict[str, Any]:
+# "bytes": mmap + regex de bytes, decodifica solo los valores encontrados.
+# "texto": decodifica el archivo completo y busca sobre el str (histórico).
+MODOS_XML = ("bytes", "texto")
+
+
+def _buscar_bytes(datos):
+    def buscar(regex):
+        # No se guarda el match: mientras exista, un mmap no se puede cerrar
+        m = XML_BYTES[regex].search(datos)
+        return m.group(1).decode("utf-8", errors="ignore") if m else None
+
+    return buscar
+
+
+@contextmanager
+def _buscador(xml_path: Path, modo: str, contenido: Optional[bytes] = None):
+    """
+    Devuelve buscar(regex) -> str del grupo 1 o None, sobre el contenido
+    del XML según el modo.
+
+    En modo "bytes" el archivo se mapea en memoria (sin copiarlo al heap) y
+    solo se decodifican los valores encontrados. Los grupos empiezan y
+    terminan en caracteres ASCII (<, >, dígitos...), así que decodificar el
+    trozo da lo mismo que recortar el texto decodificado completo.
+
+    contenido: bytes del archivo ya leídos (p. ej. para calcular su huella,
+    ver cache_parejas.py); si viene, no se vuelve a abrir el archivo.
+    """
+    if modo == "texto":
+        if contenido is None:
+            texto = xml_path.read_text(encoding="utf-8", errors="ignore")
+        else:
+            # Igual que read_text: mismos saltos de línea universales
+            texto = io.TextIOWrapper(io.BytesIO(contenido), encoding="utf-8", errors="ignore").read()
+
+        def buscar(regex):
+            m = regex.search(texto)
+            return m.group(1) if m else None
+
+        yield buscar
+        return
+
+    if modo != "bytes":
+        raise ValueError(f"Modo de lectura XML desconocido: {modo}")
+
+    if contenido is not None:
+        yield _buscar_bytes(contenido)
+        return
+
+    with open(xml_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            datos = b""  # mmap no acepta archivos vacíos
+        else:
+            datos = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            yield _buscar_bytes(datos)
+        finally:
+            if isinstance(datos, mmap.mmap):
+                datos.close()
+
+
+def parse_xml_invoice(
+    xml_path: Union[str, Path], modo: str = "bytes", contenido: Optional[bytes] = None
+) -> Dict[str, Any]:
     """
     Extrae campos clave de un XML DIAN (AttachedDocument con Invoice dentro).
     Reutiliza la misma idea de tu código C#: regex sobre el contenido completo.
+    modo: ver MODOS_XML. contenido: bytes ya leídos del archivo (opcional).
     Devuelve:
       - cufe
       - numero (ID de la factura o ParentDocumentID)
@@ -36,79 +119,54 @@ def parse_xml_invoice(xml_path: Union[str, Path]) -> Dict[str, Any]:
       - total
     """
     xml_path = Path(xml_path)
-    contenido = xml_path.read_text(encoding="utf-8", errors="ignore")
+    with _buscador(xml_path, modo, contenido) as buscar:
+        return _campos_xml(buscar)
 
+
+def _campos_xml(buscar) -> Dict[str, Any]:
     # -----------------------------
     # CUFE: primero intentamos UUID (CUFE-SHA384), luego QRCode
     # -----------------------------
     cufe = None
 
     # UUID dentro del Invoice (CUFE-SHA384)
-    m_cufe_uuid = re.search(
-        r"<cbc:UUID[^>]*schemeName=\"CUFE-SHA384\"[^>]*>([0-9a-fA-F]+)</cbc:UUID>",
-        contenido,
-        flags=re.IGNORECASE | re.DOTALL,
-    )
-    if m_cufe_uuid:
-        cufe = m_cufe_uuid.group(1).strip()
+    cufe_uuid = buscar(XML_CUFE_UUID)
+    if cufe_uuid is not None:
+        cufe = cufe_uuid.strip()
+        acierto("xml.cufe_uuid")
 
     if not cufe:
         # Como en tu C#: desde sts:QRCode, documentkey=...
-        m_qr = re.search(
-            r"<\s*sts:QRCode\b[^>]*>(.*?)</\s*sts:QRCode\s*>",
-            contenido,
-            flags=re.IGNORECASE | re.DOTALL,
-        )
-        if m_qr:
-            qr_text = m_qr.group(1).strip()
-            m_doc_key = re.search(
-                r"documentkey=([0-9a-fA-F]+)",
-                qr_text,
-                flags=re.IGNORECASE,
-            )
+        qr = buscar(XML_QR)
+        if qr is not None:
+            qr_text = qr.strip()
+            m_doc_key = XML_QR_DOCUMENTKEY.search(qr_text)
             if m_doc_key:
                 cufe = m_doc_key.group(1).strip()
+                acierto("xml.cufe_qr")
 
     # -----------------------------
     # NUMERO de la factura
     # -----------------------------
     # Opción 1: ID del AttachedDocument (277 en tu ejemplo)
-    m_num1 = re.search(
-        r"<cbc:ID>(\s*\d+\s*)</cbc:ID>",
-        contenido,
-        flags=re.IGNORECASE,
-    )
-    numero = m_num1.group(1).strip() if m_num1 else None
+    num1 = buscar(XML_NUMERO)
+    numero = num1.strip() if num1 is not None else None
 
     # Opción 2 (alternativa): ParentDocumentID (FE2259)
     # Si quisieras usar ese como "numero real" de factura:
-    m_parent = re.search(
-        r"<cbc:ParentDocumentID>(.*?)</cbc:ParentDocumentID>",
-        contenido,
-        flags=re.IGNORECASE | re.DOTALL,
-    )
-    parent_document_id = m_parent.group(1).strip() if m_parent else None
+    parent = buscar(XML_PARENT_ID)
+    parent_document_id = parent.strip() if parent is not None else None
 
     # -----------------------------
     # NIT EMISOR: AccountingSupplierParty
     # -----------------------------
-    m_nit = re.search(
-        r"<cac:AccountingSupplierParty>.*?"
-        r"<cbc:CompanyID[^>]*>(\d+)</cbc:CompanyID>",
-        contenido,
-        flags=re.IGNORECASE | re.DOTALL,
-    )
-    nit_emisor = m_nit.group(1).strip() if m_nit else None
+    nit = buscar(XML_NIT_EMISOR)
+    nit_emisor = nit.strip() if nit is not None else None
 
     # -----------------------------
     # FECHA EMISION: IssueDate (YYYY-MM-DD)
     # -----------------------------
-    m_fecha = re.search(
-        r"<cbc:IssueDate>(\d{4}-\d{2}-\d{2})</cbc:IssueDate>",
-        contenido,
-        flags=re.IGNORECASE,
-    )
-    fecha_emision = m_fecha.group(1) if m_fecha else None
+    fecha_emision = buscar(XML_FECHA)
 
 
     # replicar tu regex C#, pero para el proyecto basta con IssueDate.)
@@ -118,30 +176,15 @@ def parse_xml_invoice(xml_path: Union[str, Path]) -> Dict[str, Any]:
     # Tomados de <cac:LegalMonetaryTotal> y <cac:TaxTotal>
     # -----------------------------
     # subtotal: tomamos TaxExclusiveAmount (base antes de IVA)
-    m_subtotal = re.search(
-        r"<cbc:TaxExclusiveAmount\s+currencyID=\"COP\"\s*>([^<]+)</cbc:TaxExclusiveAmount>",
-        contenido,
-        flags=re.IGNORECASE,
-    )
-    subtotal = _parse_decimal(m_subtotal.group(1)) if m_subtotal else None
+    subtotal = _parse_decimal(buscar(XML_SUBTOTAL))
 
     # impuestos: TaxTotal/TaxAmount
-    m_impuestos = re.search(
-        r"<cac:TaxTotal>.*?<cbc:TaxAmount\s+currencyID=\"COP\"\s*>([^<]+)</cbc:TaxAmount>",
-        contenido,
-        flags=re.IGNORECASE | re.DOTALL,
-    )
-    impuestos = _parse_decimal(m_impuestos.group(1)) if m_impuestos else None
+    impuestos = _parse_decimal(buscar(XML_IMPUESTOS))
 
     # total
-    m_total = re.search(
-        r"<cbc:PayableAmount\s+currencyID=\"COP\"\s*>([^<]+)</cbc:PayableAmount>",
-        contenido,
-        flags=re.IGNORECASE,
-    )
-    total = _parse_decimal(m_total.group(1)) if m_total else None
-
-    return {
+    total = _parse_decimal(buscar(XML_TOTAL))
+
+    resultado = {
         "cufe": cufe,
         "numero": numero,
         "parent_document_id": parent_document_id,
@@ -151,3 +194,7 @@ def parse_xml_invoice(xml_path: Union[str, Path]) -> Dict[str, Any]:
         "impuestos": impuestos,
         "total": total,
     }
+    for campo, valor in resultado.items():
+        if valor is not None and campo != "cufe":  # el CUFE se cuenta por regla arriba
+            acierto(f"xml.{campo}")
+    return resultado
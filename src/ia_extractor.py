@@ -1,30 +1,47 @@
 # src/ia_extractor.py
 from __future__ import annotations
 
-import re
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Any
 
-from openai import OpenAI
-from pydantic import BaseModel, Field
-from pypdf import PdfReader
+from .patrones import SALTOS_MULTIPLES
 
+# openai, pydantic y pypdf se importan solo cuando de verdad se llama a la IA:
+# importar este módulo debe ser barato (arranque del agente / CLI).
 
-class FacturaIA(BaseModel):
-    cufe: Optional[str] = None
-    numero: Optional[str] = None
-    nit_emisor: Optional[str] = None
-    fecha_emision: Optional[str] = None
-    fecha_vencimiento: Optional[str] = None
-    subtotal: Optional[str] = None
-    impuestos: Optional[str] = None
-    total: Optional[str] = None
 
-    nivel_confianza: int = Field(default=70, ge=0, le=100)
-    observaciones: list[str] = Field(default_factory=list)
+@lru_cache(maxsize=1)
+def _modelo_factura_ia():
+    """Construye (una vez) el modelo Pydantic de la respuesta estructurada."""
+    from pydantic import BaseModel, Field
+
+    class FacturaIA(BaseModel):
+        cufe: Optional[str] = None
+        numero: Optional[str] = None
+        nit_emisor: Optional[str] = None
+        fecha_emision: Optional[str] = None
+        fecha_vencimiento: Optional[str] = None
+        subtotal: Optional[str] = None
+        impuestos: Optional[str] = None
+        total: Optional[str] = None
+
+        nivel_confianza: int = Field(default=70, ge=0, le=100)
+        observaciones: list[str] = Field(default_factory=list)
+
+    return FacturaIA
+
+
+def __getattr__(name: str):
+    # Compatibilidad: `from src.ia_extractor import FacturaIA`
+    if name == "FacturaIA":
+        return _modelo_factura_ia()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def extraer_texto_pdf(pdf_path: Path) -> str:
+    from pypdf import PdfReader
+
     reader = PdfReader(str(pdf_path))
     partes = []
     for page in reader.pages:
@@ -32,7 +49,7 @@ def extraer_texto_pdf(pdf_path: Path) -> str:
         partes.append(txt)
     texto = "\n".join(partes).strip()
     # Limpieza ligera
-    texto = re.sub(r"\n{3,}", "\n\n", texto)
+    texto = SALTOS_MULTIPLES.sub("\n\n", texto)
     return texto
 
 
@@ -64,6 +81,8 @@ def extraer_campos_pdf_con_ia(
         f"{hint}"
     )
 
+    from openai import OpenAI
+
     client = OpenAI(api_key=api_key)
 
     # Structured outputs con Pydantic (Responses API)
@@ -73,8 +92,13 @@ def extraer_campos_pdf_con_ia(
             {"role": "system", "content": "Eres un extractor de datos de facturas."},
             {"role": "user", "content": prompt},
         ],
-        text_format=FacturaIA,
+        text_format=_modelo_factura_ia(),
     )
 
-    data: FacturaIA = response.output_parsed  # :contentReference[oaicite:2]{index=2}
-    return data.model_dump()
+    data = response.output_parsed  # :contentReference[oaicite:2]{index=2}
+    datos = data.model_dump()
+
+    # Uso de tokens para las métricas (el agente lo retira antes de conciliar)
+    uso = getattr(response, "usage", None)
+    datos["_uso"] = {"tokens": getattr(uso, "total_tokens", None)}
+    return datos
@@ -0,0 +1,390 @@
+"""
+Índice SQLite de los resultados de conciliación ya guardados.
+
+Buscar "todas las facturas del NIT X del último trimestre que quedaron en
+revisión por total" ya no obliga a abrir miles de *_conciliacion.json: una
+fila por factura con lo que se filtra (NIT, CUFE, fecha, total, estado) y
+una tabla aparte con los campos a revisar, todo con índices.
+
+    indice = IndiceResultados(Path("data/logs/indice_resultados.sqlite"))
+    indice.indexar_carpeta(Path("data/processed"))     # incremental
+    pagina = indice.consultar(nit="900123456", desde="2025-01-01",
+                              hasta="2025-03-31", campo="total")
+    pagina["facturas"], pagina["siguiente"]             # siguiente -> cursor=
+
+Se llena de dos formas:
+  - el agente, al cerrar cada ZIP, si CONFIG["indice"]["enabled"] (desde el
+    hilo escritor, cuando los archivos ya están en disco),
+  - indexar_carpeta(data/processed) para lo histórico; solo relee los
+    archivos nuevos o modificados (ruta + mtime + tamaño).
+
+La identidad de una factura es (zip, id_factura): volver a procesar un ZIP
+completo reemplaza sus filas (y borra las de facturas que ya no trae);
+indexar_carpeta con `completo` borra las filas cuyo archivo ya no está. La
+paginación es por cursor (el id de la última fila devuelta), no con
+OFFSET, así cada página cuesta lo mismo aunque haya millones de facturas.
+Los totales se guardan en centavos (enteros) para comparar rangos exactos;
+los que no caben en int64 quedan sin total.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from .normalizacion import NO_REPRESENTABLE, decimal_a_centavos, normalizar_fecha, normalizar_nit
+
+ESTADOS = ("ok", "revision", "error")
+TAMANO_PAGINA = 50
+_LOTE = 1000
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS facturas (
+    id INTEGER PRIMARY KEY,
+    id_factura TEXT NOT NULL,
+    zip TEXT NOT NULL,
+    ruta TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    nit TEXT,
+    cufe TEXT,
+    numero TEXT,
+    fecha TEXT,
+    total_centavos INTEGER,
+    campos_a_revisar TEXT NOT NULL,
+    error TEXT,
+    mtime_ns INTEGER,
+    tamano INTEGER,
+    indexado REAL NOT NULL,
+    UNIQUE (zip, id_factura)
+);
+CREATE INDEX IF NOT EXISTS ix_facturas_nit ON facturas (nit);
+CREATE INDEX IF NOT EXISTS ix_facturas_cufe ON facturas (cufe);
+CREATE INDEX IF NOT EXISTS ix_facturas_fecha ON facturas (fecha);
+CREATE INDEX IF NOT EXISTS ix_facturas_total ON facturas (total_centavos);
+CREATE INDEX IF NOT EXISTS ix_facturas_estado ON facturas (estado);
+CREATE INDEX IF NOT EXISTS ix_facturas_id_factura ON facturas (id_factura);
+CREATE TABLE IF NOT EXISTS revision (
+    campo TEXT NOT NULL,
+    factura INTEGER NOT NULL REFERENCES facturas (id) ON DELETE CASCADE,
+    PRIMARY KEY (campo, factura)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_revision_factura ON revision (factura);
+"""
+
+_COLUMNAS = (
+    "id_factura, zip, ruta, estado, nit, cufe, numero, fecha, total_centavos, "
+    "campos_a_revisar, error, mtime_ns, tamano, indexado"
+)
+_UPSERT = (
+    f"INSERT INTO facturas ({_COLUMNAS}) VALUES ({', '.join('?' * 14)}) "
+    "ON CONFLICT (zip, id_factura) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in _COLUMNAS.split(", ")[2:])
+    + " RETURNING id"
+)
+
+
+def _resuelto(res: dict, campo: str):
+    return ((res.get("conciliacion") or {}).get(campo) or {}).get("valor_resuelto")
+
+
+def _centavos(valor) -> int | None:
+    """Monto resuelto (Decimal, o texto en el .json histórico) -> centavos."""
+    if valor is None:
+        return None
+    if not isinstance(valor, Decimal):
+        try:
+            valor = Decimal(str(valor))
+        except InvalidOperation:
+            return None
+    centavos = decimal_a_centavos(valor)
+    return None if centavos is NO_REPRESENTABLE else centavos
+
+
+def _limite_centavos(valor, redondeo: str) -> int:
+    """Borde de un rango de montos: min redondea hacia arriba, max hacia abajo."""
+    d = Decimal(str(valor)) * 100
+    return int(d.to_integral_value(rounding=redondeo))
+
+
+def _fila(res: dict, nombre_zip: str, ruta: str, estado: str, archivo=None) -> tuple:
+    xml = res.get("xml_raw") or {}
+    cufe = _resuelto(res, "cufe") or xml.get("cufe")
+    return (
+        res["id_factura"],
+        nombre_zip,
+        ruta,
+        estado,
+        _resuelto(res, "nit_emisor") or xml.get("nit_emisor"),
+        cufe.lower() if isinstance(cufe, str) else cufe,
+        _resuelto(res, "numero"),
+        _resuelto(res, "fecha_emision"),
+        _centavos(_resuelto(res, "total")),
+        ";".join(res.get("campos_a_revisar") or ()),
+        res.get("error"),
+        archivo.st_mtime_ns if archivo else None,
+        archivo.st_size if archivo else None,
+        time.time(),
+    )
+
+
+class IndiceNulo:
+    """Sin índice: misma interfaz de escritura, no guarda nada."""
+
+    activo = False
+
+    def indexar_zip(self, resultados: list, registros: list, nombre_zip: str | None = None):
+        pass
+
+    def cerrar(self):
+        pass
+
+
+class IndiceResultados(IndiceNulo):
+    activo = True
+
+    def __init__(self, ruta: Path):
+        self.ruta = Path(ruta)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        # Lo escribe el hilo escritor del agente y lo leen otros: una sola
+        # conexión protegida con un lock
+        self._con = sqlite3.connect(self.ruta, check_same_thread=False, isolation_level=None)
+        self._con.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.execute("PRAGMA synchronous=NORMAL")
+            self._con.execute("PRAGMA foreign_keys=ON")
+            self._con.executescript(_ESQUEMA)
+
+    def cerrar(self):
+        with self._lock:
+            # Actualiza las estadísticas del planificador si hace falta (barato)
+            self._con.execute("PRAGMA optimize")
+            self._con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    # ==== Escritura ====
+    def _guardar(self, filas: list[tuple], nombre_zip: str | None = None):
+        """
+        Inserta o reemplaza filas (ver _fila) y sus campos a revisar. Con
+        nombre_zip, en la misma transacción borra las filas de ese ZIP que
+        no están en `filas`.
+        """
+        with self._lock:
+            self._con.execute("BEGIN")
+            try:
+                ids = set()
+                for fila in filas:
+                    id_ = self._con.execute(_UPSERT, fila).fetchone()[0]
+                    ids.add(id_)
+                    self._con.execute("DELETE FROM revision WHERE factura = ?", (id_,))
+                    campos = {c for c in fila[9].split(";") if c}
+                    self._con.executemany(
+                        "INSERT INTO revision (campo, factura) VALUES (?, ?)",
+                        [(c, id_) for c in campos],
+                    )
+                if nombre_zip is not None:
+                    sobrantes = [
+                        (fila[0],) for fila in self._con.execute(
+                            "SELECT id FROM facturas WHERE zip = ?", (nombre_zip,)
+                        )
+                        if fila[0] not in ids
+                    ]
+                    # revision se borra en cascada
+                    self._con.executemany("DELETE FROM facturas WHERE id = ?", sobrantes)
+                self._con.execute("COMMIT")
+            except BaseException:
+                self._con.execute("ROLLBACK")
+                raise
+
+    def indexar_zip(self, resultados: list, registros: list, nombre_zip: str | None = None):
+        """
+        Indexa los resultados de un ZIP con sus RegistroFactura (mismo orden).
+        Se llama con los archivos ya escritos: guarda su mtime/tamaño para
+        que indexar_carpeta no los vuelva a leer. nombre_zip = son todas las
+        facturas de ese ZIP: las demás filas del ZIP se borran.
+        """
+        filas = []
+        for res, reg in zip(resultados, registros):
+            try:
+                st = os.stat(reg.ruta) if reg.ruta else None
+            except OSError:
+                st = None
+            filas.append(_fila(res, reg.zip, reg.ruta, reg.estado, st))
+        self._guardar(filas, nombre_zip)
+
+    def indexar_carpeta(self, dir_processed: Path, completo: bool = False) -> int:
+        """
+        Indexa los resultados guardados en dir_processed/{zip}/*_conciliacion.*
+        Sin `completo`, solo relee los archivos nuevos o cambiados; con
+        `completo`, además borra las filas con archivo que ya no existe
+        (carpeta de ZIP borrada, resultado reescrito en otro formato).
+        Devuelve cuántas facturas (re)indexó.
+        """
+        from .agente_supervisor import AgenteSupervisor
+        from .serializacion import EXTENSIONES, leer_resultado
+
+        vistos = {}
+        if not completo:
+            with self._lock:
+                vistos = {
+                    r["ruta"]: (r["mtime_ns"], r["tamano"])
+                    for r in self._con.execute(
+                        "SELECT ruta, mtime_ns, tamano FROM facturas WHERE ruta != ''"
+                    )
+                }
+
+        n, filas, encontrados = 0, [], set()
+        for ext in sorted(set(EXTENSIONES.values())):
+            for archivo in Path(dir_processed).glob(f"*/*_conciliacion{ext}"):
+                encontrados.add(str(archivo))
+                st = archivo.stat()
+                if vistos.get(str(archivo)) == (st.st_mtime_ns, st.st_size):
+                    continue
+                try:
+                    res = leer_resultado(archivo)
+                except (OSError, ValueError):
+                    continue
+                estado = AgenteSupervisor._estado_resultado(res)
+                filas.append(_fila(res, archivo.parent.name, str(archivo), estado, st))
+                if len(filas) >= _LOTE:
+                    self._guardar(filas)
+                    n, filas = n + len(filas), []
+        self._guardar(filas)
+        if completo:
+            self._borrar_sin_archivo(encontrados)
+        return n + len(filas)
+
+    def _borrar_sin_archivo(self, encontrados: set[str]):
+        """Borra las filas con ruta que no está en `encontrados` (y su revision)."""
+        with self._lock:
+            self._con.execute("BEGIN")
+            try:
+                sobrantes = [
+                    (fila[0],) for fila in self._con.execute(
+                        "SELECT id, ruta FROM facturas WHERE ruta != ''"
+                    )
+                    if fila[1] not in encontrados
+                ]
+                self._con.executemany("DELETE FROM facturas WHERE id = ?", sobrantes)
+                self._con.execute("COMMIT")
+            except BaseException:
+                self._con.execute("ROLLBACK")
+                raise
+
+    # ==== Consulta ====
+    @staticmethod
+    def _filtros(
+        nit=None, cufe=None, desde=None, hasta=None, total_min=None, total_max=None,
+        estado=None, campo=None, zip=None, id_factura=None,
+    ) -> tuple[list[str], list]:
+        condiciones, parametros = [], []
+
+        def agregar(condicion, valor):
+            condiciones.append(condicion)
+            parametros.append(valor)
+
+        if nit is not None:
+            agregar("nit = ?", normalizar_nit(str(nit)))
+        if cufe is not None:
+            agregar("cufe = ?", str(cufe).strip().lower())
+        for valor, condicion in ((desde, "fecha >= ?"), (hasta, "fecha <= ?")):
+            if valor is not None:
+                fecha = normalizar_fecha(str(valor))
+                if fecha is None:
+                    raise ValueError(f"Fecha inválida: {valor}")
+                agregar(condicion, fecha)
+        if total_min is not None:
+            agregar("total_centavos >= ?", _limite_centavos(total_min, "ROUND_CEILING"))
+        if total_max is not None:
+            agregar("total_centavos <= ?", _limite_centavos(total_max, "ROUND_FLOOR"))
+        if estado is not None:
+            if estado not in ESTADOS:
+                raise ValueError(f"Estado desconocido: {estado}")
+            agregar("estado = ?", estado)
+        if campo is not None:
+            agregar(
+                "EXISTS (SELECT 1 FROM revision WHERE campo = ? AND factura = facturas.id)", campo
+            )
+        if zip is not None:
+            agregar("zip = ?", zip)
+        if id_factura is not None:
+            agregar("id_factura = ?", id_factura)
+        return condiciones, parametros
+
+    def consultar(self, limite: int = TAMANO_PAGINA, cursor: int | None = None, **filtros) -> dict:
+        """
+        Facturas que cumplen todos los filtros, en orden de indexación.
+        Filtros: nit, cufe, desde/hasta (fecha de emisión, inclusive),
+        total_min/total_max, estado, campo (a revisar), zip, id_factura.
+        Devuelve {"facturas": [...], "siguiente": cursor o None}.
+        """
+        condiciones, parametros = self._filtros(**filtros)
+        if cursor is not None:
+            condiciones.append("id > ?")
+            parametros.append(int(cursor))
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        limite = max(1, int(limite))
+        with self._lock:
+            # LIMIT literal, no como parámetro: con "LIMIT ?" el planificador
+            # prefiere recorrer por id aunque haya un índice mucho más selectivo
+            filas = self._con.execute(
+                f"SELECT * FROM facturas {donde} ORDER BY id LIMIT {limite + 1}", parametros
+            ).fetchall()
+        siguiente = filas[limite - 1]["id"] if len(filas) > limite else None
+        return {
+            "facturas": [self._factura(f) for f in filas[:limite]],
+            "siguiente": siguiente,
+        }
+
+    def contar(self, campo: str | None = None, **filtros) -> int:
+        condiciones, parametros = self._filtros(**filtros)
+        tablas = "facturas"
+        if campo is not None:
+            # Para contar conviene un JOIN: el planificador puede partir de
+            # revision (campo, factura) en vez de recorrer todas las facturas
+            tablas = "revision JOIN facturas ON facturas.id = revision.factura"
+            condiciones.insert(0, "revision.campo = ?")
+            parametros.insert(0, campo)
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        with self._lock:
+            return self._con.execute(f"SELECT COUNT(*) FROM {tablas} {donde}", parametros).fetchone()[0]
+
+    @staticmethod
+    def _factura(fila: sqlite3.Row) -> dict:
+        total = fila["total_centavos"]
+        return {
+            "id_factura": fila["id_factura"],
+            "zip": fila["zip"],
+            "estado": fila["estado"],
+            "nit": fila["nit"],
+            "cufe": fila["cufe"],
+            "numero": fila["numero"],
+            "fecha_emision": fila["fecha"],
+            "total": None if total is None else Decimal(total).scaleb(-2),
+            "campos_a_revisar": [c for c in fila["campos_a_revisar"].split(";") if c],
+            "error": fila["error"],
+            "ruta": fila["ruta"],
+        }
+
+
+def abrir_indice(config: dict):
+    """Índice según CONFIG["indice"] (IndiceNulo si está apagado)."""
+    cfg = config.get("indice", {})
+    if not cfg.get("enabled", False):
+        return IndiceNulo()
+    return IndiceResultados(ruta_indice(config))
+
+
+def ruta_indice(config: dict) -> Path:
+    ruta = config.get("indice", {}).get("ruta")
+    return Path(ruta) if ruta else Path(config["rutas"]["data_logs"]) / "indice_resultados.sqlite"
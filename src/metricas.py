@@ -0,0 +1,248 @@
+"""
+Métricas del agente CAFE para Prometheus.
+
+- Contadores de facturas por estado (ok / revision / error).
+- Histogramas de latencia por etapa y de la IA (segundos y tokens).
+- Gauges de cola pendiente, utilización de workers y aciertos de caché.
+- Aciertos por regla de extracción (regex de patrones.py).
+
+Se pueden servir por HTTP (puerto local) o escribir a un archivo .prom
+para el textfile collector de node_exporter. Si las métricas están
+desactivadas en CONFIG["metricas"], el agente usa MetricasNulas y no se
+importa prometheus_client.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Función llamada con el nombre de cada etapa al empezar (ver observar_etapas).
+_observador_etapas = None
+
+
+def observar_etapas(funcion) -> None:
+    """
+    Registra una función que cronometrar llama al entrar a cada etapa. La
+    usan los workers para avisar al proceso principal en qué etapa están
+    (vigilante de tiempos de ejecucion.py). None la quita.
+    """
+    global _observador_etapas
+    _observador_etapas = funcion
+
+
+@contextmanager
+def cronometrar(tiempos: dict, etapa: str):
+    """
+    Acumula en tiempos[etapa] los segundos del bloque. Sirve dentro de
+    procesos worker, donde no hay métricas: los tiempos viajan con el
+    resultado y el proceso principal los registra.
+    """
+    if _observador_etapas is not None:
+        _observador_etapas(etapa)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        tiempos[etapa] = tiempos.get(etapa, 0.0) + time.perf_counter() - inicio
+
+
+class MetricasNulas:
+    """Implementación vacía: misma interfaz, no registra nada."""
+
+    activa = False
+
+    @contextmanager
+    def etapa(self, nombre: str):
+        yield
+
+    def observar_etapa(self, nombre: str, segundos: float):
+        pass
+
+    def factura(self, estado: str):
+        pass
+
+    def ia(self, segundos: float, tokens: int | None = None):
+        pass
+
+    def cola(self, pendientes: int):
+        pass
+
+    def workers(self, ocupados: int, total: int):
+        pass
+
+    def cache(self, nombre: str, acierto: bool):
+        pass
+
+    def patrones(self, aciertos: dict):
+        pass
+
+    def exportar(self):
+        pass
+
+
+class MetricasAgente(MetricasNulas):
+    """
+    Métricas reales sobre un CollectorRegistry propio (no el global),
+    para que el archivo .prom solo contenga las métricas del agente.
+    """
+
+    activa = True
+
+    def __init__(self, textfile: str | Path | None = None):
+        from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+        self.registry = CollectorRegistry()
+        self.textfile = Path(textfile) if textfile else None
+
+        self._facturas = Counter(
+            "cafe_facturas_total",
+            "Facturas procesadas por estado final.",
+            ["estado"],
+            registry=self.registry,
+        )
+        self._etapas = Histogram(
+            "cafe_etapa_segundos",
+            "Latencia por etapa del procesamiento.",
+            ["etapa"],
+            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+            registry=self.registry,
+        )
+        self._ia_segundos = Histogram(
+            "cafe_ia_segundos",
+            "Latencia de las llamadas a la IA.",
+            buckets=(0.5, 1, 2, 4, 8, 15, 30, 60, 120),
+            registry=self.registry,
+        )
+        self._ia_tokens = Histogram(
+            "cafe_ia_tokens",
+            "Tokens consumidos por llamada a la IA.",
+            buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+            registry=self.registry,
+        )
+        self._cola = Gauge(
+            "cafe_cola_pendientes",
+            "Parejas PDF/XML pendientes de procesar.",
+            registry=self.registry,
+        )
+        self._workers_ocupados = Gauge(
+            "cafe_workers_ocupados",
+            "Workers procesando una factura en este momento.",
+            registry=self.registry,
+        )
+        self._workers_total = Gauge(
+            "cafe_workers_total",
+            "Workers disponibles.",
+            registry=self.registry,
+        )
+        self._utilizacion = Gauge(
+            "cafe_workers_utilizacion",
+            "Fracción de workers ocupados (0-1).",
+            registry=self.registry,
+        )
+        self._cache_consultas = Counter(
+            "cafe_cache_consultas_total",
+            "Consultas a cachés internas por resultado.",
+            ["cache", "resultado"],
+            registry=self.registry,
+        )
+        self._cache_ratio = Gauge(
+            "cafe_cache_ratio_aciertos",
+            "Aciertos / consultas de cada caché.",
+            ["cache"],
+            registry=self.registry,
+        )
+        self._patrones = Counter(
+            "cafe_patron_aciertos_total",
+            "Valores aportados por cada regla de extracción (ver patrones.py).",
+            ["patron"],
+            registry=self.registry,
+        )
+        # Conteo local para calcular el ratio sin leer el Counter
+        self._cache_conteo: dict[str, list[int]] = {}
+
+    # ==== Registro ====
+    @contextmanager
+    def etapa(self, nombre: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar_etapa(nombre, time.perf_counter() - inicio)
+
+    def observar_etapa(self, nombre: str, segundos: float):
+        self._etapas.labels(etapa=nombre).observe(segundos)
+
+    def factura(self, estado: str):
+        self._facturas.labels(estado=estado).inc()
+
+    def ia(self, segundos: float, tokens: int | None = None):
+        self._ia_segundos.observe(segundos)
+        if tokens:
+            self._ia_tokens.observe(tokens)
+
+    def cola(self, pendientes: int):
+        self._cola.set(pendientes)
+
+    def workers(self, ocupados: int, total: int):
+        self._workers_ocupados.set(ocupados)
+        self._workers_total.set(total)
+        self._utilizacion.set(ocupados / total if total else 0)
+
+    def cache(self, nombre: str, acierto: bool):
+        resultado = "acierto" if acierto else "fallo"
+        self._cache_consultas.labels(cache=nombre, resultado=resultado).inc()
+
+        conteo = self._cache_conteo.setdefault(nombre, [0, 0])
+        conteo[0] += int(acierto)
+        conteo[1] += 1
+        self._cache_ratio.labels(cache=nombre).set(conteo[0] / conteo[1])
+
+    def patrones(self, aciertos: dict):
+        for nombre, n in aciertos.items():
+            self._patrones.labels(patron=nombre).inc(n)
+
+    # ==== Exportación ====
+    def servir_http(self, puerto: int, host: str = "127.0.0.1"):
+        from prometheus_client import start_http_server
+
+        start_http_server(puerto, addr=host, registry=self.registry)
+
+    def exportar(self):
+        """Escribe el archivo .prom (escritura atómica de prometheus_client)."""
+        if self.textfile is None:
+            return
+        from prometheus_client import write_to_textfile
+
+        self.textfile.parent.mkdir(parents=True, exist_ok=True)
+        write_to_textfile(str(self.textfile), self.registry)
+
+
+# Una sola instancia por proceso: prometheus_client no permite registrar
+# dos veces la misma métrica ni abrir dos veces el mismo puerto.
+_METRICAS: MetricasNulas | None = None
+
+
+def obtener_metricas(config: dict | None = None) -> MetricasNulas:
+    """
+    Devuelve las métricas del proceso según config["metricas"]:
+      - enabled: activa el registro
+      - puerto: si > 0, sirve /metrics en host:puerto
+      - textfile: ruta del archivo .prom (opcional)
+    """
+    global _METRICAS
+    if _METRICAS is not None:
+        return _METRICAS
+
+    cfg = (config or {}).get("metricas", {})
+    if not cfg.get("enabled", False):
+        return MetricasNulas()
+
+    metricas = MetricasAgente(textfile=cfg.get("textfile") or None)
+    puerto = int(cfg.get("puerto", 0) or 0)
+    if puerto > 0:
+        metricas.servir_http(puerto, cfg.get("host", "127.0.0.1"))
+
+    _METRICAS = metricas
+    return metricas
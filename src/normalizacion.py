@@ -1,8 +1,40 @@
-import re
+"""
+Normalización de NIT, montos y fechas antes de comparar PDF contra XML.
+
+Versiones escalares (una por valor, las que usa conciliar_campo) con una
+caché LRU acotada: cada factura normaliza cada campo dos veces (PDF y XML)
+y muchos valores se repiten entre facturas del mismo proveedor.
+
+Versiones por lote (normalizar_nits / normalizar_montos / normalizar_fechas)
+para listas o pandas.Series: operaciones vectorizadas de texto y
+pd.to_datetime con formato explícito. Dan exactamente lo mismo que aplicar
+la versión escalar a cada elemento (benchmarks/bench_normalizacion.py lo
+verifica); lo que el camino vectorizado no resuelve pasa por la escalar.
+
+Montos en punto fijo (normalizar_monto_centavos / normalizar_montos_centavos):
+centavos como enteros int64, para comparar con aritmética entera (ver
+config["comparacion"]["aritmetica"] en conciliacion.py) o con numpy.
+"""
+
+import calendar
+from datetime import date
 from decimal import Decimal, InvalidOperation
-from datetime import datetime
+from functools import lru_cache
 from typing import Any, Optional
 
+from .patrones import FECHAS, MONTO_DECIMAL_SIMPLE, NO_DIGITO, SEPARADOR_MILES
+
+# Entradas distintas que recuerda cada caché escalar
+TAMANO_CACHE = 4096
+
+# Centavos como enteros: deben caber en int64 para poder ir a numpy
+_MAX_CENTAVOS = 2**63 - 1
+
+# normalizar_monto_centavos: el monto existe pero no es un entero de
+# centavos en int64 (fracción de centavo, NaN, demasiado grande). Quien lo
+# recibe debe usar el camino Decimal.
+NO_REPRESENTABLE = object()
+
 
 def normalizar_nit(nit: Optional[str]) -> Optional[str]:
     """
@@ -10,7 +42,12 @@ def normalizar_nit(nit: Optional[str]) -> Optional[str]:
     """
     if not nit:
         return None
-    solo_digitos = re.sub(r"\D", "", nit)
+    return _nit_desde_texto(nit)
+
+
+@lru_cache(maxsize=TAMANO_CACHE)
+def _nit_desde_texto(nit: str) -> Optional[str]:
+    solo_digitos = NO_DIGITO.sub("", nit)
     return solo_digitos or None
 
 
@@ -45,40 +82,92 @@ def normalizar_monto(monto: Any) -> Optional[Decimal]:
 
     # Caso 4: string
     if isinstance(monto, str):
-        texto = monto.strip().replace(" ", "")
-        if not texto:
-            return None
-
-        # Patrón: dígitos + opcionalmente (punto o coma + 1-2 dígitos)
-        # Ejemplos que matchean:
-        #   "8092000"
-        #   "8092000.0"
-        #   "8092000.00"
-        #   "8092000,00"
-        patron_decimal_simple = r"^\d+([.,]\d{1,2})?$"
-
-        if re.match(patron_decimal_simple, texto):
-            # Interpretamos '.' o ',' como separador decimal
-            texto_decimal = texto.replace(",", ".")
-            try:
-                return Decimal(texto_decimal)
-            except InvalidOperation:
-                return None
-
-        # Si llegamos aquí, asumimos que '.' y ',' son separadores de miles
-        # Ej: "8.092.000" -> "8092000"
-        solo_digitos = re.sub(r"[.,]", "", texto)
-        if not solo_digitos:
-            return None
-        try:
-            return Decimal(solo_digitos)
-        except InvalidOperation:
-            return None
+        return _monto_desde_texto(monto)
 
     # Cualquier otro tipo raro -> None
     return None
 
 
+@lru_cache(maxsize=TAMANO_CACHE)
+def _monto_desde_texto(monto: str) -> Optional[Decimal]:
+    # Solo se cachean textos: Decimal("5.0") == Decimal("5.00") y una caché
+    # por valor devolvería la escala equivocada.
+    texto = monto.strip().replace(" ", "")
+    if not texto:
+        return None
+
+    # Patrón: dígitos + opcionalmente (punto o coma + 1-2 dígitos)
+    # Ejemplos que matchean:
+    #   "8092000"
+    #   "8092000.0"
+    #   "8092000.00"
+    #   "8092000,00"
+    if MONTO_DECIMAL_SIMPLE.match(texto):
+        # Interpretamos '.' o ',' como separador decimal
+        return _decimal_o_none(texto.replace(",", "."))
+
+    # Si llegamos aquí, asumimos que '.' y ',' son separadores de miles
+    # Ej: "8.092.000" -> "8092000"
+    return _decimal_o_none(SEPARADOR_MILES.sub("", texto))
+
+
+def _decimal_o_none(texto: str) -> Optional[Decimal]:
+    if not texto:
+        return None
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        return None
+
+
+def normalizar_monto_centavos(monto: Any):
+    """
+    Como normalizar_monto, pero en punto fijo: el monto en centavos como
+    entero (rango int64). "6800000.00" -> 680000000; "8.092.000" -> 809200000.
+
+    None si no hay monto; NO_REPRESENTABLE si no es un número entero de
+    centavos (p. ej. Decimal("0.005"), NaN) o no cabe en int64.
+    """
+    if isinstance(monto, str):
+        return _centavos_desde_texto(monto)
+    return decimal_a_centavos(normalizar_monto(monto))
+
+
+@lru_cache(maxsize=TAMANO_CACHE)
+def _centavos_desde_texto(monto: str):
+    # Mismas reglas que _monto_desde_texto, sin pasar por Decimal
+    texto = monto.strip().replace(" ", "")
+    if not texto:
+        return None
+    if MONTO_DECIMAL_SIMPLE.match(texto):
+        entero, _, fraccion = texto.replace(",", ".").partition(".")
+        digitos, escala = entero + fraccion, len(fraccion)
+    else:
+        digitos, escala = SEPARADOR_MILES.sub("", texto), 0
+    if not digitos:
+        return None
+    if not (digitos.isascii() and digitos.isdigit()):
+        # signo, exponente, dígitos no ASCII...: que decida Decimal
+        return decimal_a_centavos(_monto_desde_texto(monto))
+    return _validar_centavos(int(digitos) * 10 ** (2 - escala))
+
+
+def decimal_a_centavos(valor: Optional[Decimal]):
+    """Decimal -> centavos (int); None si valor es None."""
+    if valor is None:
+        return None
+    if not valor.is_finite() or valor.adjusted() > 18:
+        return NO_REPRESENTABLE
+    centavos = valor.scaleb(2)
+    if centavos != centavos.to_integral_value():
+        return NO_REPRESENTABLE  # fracción de centavo
+    return _validar_centavos(int(centavos))
+
+
+def _validar_centavos(centavos: int):
+    return centavos if abs(centavos) <= _MAX_CENTAVOS else NO_REPRESENTABLE
+
+
 def normalizar_fecha(fecha: Optional[str]) -> Optional[str]:
     """
     Intenta convertir diferentes formatos de fecha a 'YYYY-MM-DD'.
@@ -89,11 +178,148 @@ def normalizar_fecha(fecha: Optional[str]) -> Optional[str]:
     """
     if not fecha:
         return None
-    formatos = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"]
-    for fmt in formatos:
-        try:
-            dt = datetime.strptime(fecha.strip(), fmt)
-            return dt.strftime("%Y-%m-%d")
-        except ValueError:
+    return _fecha_desde_texto(fecha.strip())
+
+
+@lru_cache(maxsize=TAMANO_CACHE)
+def _fecha_desde_texto(texto: str) -> Optional[str]:
+    # Igual que probar datetime.strptime con cada formato, pero sin usar
+    # excepciones para descartar: mismo regex que strptime (match + todo el
+    # texto consumido) y luego validar año, mes y día.
+    for _, regex in FECHAS:
+        m = regex.match(texto)
+        if m is None or m.end() != len(texto):
             continue
+        y, mes, d = int(m.group("Y")), int(m.group("m")), int(m.group("d"))
+        if y < 1 or d > calendar.monthrange(y, mes)[1]:
+            continue
+        if y < 1000:
+            return date(y, mes, d).strftime("%Y-%m-%d")  # relleno del año según la plataforma
+        return f"{y}-{mes:02d}-{d:02d}"
     return None
+
+
+# ==== Por lote (listas o pandas.Series) ====
+def _como_serie(valores):
+    """
+    (serie de tipo object con índice 0..n-1, índice original o None).
+    None = la entrada no era Series y se devuelve una lista.
+    """
+    import pandas as pd  # diferido: solo para las versiones por lote
+
+    if isinstance(valores, pd.Series):
+        serie = valores.astype(object).reset_index(drop=True)
+        if valores.dtype != object:
+            # Faltantes de Series tipadas (NaN, pd.NA) -> None; en una Series
+            # object se respeta el valor (Decimal("NaN") es un monto válido)
+            serie = serie.where(valores.notna().to_numpy(), None)
+        return serie, valores.index
+    return pd.Series(list(valores), dtype=object), None
+
+
+def _salida(valores, indice):
+    """valores: arreglo numpy de tipo object."""
+    import pandas as pd
+
+    if indice is None:
+        return valores.tolist()
+    return pd.Series(valores, index=indice, dtype=object)
+
+
+def _por_textos(valores, vectorizada, escalar):
+    """
+    Aplica `vectorizada` (Series de textos distintos -> lista de resultados)
+    a los textos no vacíos de `valores` y `escalar` al resto. Los textos se
+    factorizan antes: cada valor distinto se normaliza una sola vez.
+    Solo se factorizan textos: Decimal("5.0") == Decimal("5.00").
+    """
+    import numpy as np
+    import pandas as pd
+
+    serie, indice = _como_serie(valores)
+    # Los resultados se arman en arreglos numpy de tipo object: al asignar
+    # en una Series, pandas convierte None en NaN
+    out = np.empty(len(serie), dtype=object)
+    textos = (serie.map(type).eq(str) & serie.ne("")).to_numpy()
+    if textos.any():
+        codigos, unicos = pd.factorize(serie[textos])
+        resultados = np.empty(len(unicos), dtype=object)
+        resultados[:] = vectorizada(pd.Series(unicos, dtype=object))
+        out[textos] = resultados[codigos]
+    otros = ~textos
+    out[otros] = [escalar(v) for v in serie[otros]]
+    return _salida(out, indice)
+
+
+def _nits_vectorizado(textos):
+    limpios = textos.str.replace(NO_DIGITO.pattern, "", regex=True)
+    return [t or None for t in limpios]
+
+
+def _montos_vectorizado(textos):
+    s = textos.str.strip().str.replace(" ", "", regex=False)
+    simple = s.str.match(MONTO_DECIMAL_SIMPLE.pattern)
+    limpio = s.str.replace(",", ".", regex=False).where(
+        simple, s.str.replace(SEPARADOR_MILES.pattern, "", regex=True)
+    )
+    # No hay Decimal vectorizado: solo la construcción final va por elemento
+    return [_decimal_o_none(t) for t in limpio]
+
+
+def _fechas_vectorizado(textos):
+    import numpy as np
+    import pandas as pd
+
+    out = np.empty(len(textos), dtype=object)
+    pendientes = textos.str.strip()
+    for fmt, _ in FECHAS:
+        if pendientes.empty:
+            break
+        fechas = pd.to_datetime(pendientes, format=fmt, errors="coerce")
+        # Años < 1000 van a la escalar: pandas acepta el año 0 y el relleno
+        # del año en strftime no es el mismo
+        ok = fechas.notna() & fechas.dt.year.ge(1000)
+        out[pendientes.index[ok]] = fechas[ok].dt.strftime("%Y-%m-%d").to_numpy(dtype=object)
+        pendientes = pendientes[~ok]
+    # Lo que pandas no resolvió pasa por la escalar
+    out[pendientes.index] = [normalizar_fecha(v) for v in pendientes]
+    return out
+
+
+def normalizar_nits(valores):
+    """normalizar_nit sobre una lista o Series; devuelve el mismo tipo."""
+    return _por_textos(valores, _nits_vectorizado, normalizar_nit)
+
+
+def normalizar_montos(valores):
+    """normalizar_monto sobre una lista o Series; devuelve el mismo tipo."""
+    return _por_textos(valores, _montos_vectorizado, normalizar_monto)
+
+
+def normalizar_fechas(valores):
+    """normalizar_fecha sobre una lista o Series; devuelve el mismo tipo."""
+    return _por_textos(valores, _fechas_vectorizado, normalizar_fecha)
+
+
+def normalizar_montos_centavos(valores):
+    """
+    normalizar_monto_centavos sobre una lista o Series, como arreglos numpy
+    (centavos int64, estado int8): estado 1 = monto, 0 = sin monto,
+    -1 = NO_REPRESENTABLE. Donde el estado no es 1, centavos vale 0.
+    """
+    import numpy as np
+
+    resultados = _por_textos(
+        valores,
+        lambda textos: [_centavos_desde_texto(t) for t in textos],
+        normalizar_monto_centavos,
+    )
+    resultados = list(resultados)
+    centavos = np.zeros(len(resultados), dtype=np.int64)
+    estado = np.zeros(len(resultados), dtype=np.int8)
+    for i, c in enumerate(resultados):
+        if c is NO_REPRESENTABLE:
+            estado[i] = -1
+        elif c is not None:
+            centavos[i], estado[i] = c, 1
+    return centavos, estado
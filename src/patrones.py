@@ -0,0 +1,177 @@
+"""
+Registro central de expresiones regulares precompiladas.
+
+Todas las regex de extracción y normalización se compilan una sola vez
+aquí, al importar el módulo, en lugar de pasar por la caché interna de
+`re` en cada llamada.
+
+Para el PDF, los seis campos del encabezado (CUFE, NIT, fechas, subtotal,
+IVA, total) se buscan con UNA alternación (PDF_ENCABEZADO) y un solo
+finditer sobre el texto. Cada rama consume solo su primer literal (el resto
+va en un lookahead), así ninguna rama le "tapa" a otra una coincidencia y
+el resultado es el mismo que con las regex separadas de antes. Las fechas
+sí se consumen completas: ninguna otra rama empieza por dígito y findall
+tampoco se solapaba. Como las ramas arrancan con caracteres distintos, el
+motor descarta rápido las posiciones que no pueden coincidir.
+
+Contadores de aciertos: los extractores llaman a acierto("pdf.cufe") cada
+vez que una regla aporta un valor. Los conteos son por proceso;
+procesar_pareja los retira con tomar_aciertos() y viajan en
+res["_patrones"] como los tiempos (ver AgenteSupervisor.registrar_metricas).
+"""
+
+from __future__ import annotations
+
+import re
+from collections import Counter
+
+# Versión de las reglas de extracción (este módulo y extractor_pdf/xml).
+# Súbela al cambiar lo que se extrae: invalida la caché de parejas.
+VERSION_EXTRACCION = 1
+
+# nombre -> regex compilada (solo informativo: qué reglas existen)
+PATRONES: dict[str, re.Pattern] = {}
+
+_aciertos: Counter = Counter()
+
+
+def compilar(nombre: str, patron: str, flags: int = 0) -> re.Pattern:
+    regex = re.compile(patron, flags)
+    PATRONES[nombre] = regex
+    return regex
+
+
+def acierto(nombre: str, n: int = 1):
+    _aciertos[nombre] += n
+
+
+def tomar_aciertos() -> dict:
+    """Devuelve los aciertos acumulados desde la última llamada y los reinicia."""
+    conteo = dict(_aciertos)
+    _aciertos.clear()
+    return conteo
+
+
+# ==== Comunes ====
+NO_DIGITO = compilar("no_digito", r"\D")
+NO_MONTO = compilar("no_monto", r"[^\d\.,]")
+
+# ==== PDF (extractor_pdf.parse_pdf_invoice) ====
+# Equivale a (misma semántica que las regex separadas):
+#   cufe      CUFE[:\s]+([0-9a-fA-F]{40,})                 primera
+#   nit       \bNIT?\s+(\d+)                  (re.I)      todas
+#   fecha     \b(\d{2})/(\d{2})/(\d{4})\b                  todas
+#   subtotal  SUBTOTAL\s+([\d\.\,]+)          (re.I)      primera
+#   iva       \bIVA\b[^\d]*([\d\.\,]+)                     última
+#   total     TOTAL DE LA OPERACI[ÓO]N\s+([\d\.\,]+) (re.I) primera
+# El \b inicial va como lookbehind DESPUÉS del primer carácter
+# ((?<!\w.) = "antes de este carácter no hay letra/dígito") para no perder
+# el prefijo literal de la rama. [Ssſ]: bajo re.I, "s" también coincide
+# con la s larga.
+PDF_ENCABEZADO = compilar(
+    "pdf.encabezado",
+    r"CUFE(?=[:\s]+(?P<cufe>[0-9a-fA-F]{40,}))"
+    r"|[Nn](?<!\w.)(?=(?i:IT?)\s+(?P<nit>\d+))"
+    r"|(?P<fecha>\d(?<!\w.)\d/\d\d/\d{4})\b"
+    r"|[Ssſ](?i:UBTOTAL)(?=\s+(?P<subtotal>[\d\.\,]+))"
+    r"|I(?<!\w.)(?=VA\b[^\d]*(?P<iva>[\d\.\,]+))"
+    r"|[Tt](?=(?i:OTAL DE LA OPERACI[ÓO]N)\s+(?P<total>[\d\.\,]+))",
+)
+
+# ==== XML (extractor_xml.parse_xml_invoice) ====
+# Búsquedas por campo: varias cruzan etiquetas con .*? (DOTALL), así que
+# una alternación única no daría los mismos resultados.
+XML_CUFE_UUID = compilar(
+    "xml.cufe_uuid",
+    r"<cbc:UUID[^>]*schemeName=\"CUFE-SHA384\"[^>]*>([0-9a-fA-F]+)</cbc:UUID>",
+    re.IGNORECASE | re.DOTALL,
+)
+XML_QR = compilar(
+    "xml.qr",
+    r"<\s*sts:QRCode\b[^>]*>(.*?)</\s*sts:QRCode\s*>",
+    re.IGNORECASE | re.DOTALL,
+)
+XML_QR_DOCUMENTKEY = compilar(
+    "xml.cufe_qr",
+    r"documentkey=([0-9a-fA-F]+)",
+    re.IGNORECASE,
+)
+XML_NUMERO = compilar(
+    "xml.numero",
+    r"<cbc:ID>(\s*\d+\s*)</cbc:ID>",
+    re.IGNORECASE,
+)
+XML_PARENT_ID = compilar(
+    "xml.parent_document_id",
+    r"<cbc:ParentDocumentID>(.*?)</cbc:ParentDocumentID>",
+    re.IGNORECASE | re.DOTALL,
+)
+XML_NIT_EMISOR = compilar(
+    "xml.nit_emisor",
+    r"<cac:AccountingSupplierParty>.*?<cbc:CompanyID[^>]*>(\d+)</cbc:CompanyID>",
+    re.IGNORECASE | re.DOTALL,
+)
+XML_FECHA = compilar(
+    "xml.fecha_emision",
+    r"<cbc:IssueDate>(\d{4}-\d{2}-\d{2})</cbc:IssueDate>",
+    re.IGNORECASE,
+)
+XML_SUBTOTAL = compilar(
+    "xml.subtotal",
+    r"<cbc:TaxExclusiveAmount\s+currencyID=\"COP\"\s*>([^<]+)</cbc:TaxExclusiveAmount>",
+    re.IGNORECASE,
+)
+XML_IMPUESTOS = compilar(
+    "xml.impuestos",
+    r"<cac:TaxTotal>.*?<cbc:TaxAmount\s+currencyID=\"COP\"\s*>([^<]+)</cbc:TaxAmount>",
+    re.IGNORECASE | re.DOTALL,
+)
+XML_TOTAL = compilar(
+    "xml.total",
+    r"<cbc:PayableAmount\s+currencyID=\"COP\"\s*>([^<]+)</cbc:PayableAmount>",
+    re.IGNORECASE,
+)
+
+# Las mismas regex sobre bytes, para leer el XML sin decodificarlo entero
+# (extractor_xml, modo "bytes"). Todas son ASCII: sobre bytes, \d, \s y
+# IGNORECASE son solo ASCII, que es lo que traen las etiquetas y valores DIAN.
+XML_BYTES: dict[re.Pattern, re.Pattern] = {}
+for _regex in (
+    XML_CUFE_UUID, XML_QR, XML_NUMERO, XML_PARENT_ID, XML_NIT_EMISOR,
+    XML_FECHA, XML_SUBTOTAL, XML_IMPUESTOS, XML_TOTAL,
+):
+    XML_BYTES[_regex] = re.compile(_regex.pattern.encode("ascii"), _regex.flags & ~re.UNICODE)
+
+# ==== PDF por coordenadas (extractor_coordenadas.py) ====
+# Forma de la palabra completa que puede ser el valor de cada campo (se
+# prueban con fullmatch; la puntuación final ya viene quitada). Al CUFE
+# algunos diseños le pegan "--Expedición:..." sin espacio.
+PALABRA_CUFE = compilar("pdf.coord.cufe", r"(?P<cufe>[0-9a-fA-F]{40,})(?:[^0-9a-zA-Z].*)?")
+PALABRA_NIT = compilar("pdf.coord.nit", r"(?P<nit>\d[\d.]*)(?:-\d)?")
+PALABRA_FECHA = compilar("pdf.coord.fecha", r"\d{2}/\d{2}/\d{4}")
+PALABRA_MONTO = compilar("pdf.coord.monto", r"\$?(?P<monto>\d[\d.,]*)")
+
+# Calidad del texto del PDF (extractor_pdf.estadisticas_texto): glifos sin
+# Unicode que pdfminer deja como "(cid:N)" y caracteres fuera de lo que trae
+# una factura (letras, dígitos y puntuación común).
+PDF_CID = compilar("pdf.cid", r"\(cid:\d+\)")
+PDF_RARO = compilar("pdf.raro", r"[^\w.,:;/\-$%()#@&*+='\"°]")
+
+# ==== Normalización ====
+MONTO_DECIMAL_SIMPLE = compilar("monto_decimal_simple", r"^\d+([.,]\d{1,2})?$")
+SEPARADOR_MILES = compilar("separador_miles", r"[.,]")
+
+# Formatos de normalizar_fecha, con las mismas piezas que usa
+# datetime.strptime para %Y, %m y %d (módulo _strptime): así se decide el
+# formato sin lanzar excepciones y se aceptan exactamente las mismas fechas.
+_DIA = r"(?P<d>3[0-1]|[1-2]\d|0[1-9]|[1-9]| [1-9])"
+_MES = r"(?P<m>1[0-2]|0[1-9]|[1-9])"
+_ANIO = r"(?P<Y>\d\d\d\d)"
+FECHAS = (
+    ("%Y-%m-%d", compilar("fecha_iso", rf"{_ANIO}-{_MES}-{_DIA}", re.IGNORECASE)),
+    ("%d/%m/%Y", compilar("fecha_dmy_barra", rf"{_DIA}/{_MES}/{_ANIO}", re.IGNORECASE)),
+    ("%d-%m-%Y", compilar("fecha_dmy_guion", rf"{_DIA}-{_MES}-{_ANIO}", re.IGNORECASE)),
+)
+
+# ==== IA (texto enviado al modelo) ====
+SALTOS_MULTIPLES = compilar("saltos_multiples", r"\n{3,}")
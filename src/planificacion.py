@@ -0,0 +1,87 @@
+"""
+Planificación por costo estimado (mayor primero) de ZIPs y parejas.
+
+En una corrida paralela, el orden alfabético deja a veces los ZIP más
+pesados solos al final: los demás workers quedan ociosos esperándolos.
+Despachar primero lo más costoso (LPT, "longest processing time") acorta
+esa cola final. El reparto entre workers ya es dinámico: el pool toma la
+siguiente tarea apenas un worker queda libre, así que ninguno se queda con
+trabajo asignado de antemano mientras otro espera.
+
+El costo de una pareja se estima sin parsear nada: tamaño del PDF, número
+de páginas (conteo de objetos /Page en los bytes) y tamaño del XML. Los
+pesos salen de medir parse_pdf_invoice + parse_xml_invoice sobre el corpus
+sintético (benchmarks/generar_corpus.py); solo importa el orden relativo.
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+
+PLANIFICACIONES = ("costo", "nombre")
+
+# Segundos aproximados por unidad (ajuste lineal sobre el corpus sintético)
+SEG_FIJO = 0.05
+SEG_POR_KB_PDF = 0.035
+SEG_POR_PAGINA = 0.01
+SEG_POR_KB_XML = 0.0005
+
+# Objetos de página (no el nodo /Pages del árbol)
+_RE_PAGINA = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+
+
+def contar_paginas(pdf_path: Path) -> int:
+    """Páginas del PDF por conteo de bytes; 1 si no se encuentra ninguna
+    (p. ej. objetos de página dentro de un object stream comprimido)."""
+    try:
+        datos = Path(pdf_path).read_bytes()
+    except OSError:
+        return 1
+    return max(1, len(_RE_PAGINA.findall(datos)))
+
+
+def estimar_costo(pdf_path: Path, xml_path: Path) -> float:
+    """Segundos estimados para procesar una pareja PDF/XML."""
+    try:
+        kb_pdf = Path(pdf_path).stat().st_size / 1024
+        kb_xml = Path(xml_path).stat().st_size / 1024
+    except OSError:
+        return SEG_FIJO
+    return (
+        SEG_FIJO
+        + SEG_POR_KB_PDF * kb_pdf
+        + SEG_POR_PAGINA * contar_paginas(pdf_path)
+        + SEG_POR_KB_XML * kb_xml
+    )
+
+
+def ordenar_zips(zips: list[Path], planificacion: str = "costo") -> list[tuple[int, Path]]:
+    """
+    Devuelve (zip_idx, zip_path) en el orden de despacho. zip_idx es SIEMPRE
+    la posición en la lista original (alfabética), para que los resultados y
+    el resumen salgan en el mismo orden sin importar la planificación.
+
+    Antes de extraer, el único dato disponible es el tamaño del ZIP.
+    """
+    indexados = list(enumerate(zips))
+    if planificacion == "nombre":
+        return indexados
+
+    def _tamano(item):
+        try:
+            return item[1].stat().st_size
+        except OSError:
+            return 0
+
+    # sorted es estable: a igual tamaño se conserva el orden alfabético
+    return sorted(indexados, key=_tamano, reverse=True)
+
+
+def ordenar_parejas(parejas: list[tuple[Path, Path]], planificacion: str = "costo") -> list[tuple[int, Path, Path]]:
+    """(orden, pdf_path, xml_path) con la pareja más costosa primero;
+    `orden` es la posición original dentro del ZIP."""
+    indexadas = [(orden, pdf, xml) for orden, (pdf, xml) in enumerate(parejas)]
+    if planificacion == "nombre" or len(indexadas) < 2:
+        return indexadas
+    return sorted(indexadas, key=lambda t: estimar_costo(t[1], t[2]), reverse=True)
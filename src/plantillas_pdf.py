@@ -0,0 +1,395 @@
+"""
+Plantillas por proveedor para leer el PDF por posición.
+
+La mayor parte del volumen viene de unos cientos de NIT, cada uno con un
+diseño de PDF fijo. Con CONFIG["plantillas_pdf"] encendida:
+
+- Huella del diseño: número y tamaño de páginas y las primeras letras de
+  la página 1 con su posición redondeada (el encabezado del proveedor).
+  Sale de los caracteres que pdfplumber ya tiene, sin armar el texto.
+- Aprender: si una factura sin plantilla concilia sin revisión y cada
+  campo que encontró el camino general (PDF_ENCABEZADO sobre el texto)
+  coincide con el XML (fuente_elegida "iguales"), esos campos se ubican en
+  la página. Todo campo con valor en el XML tiene que quedar ubicado: uno
+  que faltara en la plantilla se leería siempre vacío, y un PDF vacío no
+  pide revisión. El TextMap de pdfplumber alinea cada carácter del texto
+  con su caja, así que el tramo de la regex da la caja del valor y la de
+  su etiqueta ("SUBTOTAL", "NIT"...). La plantilla se guarda por (huella,
+  NIT del XML): el mismo diseño puede servir a varios proveedores.
+- Extraer: con plantilla solo se lee la línea de cada caja (la palabra que
+  más se solapa con ella), y solo en las páginas que tienen campos. Si el
+  campo tiene etiqueta, la caja se corre en vertical lo mismo que la
+  etiqueta (la tabla de ítems cambia de alto). El NIT se lee primero y
+  elige la plantilla; cada valor se valida con la forma del campo.
+- Cualquier diferencia vuelve al camino general: plantilla que no valida,
+  o campos leídos por plantilla que no concilian y que el camino general
+  lee distinto (ahí además la plantilla se descarta).
+
+pdfminer se lleva la mayor parte del tiempo al leer los caracteres de la
+página y eso lo pagan los dos caminos; la plantilla se ahorra armar el
+texto completo, las regex sobre todo el documento y las páginas sin
+campos.
+
+Cada plantilla es un JSON en dir/<huella>-<nit>.json (por defecto
+data/logs/plantillas_pdf), escrito con os.replace para que varios workers
+compartan la carpeta.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from itertools import islice
+from pathlib import Path
+from typing import NamedTuple
+
+from .extractor_pdf import (
+    _normalizar_monto_colombiano,
+    abrir_pdf,
+    campos_pdf_desde_texto,
+    estadisticas_texto,
+    parse_pdf_invoice,
+    resultado_vacio,
+)
+from .patrones import acierto
+
+VERSION_PLANTILLA = 2
+LETRAS_HUELLA = 32  # letras del encabezado que entran en la huella
+MARGEN = 2.0        # puntos de tolerancia alrededor de cada caja
+MISMA_LINEA = 2.0   # diferencia de "top" para considerar dos cajas en la misma línea
+TOLERANCIA_X = 3.0  # separación que corta una palabra (x_tolerance de pdfplumber)
+
+# Forma del valor al comienzo de la palabra leída; como los grupos de
+# PDF_ENCABEZADO, lo que siga pegado al valor no cuenta
+_MONTO = re.compile(r"[\d\.,]*\d[\d\.,]*")
+FORMAS = {
+    "cufe": re.compile(r"[0-9a-fA-F]{40,}"),
+    "nit_emisor": re.compile(r"\d+"),
+    "fecha_emision": re.compile(r"\d{2}/\d{2}/\d{4}\b"),
+    "subtotal": _MONTO,
+    "impuestos": _MONTO,
+    "total": _MONTO,
+}
+
+
+def _valor(campo: str, crudo: str) -> str:
+    """Valor del campo a partir del texto de su caja, como el camino general."""
+    if campo == "fecha_emision":
+        return f"{crudo[6:10]}-{crudo[3:5]}-{crudo[0:2]}"
+    if campo in ("subtotal", "impuestos", "total"):
+        return _normalizar_monto_colombiano(crudo)
+    return crudo
+
+
+def huella_diseno(pdf) -> str:
+    """Huella del diseño del PDF (ver docstring del módulo)."""
+    pagina = pdf.pages[0]
+    letras = islice(
+        ((c["text"], round(c["x0"]), round(c["top"])) for c in pagina.chars if c["text"].isalpha()),
+        LETRAS_HUELLA,
+    )
+    datos = [len(pdf.pages), round(pagina.width), round(pagina.height), list(letras)]
+    return hashlib.blake2b(json.dumps(datos).encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _caja(chars: list) -> list[float]:
+    return [
+        min(c["x0"] for c in chars),
+        min(c["top"] for c in chars),
+        max(c["x1"] for c in chars),
+        max(c["bottom"] for c in chars),
+    ]
+
+
+def _ubicar(mapas: list, posiciones: dict) -> dict:
+    """
+    {campo: {"pagina", "caja", "etiqueta"}} a partir de los tramos que anotó
+    campos_pdf_desde_texto sobre el texto unido de las páginas (mapas: un
+    TextMap por página).
+    """
+    campos = {}
+    inicio_pagina = 0
+    for i, mapa in enumerate(mapas):
+        fin_pagina = inicio_pagina + len(mapa.as_string)
+        if len(mapa.tuples) != len(mapa.as_string):
+            inicio_pagina = fin_pagina + 1
+            continue  # texto y caracteres no alineados: esta página no se aprende
+        for campo, (inicio, ini_valor, fin_valor) in posiciones.items():
+            if not (inicio_pagina <= inicio and fin_valor <= fin_pagina):
+                continue
+            tramo = mapa.tuples[ini_valor - inicio_pagina:fin_valor - inicio_pagina]
+            chars_valor = [obj for _, obj in tramo if obj is not None]
+            if not chars_valor:
+                continue
+            tramo = mapa.tuples[inicio - inicio_pagina:ini_valor - inicio_pagina]
+            chars_etiqueta = [obj for texto, obj in tramo if obj is not None and not texto.isspace()]
+            etiqueta = None
+            if chars_etiqueta:
+                etiqueta = {
+                    "texto": "".join(c["text"] for c in chars_etiqueta),
+                    "x0": chars_etiqueta[0]["x0"],
+                    "x1": chars_etiqueta[-1]["x1"],
+                    "top": chars_etiqueta[0]["top"],
+                }
+            campos[campo] = {"pagina": i, "caja": _caja(chars_valor), "etiqueta": etiqueta}
+        inicio_pagina = fin_pagina + 1  # el "\n" que une las páginas
+    return campos
+
+
+def _ubicar_etiqueta(chars: list, etiqueta: dict) -> float | None:
+    """Top actual de la etiqueta (la aparición más cercana a la aprendida), o None."""
+    texto = etiqueta["texto"]
+    mejor = None
+    for c in chars:
+        if c["text"] != texto[0] or abs(c["x0"] - etiqueta["x0"]) > MARGEN:
+            continue
+        linea = sorted(
+            (o for o in chars
+             if abs(o["top"] - c["top"]) <= MISMA_LINEA and o["x0"] >= c["x0"] - 0.01
+             and o["x1"] <= etiqueta["x1"] + MARGEN and not o["text"].isspace()),
+            key=lambda o: o["x0"],
+        )
+        if "".join(o["text"] for o in linea) != texto:
+            continue
+        if mejor is None or abs(c["top"] - etiqueta["top"]) < abs(mejor - etiqueta["top"]):
+            mejor = c["top"]
+    return mejor
+
+
+def _leer_campo(chars: list, pos: dict) -> str | None:
+    """
+    Palabra de la línea del campo (corrida según su etiqueta) que más se
+    solapa con la caja aprendida. Así un valor con más o menos dígitos se
+    lee completo y no se mezcla con lo que tenga al lado.
+    """
+    x0, top, x1, _ = pos["caja"]
+    etiqueta = pos["etiqueta"]
+    if etiqueta is not None:
+        top_etiqueta = _ubicar_etiqueta(chars, etiqueta)
+        if top_etiqueta is None:
+            return None
+        top += top_etiqueta - etiqueta["top"]
+    linea = sorted((c for c in chars if abs(c["top"] - top) <= MISMA_LINEA), key=lambda c: c["x0"])
+    # Palabras como las arma pdfplumber: se corta en los espacios y donde hay
+    # más de TOLERANCIA_X puntos entre un carácter y el siguiente
+    palabras, actual = [], []
+    for c in linea:
+        if c["text"].isspace() or (actual and c["x0"] - actual[-1]["x1"] > TOLERANCIA_X):
+            if actual:
+                palabras.append(actual)
+            actual = []
+            if c["text"].isspace():
+                continue
+        actual.append(c)
+    if actual:
+        palabras.append(actual)
+
+    mejor, solape_mejor = None, 0.0
+    for palabra in palabras:
+        solape = min(x1, palabra[-1]["x1"]) - max(x0, palabra[0]["x0"])
+        if solape > solape_mejor:
+            mejor, solape_mejor = palabra, solape
+    if mejor is None:
+        return None
+    return "".join(c["text"] for c in mejor)
+
+
+def _leer(pdf, campo: str, pos: dict, chars_por_pagina: dict) -> str | None:
+    """Valor de un campo leído por posición, o None."""
+    i = pos["pagina"]
+    if i >= len(pdf.pages):
+        return None
+    if i not in chars_por_pagina:
+        chars_por_pagina[i] = pdf.pages[i].chars
+    palabra = _leer_campo(chars_por_pagina[i], pos)
+    m = FORMAS[campo].match(palabra) if palabra is not None else None
+    return _valor(campo, m.group(0)) if m else None
+
+
+def leer_con_plantilla(pdf, plantilla: dict, chars_por_pagina: dict | None = None) -> dict | None:
+    """Campos del PDF leídos por posición, o None si algo no cuadra."""
+    chars_por_pagina = {} if chars_por_pagina is None else chars_por_pagina
+    resultado = resultado_vacio()
+    for campo, pos in plantilla["campos"].items():
+        valor = _leer(pdf, campo, pos, chars_por_pagina)
+        if valor is None:
+            return None
+        resultado[campo] = valor
+    if resultado["nit_emisor"] != plantilla["nit"]:
+        return None
+    return resultado
+
+
+class UsoPlantilla(NamedTuple):
+    huella: str
+    plantilla: dict | None  # la usada, o None si se fue por el camino general
+    mapas: list             # TextMap por página (camino general), para aprender
+    posiciones: dict        # tramos de cada campo en el texto (camino general)
+
+
+class PlantillasNulas:
+    """Sin plantillas: siempre el camino general."""
+
+    activa = False
+
+    def __init__(self, motor: str = "regex"):
+        self.motor = motor
+
+    def extraer(self, pdf_path: Path, contenido: bytes | None = None,
+                estadisticas: dict | None = None) -> tuple[dict, None]:
+        return parse_pdf_invoice(
+            pdf_path, contenido=contenido, motor=self.motor, estadisticas=estadisticas
+        ), None
+
+    def tras_conciliar(self, uso, fac_pdf, conciliacion, requiere_revision_global,
+                       pdf_path, contenido=None) -> dict | None:
+        return None
+
+
+class PlantillasPDF(PlantillasNulas):
+    activa = True
+
+    def __init__(self, directorio: Path):
+        super().__init__("regex")
+        self.directorio = Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._por_huella: dict[str, dict[str, dict]] = {}  # huella -> {nit: plantilla}
+
+    # ==== Almacén ====
+    def _ruta(self, huella: str, nit: str) -> Path:
+        return self.directorio / f"{huella}-{nit}.json"
+
+    def _de_huella(self, huella: str) -> dict[str, dict]:
+        """Plantillas del diseño por NIT (se leen del disco la primera vez)."""
+        if huella not in self._por_huella:
+            plantillas = {}
+            for ruta in self.directorio.glob(f"{huella}-*.json"):
+                try:
+                    plantilla = json.loads(ruta.read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    continue
+                if plantilla.get("version") == VERSION_PLANTILLA:
+                    plantillas[plantilla["nit"]] = plantilla
+            self._por_huella[huella] = plantillas
+        return self._por_huella[huella]
+
+    def _guardar(self, huella: str, plantilla: dict):
+        self._de_huella(huella)[plantilla["nit"]] = plantilla
+        ruta = self._ruta(huella, plantilla["nit"])
+        temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+        try:
+            temporal.write_text(json.dumps(plantilla, ensure_ascii=False), encoding="utf-8")
+            os.replace(temporal, ruta)
+        except OSError as e:
+            print(f"[AGENTE] ⚠ No se pudo guardar la plantilla {ruta.name}: {e}")
+
+    def _descartar(self, huella: str, nit: str):
+        self._de_huella(huella).pop(nit, None)
+        self._ruta(huella, nit).unlink(missing_ok=True)
+
+    # ==== Extracción ====
+    def extraer(self, pdf_path: Path, contenido: bytes | None = None,
+                estadisticas: dict | None = None) -> tuple[dict, UsoPlantilla]:
+        """
+        (campos del PDF, UsoPlantilla). Con plantilla para el diseño la
+        lectura es por posición; si no hay o no cuadra, camino general
+        anotando dónde quedó cada valor (para aprender tras conciliar).
+        estadisticas: ver parse_pdf_invoice (solo en el camino general).
+        """
+        with abrir_pdf(Path(pdf_path), contenido) as pdf:
+            huella = huella_diseno(pdf)
+            plantillas = self._de_huella(huella)
+            if plantillas:
+                # El NIT se lee donde lo tiene el diseño y elige la plantilla
+                chars_por_pagina = {}
+                muestra = next(iter(plantillas.values()))
+                nit = _leer(pdf, "nit_emisor", muestra["campos"]["nit_emisor"], chars_por_pagina)
+                plantilla = plantillas.get(nit)
+                if plantilla is not None:
+                    resultado = leer_con_plantilla(pdf, plantilla, chars_por_pagina)
+                    if resultado is not None:
+                        acierto("pdf.plantilla")
+                        return resultado, UsoPlantilla(huella, plantilla, [], {})
+                    acierto("pdf.plantilla_no_cuadra")
+
+            # Mismo texto que parse_pdf_invoice (extract_text es el as_string
+            # de este TextMap, que pdfplumber guarda por página)
+            mapas = [page.get_textmap() for page in pdf.pages]
+        posiciones = {}
+        texto = "\n".join(m.as_string for m in mapas)
+        estadisticas_texto(texto, estadisticas)
+        resultado = campos_pdf_desde_texto(texto, None, posiciones)
+        return resultado, UsoPlantilla(huella, None, mapas, posiciones)
+
+    def tras_conciliar(self, uso, fac_pdf, conciliacion, requiere_revision_global,
+                       pdf_path, contenido=None) -> dict | None:
+        """
+        Aprende la plantilla si la factura concilió sin revisión, todo lo
+        que leyó el camino general (NIT incluido) coincide con el XML y se
+        ubicaron todos los campos que trae el XML. Si se leyó por plantilla
+        y algún campo de la plantilla quedó en revisión, relee por el
+        camino general: si da otra cosa, descarta la plantilla y devuelve
+        {campo: valor} a corregir en fac_pdf (None = nada que hacer).
+        """
+        if uso is None:
+            return None
+
+        if uso.plantilla is None:
+            # Un campo que no coincide con el XML (aunque no pida revisión)
+            # puede venir de otra parte de la página
+            conciliacion = conciliacion or {}
+            iguales = all(
+                (conciliacion.get(campo) or {}).get("fuente_elegida") == "iguales"
+                for campo in uso.posiciones
+            )
+            if not requiere_revision_global and iguales and "nit_emisor" in uso.posiciones:
+                campos = _ubicar(uso.mapas, uso.posiciones)
+                # Un campo del XML fuera de la plantilla se leería vacío
+                # siempre y ocultaría diferencias reales (p. ej. sin línea
+                # de IVA en esta factura)
+                en_xml = {
+                    campo for campo in FORMAS
+                    if (conciliacion.get(campo) or {}).get("valor_xml_normalizado") is not None
+                }
+                if "nit_emisor" in campos and en_xml <= campos.keys():
+                    self._guardar(uso.huella, {
+                        "version": VERSION_PLANTILLA,
+                        "nit": conciliacion["nit_emisor"]["valor_xml_normalizado"],
+                        "campos": campos,
+                    })
+            return None
+
+        # Solo los campos que lee el extractor (FORMAS); el resto no depende
+        # de la plantilla
+        en_revision = [
+            c for c in FORMAS
+            if ((conciliacion or {}).get(c) or {}).get("requiere_revision")
+        ]
+        if not en_revision:
+            return None
+        general = parse_pdf_invoice(pdf_path, contenido=contenido)
+        distintos = {
+            c: general[c] for c in FORMAS
+            if general[c] != fac_pdf.get(c) and (c in uso.plantilla["campos"] or general[c] is not None)
+        }
+        if not distintos:
+            return None  # la diferencia con el XML es real, no de la plantilla
+        self._descartar(uso.huella, uso.plantilla["nit"])
+        acierto("pdf.plantilla_descartada")
+        return distintos
+
+
+def abrir_plantillas(config: dict):
+    """Plantillas según CONFIG["plantillas_pdf"] (PlantillasNulas si está apagado)."""
+    cfg = config.get("plantillas_pdf", {})
+    motor = config.get("extraccion", {}).get("pdf_motor", "regex")
+    if not cfg.get("enabled", False):
+        return PlantillasNulas(motor)
+    if motor != "regex":
+        # Se aprende de los tramos del texto que marca PDF_ENCABEZADO
+        print(f"[AGENTE] ⚠ plantillas_pdf requiere el motor PDF 'regex' (hay '{motor}'); no se usan.")
+        return PlantillasNulas(motor)
+    directorio = cfg.get("dir") or Path(config["rutas"]["data_logs"]) / "plantillas_pdf"
+    return PlantillasPDF(Path(directorio))
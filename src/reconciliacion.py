@@ -0,0 +1,185 @@
+"""
+Reconciliación de los resultados ya guardados con la configuración actual.
+
+Cambiar comparacion.tolerancia_montos o prioridad_fuente en
+config_basica.json no obliga a volver a leer los PDF y XML: cada
+*_conciliacion.* de data/processed trae pdf_raw y xml_raw, que es todo lo
+que necesita conciliar_factura. Por cada carpeta de ZIP:
+
+  1. se leen sus resultados (en el orden de su resumen_zip.csv),
+  2. se concilian todos de una vez (conciliacion.conciliar_facturas),
+  3. solo se reescriben las facturas cuya conciliación, revisión o campos
+     a revisar cambiaron, cada una en su mismo formato, y el CSV del ZIP si
+     cambió alguna.
+
+extractor_xml entrega los montos del XML como Decimal y el formato "json"
+los guarda como texto; antes de conciliar se vuelven a Decimal
+(monto_guardado), como los dejó el extractor: pasarlos por las reglas de
+texto de normalizar_monto cambiaría, p. ej., "1234.567" o "-5.00".
+
+Las facturas con error no tienen extracciones y quedan como estaban. Con
+workers > 1 las carpetas se reparten entre procesos. El agente
+(AgenteSupervisor.reconciliar_guardados) actualiza el índice con las
+facturas reescritas y vuelve a armar el resumen global.
+"""
+
+from __future__ import annotations
+
+import csv
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+from itertools import repeat
+from pathlib import Path
+
+from .conciliacion import MONTOS, conciliar_facturas
+from .serializacion import (
+    EXTENSIONES,
+    formato_de_ruta,
+    guardar_resultado,
+    leer_resultado,
+)
+
+SUFIJO = "_conciliacion"
+
+
+def _id_de_ruta(ruta: Path) -> str:
+    return ruta.name[: ruta.name.rindex(SUFIJO)]
+
+
+def rutas_resultados(carpeta: Path) -> list[Path]:
+    """
+    Resultados de una carpeta de ZIP en el orden de su resumen_zip.csv (el
+    de las parejas al procesarla); los que no estén en el CSV, al final.
+    """
+    rutas = {}
+    for ext in EXTENSIONES.values():
+        for ruta in carpeta.glob(f"*{SUFIJO}{ext}"):
+            rutas[_id_de_ruta(ruta)] = ruta
+    orden = {}
+    try:
+        with open(carpeta / "resumen_zip.csv", encoding="utf-8-sig", newline="") as f:
+            for i, fila in enumerate(csv.DictReader(f)):
+                orden.setdefault(fila.get("id_factura"), i)
+    except OSError:
+        pass
+    return [rutas[id_] for id_ in sorted(rutas, key=lambda id_: (orden.get(id_, len(orden)), id_))]
+
+
+def carpetas_con_resultados(dir_processed: Path) -> list[Path]:
+    """Carpetas de ZIP de data/processed con al menos un resultado, por nombre."""
+    dir_processed = Path(dir_processed)
+    if not dir_processed.is_dir():
+        return []
+    return [
+        carpeta for carpeta in sorted(p for p in dir_processed.iterdir() if p.is_dir())
+        if any(carpeta.glob(f"*{SUFIJO}.*"))
+    ]
+
+
+def monto_guardado(valor):
+    """Monto Decimal tal como se guardó (Decimal o su texto) -> Decimal o None."""
+    if valor is None or isinstance(valor, Decimal):
+        return valor
+    try:
+        return Decimal(str(valor))
+    except InvalidOperation:
+        return None
+
+
+def _xml_guardado(xml_raw: dict | None) -> dict | None:
+    """xml_raw leído de un resultado, con sus montos otra vez como Decimal."""
+    if not xml_raw:
+        return xml_raw
+    xml_raw = dict(xml_raw)
+    for campo in MONTOS:
+        valor = xml_raw.get(campo)
+        if isinstance(valor, str):
+            xml_raw[campo] = monto_guardado(valor)
+    return xml_raw
+
+
+def _como_texto(detalle) -> dict | None:
+    # Decimal como queda escrito: texto en "json", con su escala en los compactos
+    if not isinstance(detalle, dict):
+        return None
+    return {k: str(v) if type(v) is Decimal else v for k, v in detalle.items()}
+
+
+def _misma_conciliacion(antes: dict, despues: dict) -> bool:
+    """¿Escribir `despues` dejaría la conciliación de `antes` igual?"""
+    if (
+        antes.get("requiere_revision_global") != despues["requiere_revision_global"]
+        or antes.get("campos_a_revisar") != despues["campos_a_revisar"]
+    ):
+        return False
+    previa = antes.get("conciliacion") or {}
+    if previa.keys() != despues["conciliacion"].keys():
+        return False
+    return all(
+        _como_texto(previa[campo]) == _como_texto(detalle)
+        for campo, detalle in despues["conciliacion"].items()
+    )
+
+
+def reconciliar_carpeta(carpeta: Path, config: dict) -> dict:
+    """
+    Reconcilia y reescribe lo que cambió en una carpeta de ZIP. Devuelve
+    {"zip", "registros" (uno por factura), "cambiados" [(res, registro)],
+    "conciliadas"}.
+    """
+    from .agente_supervisor import AgenteSupervisor  # diferido: el agente importa este módulo
+
+    carpeta = Path(carpeta)
+    rutas = rutas_resultados(carpeta)
+    resultados = [leer_resultado(ruta) for ruta in rutas]
+    validos = [
+        i for i, res in enumerate(resultados)
+        if not res.get("error") and res.get("conciliacion") is not None
+    ]
+    nuevas = conciliar_facturas(
+        [
+            (resultados[i].get("pdf_raw"), _xml_guardado(resultados[i].get("xml_raw")))
+            for i in validos
+        ],
+        config,
+    )
+
+    cambiados = []
+    for i, (conciliacion, requiere_revision_global) in zip(validos, nuevas):
+        res = resultados[i]
+        nuevo = {
+            **res,
+            "conciliacion": conciliacion,
+            "requiere_revision_global": requiere_revision_global,
+            "campos_a_revisar": [
+                campo for campo, det in conciliacion.items() if det.get("requiere_revision") is True
+            ],
+        }
+        if _misma_conciliacion(res, nuevo):
+            continue
+        guardar_resultado(rutas[i], nuevo, formato_de_ruta(rutas[i]))
+        resultados[i] = nuevo
+        cambiados.append(i)
+
+    if cambiados:
+        AgenteSupervisor._escribir_csv_zip(carpeta, resultados)
+
+    registros = [
+        AgenteSupervisor._registro(res, carpeta.name, ruta) for res, ruta in zip(resultados, rutas)
+    ]
+    return {
+        "zip": carpeta.name,
+        "registros": registros,
+        "cambiados": [(resultados[i], registros[i]) for i in cambiados],
+        "conciliadas": len(validos),
+    }
+
+
+def reconciliar_carpetas(carpetas: list, config: dict, workers: int = 1):
+    """reconciliar_carpeta sobre cada carpeta, en orden; con workers > 1, en procesos."""
+    if workers <= 1 or len(carpetas) <= 1:
+        for carpeta in carpetas:
+            yield reconciliar_carpeta(carpeta, config)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(carpetas))) as pool:
+        yield from pool.map(reconciliar_carpeta, carpetas, repeat(config))
@@ -0,0 +1,115 @@
+"""
+Serialización de los resultados por factura.
+
+Formatos (CONFIG["salida"]["formato"]):
+  - "json":           JSON con indent=4; Decimal como texto (histórico).
+  - "compacto":       JSON sin espacios; Decimal sin pérdida como entero
+                      escalado {"$d": [entero, escala]} (5316800.00 ->
+                      [531680000, 2]), así se conserva hasta la escala.
+  - "compacto-zstd":  lo mismo comprimido con zstandard.
+
+leer_resultado() detecta el formato por la extensión y devuelve el mismo
+dict que produjo procesar_pareja (con Decimal). forma_json() lo lleva a la
+forma que se obtiene al leer un .json histórico (Decimal como texto).
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from decimal import Decimal
+from pathlib import Path
+
+EXTENSIONES = {
+    "json": ".json",
+    "compacto": ".cjson",
+    "compacto-zstd": ".cjson.zst",
+}
+NIVEL_ZSTD = 3
+
+_hilos = threading.local()  # compresor/descompresor zstd por hilo (no son thread-safe)
+
+
+def _codificar_extra(obj):
+    if isinstance(obj, Decimal):
+        signo, digitos, exponente = obj.as_tuple()
+        entero = int("".join(map(str, digitos)))
+        if isinstance(exponente, int) and not (signo and entero == 0):
+            return {"$d": [-entero if signo else entero, -exponente]}
+        return {"$d": str(obj)}  # NaN, Infinity, -0
+    return str(obj)
+
+
+def _decodificar_objeto(d: dict):
+    if len(d) == 1 and "$d" in d:
+        valor = d["$d"]
+        if isinstance(valor, list):
+            entero, escala = valor
+            return Decimal(f"{entero}E{-escala}")
+        return Decimal(valor)
+    return d
+
+
+def a_json_compacto(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_codificar_extra)
+
+
+def desde_json_compacto(texto: str | bytes):
+    return json.loads(texto, object_hook=_decodificar_objeto)
+
+
+def _zstd():
+    if not hasattr(_hilos, "compresor"):
+        import zstandard  # diferido: solo para "compacto-zstd"
+
+        _hilos.compresor = zstandard.ZstdCompressor(level=NIVEL_ZSTD)
+        _hilos.descompresor = zstandard.ZstdDecompressor()
+    return _hilos.compresor, _hilos.descompresor
+
+
+def codificar_resultado(res: dict, formato: str) -> bytes:
+    if formato == "json":
+        return json.dumps(res, ensure_ascii=False, indent=4, default=str).encode("utf-8")
+    datos = a_json_compacto(res).encode("utf-8")
+    if formato == "compacto-zstd":
+        compresor, _ = _zstd()
+        datos = compresor.compress(datos)
+    return datos
+
+
+def decodificar_resultado(datos: bytes, formato: str) -> dict:
+    if formato == "json":
+        return json.loads(datos)
+    if formato == "compacto-zstd":
+        _, descompresor = _zstd()
+        datos = descompresor.decompress(datos)
+    return desde_json_compacto(datos)
+
+
+def formato_de_ruta(ruta: Path | str) -> str:
+    nombre = str(ruta)
+    # la extensión más larga primero (.cjson.zst antes que .json)
+    for formato, ext in sorted(EXTENSIONES.items(), key=lambda kv: -len(kv[1])):
+        if nombre.endswith(ext):
+            return formato
+    raise ValueError(f"Extensión de resultado desconocida: {nombre}")
+
+
+def guardar_resultado(ruta: Path | str, res: dict, formato: str):
+    if formato == "json":
+        # Modo texto, como siempre (fin de línea del sistema)
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(res, f, ensure_ascii=False, indent=4, default=str)
+        return
+    with open(ruta, "wb") as f:
+        f.write(codificar_resultado(res, formato))
+
+
+def leer_resultado(ruta: Path | str) -> dict:
+    with open(ruta, "rb") as f:
+        return decodificar_resultado(f.read(), formato_de_ruta(ruta))
+
+
+def forma_json(res: dict) -> dict:
+    """El dict tal como se leería del .json histórico (Decimal -> texto)."""
+    return json.loads(json.dumps(res, ensure_ascii=False, default=str))
@@ -0,0 +1,539 @@
+"""
+Servicio HTTP local (asyncio) alrededor de AgenteSupervisor.
+
+Para que otros sistemas concilien facturas sin dejar archivos en una
+carpeta ni leer data/processed a mano:
+
+    python -m src.cli_cafe servir --puerto 8765
+
+    POST /trabajos                         cuerpo = un ZIP (application/zip,
+                                           ?nombre=lote.zip opcional) o JSON
+                                           {"ruta": "/carpeta/o/archivo.zip"}
+                                           -> 202 {"id": ..., "estado": "en_cola"}
+    GET  /trabajos                         todos los trabajos y su estado
+    GET  /trabajos/{id}                    estado, avance y resumen al terminar
+    GET  /trabajos/{id}/resumen            resumen global (resumen_global_agente.json)
+    GET  /trabajos/{id}/facturas           un registro por factura
+    GET  /trabajos/{id}/facturas/{fact}    resultado completo (?zip=... si el
+                                           mismo ID aparece en varios ZIP)
+    GET  /salud
+
+El POST responde apenas el ZIP queda en disco: la conciliación corre en un
+pool de procesos (CONFIG["servicio"]["trabajos_paralelos"]), así el bucle
+de eventos solo hace E/S y la latencia de las peticiones no depende de
+cuántos trabajos haya en curso. Cada trabajo tiene su carpeta
+(dir_trabajos/{id}/ con entrada, raw, processed y logs) y su propio agente;
+el avance lo escribe el proceso en progreso.json. trabajo.json se escribe
+al crear el trabajo y en cada cambio de estado (con el resumen al
+terminar): tras un reinicio los terminados se siguen consultando y los que
+estaban en cola o en proceso se vuelven a encolar (el diario del agente
+evita rehacer los ZIP que ya había cerrado).
+
+HTTP/1.1 mínimo con la biblioteca estándar (sin dependencias nuevas):
+Content-Length obligatorio en el cuerpo, keep-alive, respuestas JSON.
+Pensado para escuchar en 127.0.0.1; no hay autenticación.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import signal
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from config import obtener_config
+
+# Estados de un trabajo
+EN_COLA, PROCESANDO, TERMINADO, FALLIDO = "en_cola", "procesando", "terminado", "error"
+
+_MAX_CABECERAS = 100
+_MAX_JSON = 1 << 20  # cuerpo JSON (POST con "ruta")
+_BLOQUE = 1 << 16
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado: HTTPStatus, mensaje: str):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+# ==== Lado del proceso worker ====
+def _escribir_json_atomico(ruta: Path, datos: dict):
+    tmp = ruta.with_suffix(".tmp")
+    tmp.write_text(json.dumps(datos, ensure_ascii=False, default=str), encoding="utf-8")
+    os.replace(tmp, ruta)
+
+
+def _bajar_prioridad():
+    """Los procesos del pool ceden CPU al bucle de eventos (latencia HTTP)."""
+    if hasattr(os, "nice"):
+        os.nice(5)
+
+
+def _ejecutar_trabajo(config: dict, carpeta_zips: Path, dir_trabajo: Path) -> dict:
+    """Corre el agente de un trabajo (en un proceso del pool)."""
+    from .agente_supervisor import AgenteSupervisor
+
+    archivo_progreso = dir_trabajo / "progreso.json"
+
+    def progreso(evento: dict):
+        # Solo inicio y cierre de ZIP: por factura sería una escritura por factura
+        if evento.get("tipo") in ("inicio", "zip"):
+            _escribir_json_atomico(archivo_progreso, evento)
+
+    dir_logs = config["rutas"]["data_logs"]
+    dir_logs.mkdir(parents=True, exist_ok=True)
+    with (dir_logs / "agente.log").open("w", encoding="utf-8") as log, \
+            contextlib.redirect_stdout(log):
+        agente = AgenteSupervisor(config=config, carpeta_zips=carpeta_zips)
+        resumen = agente.ciclo_principal(progreso=progreso)
+    return {
+        "resumen": resumen,
+        "registros": [list(r) for r in agente.registros],
+    }
+
+
+# ==== Trabajos ====
+class Trabajo:
+    def __init__(self, id_trabajo: str, carpeta: Path, entrada: Path, origen: str):
+        self.id = id_trabajo
+        self.carpeta = carpeta
+        self.entrada = entrada
+        self.origen = origen
+        self.estado = EN_COLA
+        self.creado = time.time()
+        self.inicio: float | None = None
+        self.fin: float | None = None
+        self.error: str | None = None
+        self.resumen: dict | None = None
+        self.registros: list[list] = []
+        self._por_id: dict[str, list[list]] | None = None
+
+    def avance(self) -> dict | None:
+        try:
+            return json.loads((self.carpeta / "progreso.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def estado_json(self, con_avance: bool = True) -> dict:
+        datos = {
+            "id": self.id,
+            "estado": self.estado,
+            "origen": self.origen,
+            "creado": self.creado,
+            "inicio": self.inicio,
+            "fin": self.fin,
+        }
+        if self.error:
+            datos["error"] = self.error
+        if self.estado == PROCESANDO and con_avance:
+            datos["avance"] = self.avance()
+        if self.resumen is not None:
+            datos["facturas_ok"] = self.resumen["facturas_ok"]
+            datos["facturas_con_revision"] = self.resumen["facturas_con_revision"]
+            datos["facturas_error"] = self.resumen["facturas_error"]
+        return datos
+
+    def registros_de(self, id_factura: str) -> list[list]:
+        if self._por_id is None:
+            self._por_id = {}
+            for r in self.registros:
+                self._por_id.setdefault(r[0], []).append(r)
+        return self._por_id.get(id_factura, [])
+
+    def guardar(self):
+        _escribir_json_atomico(self.carpeta / "trabajo.json", {
+            **self.estado_json(con_avance=False),
+            "entrada": str(self.entrada),
+            "resumen": self.resumen,
+            "registros": self.registros,
+        })
+
+    @classmethod
+    def cargar(cls, archivo: Path) -> "Trabajo":
+        datos = json.loads(archivo.read_text(encoding="utf-8"))
+        t = cls(datos["id"], archivo.parent, Path(datos["entrada"]), datos["origen"])
+        t.estado, t.error = datos["estado"], datos.get("error")
+        t.creado, t.inicio, t.fin = datos["creado"], datos["inicio"], datos["fin"]
+        t.resumen, t.registros = datos["resumen"], datos["registros"]
+        return t
+
+
+def _registro_json(r: list) -> dict:
+    id_factura, nombre_zip, estado, nit, campos, ruta = r
+    return {
+        "id_factura": id_factura,
+        "zip": nombre_zip,
+        "estado": estado,
+        "nit": nit,
+        "campos_a_revisar": list(campos),
+        "con_detalle": bool(ruta),
+    }
+
+
+class ServicioCafe:
+    """Cola de trabajos + servidor HTTP sobre el bucle de eventos actual."""
+
+    def __init__(self, config: dict | None = None):
+        if config is None:
+            config = obtener_config()
+        self.config = config
+        cfg = config.get("servicio", {})
+        self.host = cfg.get("host", "127.0.0.1")
+        self.puerto = int(cfg.get("puerto", 8765))
+        self.trabajos_paralelos = max(1, int(cfg.get("trabajos_paralelos", 2)))
+        self.max_bytes = int(float(cfg.get("max_mb", 512)) * (1 << 20))
+        self.permitir_rutas = bool(cfg.get("permitir_rutas", True))
+        self.dir_trabajos = Path(
+            cfg.get("dir_trabajos") or config["rutas"]["data_logs"] / "servicio"
+        )
+
+        self.trabajos: dict[str, Trabajo] = {}
+        self._pool: ProcessPoolExecutor | None = None
+        self._servidor: asyncio.AbstractServer | None = None
+        self._tareas: set[asyncio.Task] = set()
+
+    # ==== Ciclo de vida ====
+    async def iniciar(self):
+        self.dir_trabajos.mkdir(parents=True, exist_ok=True)
+        for archivo in sorted(self.dir_trabajos.glob("*/trabajo.json")):
+            try:
+                t = Trabajo.cargar(archivo)
+            except (OSError, ValueError, KeyError):
+                continue
+            self.trabajos[t.id] = t
+
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.trabajos_paralelos, initializer=_bajar_prioridad
+        )
+        # Los que el reinicio dejó en cola o a medias vuelven a la cola
+        pendientes = sorted(
+            (t for t in self.trabajos.values() if t.estado in (EN_COLA, PROCESANDO)),
+            key=lambda t: t.creado,
+        )
+        for t in pendientes:
+            (t.carpeta / "progreso.json").unlink(missing_ok=True)
+            t.estado, t.inicio = EN_COLA, None
+            self._encolar(t)
+        self._servidor = await asyncio.start_server(
+            self._atender, self.host, self.puerto, limit=_BLOQUE
+        )
+        self.puerto = self._servidor.sockets[0].getsockname()[1]
+        print(
+            f"[SERVICIO] Escuchando en http://{self.host}:{self.puerto} "
+            f"({self.trabajos_paralelos} trabajos en paralelo, "
+            f"{len(self.trabajos)} trabajos previos, {len(pendientes)} reencolados)"
+        )
+
+    async def servir_siempre(self):
+        await self.iniciar()
+        # SIGTERM (docker stop, systemd) cierra igual que Ctrl+C: sin esto el
+        # proceso muere y deja huérfanos a los procesos del pool
+        with contextlib.suppress(NotImplementedError):  # Windows
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGTERM, asyncio.current_task().cancel
+            )
+        try:
+            await self._servidor.serve_forever()
+        finally:
+            await self.detener()
+
+    async def detener(self):
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+            self._servidor = None
+        if self._pool is not None:
+            # Los trabajos en curso terminan; los que quedan en cola siguen
+            # en_cola en su trabajo.json y se reencolan al iniciar
+            await asyncio.to_thread(self._pool.shutdown, wait=True, cancel_futures=True)
+            self._pool = None
+            # Que los que alcanzaron a terminar guarden su resumen
+            await asyncio.gather(*self._tareas, return_exceptions=True)
+
+    # ==== Trabajos ====
+    def _nuevo_trabajo(self, origen: str) -> Trabajo:
+        id_trabajo = uuid.uuid4().hex[:12]
+        carpeta = self.dir_trabajos / id_trabajo
+        (carpeta / "entrada").mkdir(parents=True)
+        t = Trabajo(id_trabajo, carpeta, carpeta / "entrada", origen)
+        self.trabajos[id_trabajo] = t
+        return t
+
+    def _config_trabajo(self, t: Trabajo) -> dict:
+        from .ejecucion import config_para_worker
+
+        # Sin servidor de métricas: los procesos del pool chocarían por el puerto
+        config = config_para_worker(self.config)
+        rutas = config["rutas"]
+        rutas["data_raw"] = t.carpeta / "raw"
+        rutas["data_processed"] = t.carpeta / "processed"
+        rutas["data_logs"] = t.carpeta / "logs"
+        rutas["datos_adjuntos"] = rutas["datos_adjuntos_default"] = t.entrada
+        return config
+
+    def _encolar(self, t: Trabajo):
+        t.guardar()  # en_cola en disco antes de responder
+        tarea = asyncio.create_task(self._correr(t))
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+
+    async def _correr(self, t: Trabajo):
+        loop = asyncio.get_running_loop()
+        futuro = loop.run_in_executor(
+            self._pool, _ejecutar_trabajo, self._config_trabajo(t), t.entrada, t.carpeta
+        )
+        # El pool no avisa cuándo arranca: en_cola pasa a procesando al
+        # aparecer progreso.json
+        while not futuro.done():
+            if t.estado == EN_COLA and (t.carpeta / "progreso.json").exists():
+                t.estado, t.inicio = PROCESANDO, time.time()
+                await asyncio.to_thread(t.guardar)
+            await asyncio.wait([futuro], timeout=0.5)
+        try:
+            salida = futuro.result()
+            t.resumen, t.registros = salida["resumen"], salida["registros"]
+            t.estado = TERMINADO
+        except Exception as e:
+            t.estado, t.error = FALLIDO, f"{type(e).__name__}: {e}"
+        t.inicio = t.inicio or time.time()
+        t.fin = time.time()
+        await asyncio.to_thread(t.guardar)
+        print(f"[SERVICIO] Trabajo {t.id}: {t.estado}")
+
+    def _trabajo(self, id_trabajo: str) -> Trabajo:
+        t = self.trabajos.get(id_trabajo)
+        if t is None:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, f"Trabajo inexistente: {id_trabajo}")
+        return t
+
+    # ==== Rutas ====
+    async def _post_trabajos(self, cabeceras: dict, query: dict, reader) -> tuple:
+        largo = _largo(cabeceras)
+        tipo = cabeceras.get("content-type", "").split(";")[0].strip().lower()
+
+        if tipo == "application/json":
+            if largo > _MAX_JSON:
+                raise ErrorHTTP(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "JSON demasiado grande")
+            try:
+                ruta = json.loads(await reader.readexactly(largo))["ruta"]
+            except (ValueError, KeyError, TypeError):
+                raise ErrorHTTP(HTTPStatus.BAD_REQUEST, 'Se esperaba {"ruta": "..."}')
+            return await self._trabajo_desde_ruta(Path(ruta))
+
+        if largo > self.max_bytes:
+            raise ErrorHTTP(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "ZIP demasiado grande")
+        nombre = Path(query.get("nombre", ["carga.zip"])[0]).name
+        if not nombre.lower().endswith(".zip"):
+            nombre += ".zip"
+
+        t = self._nuevo_trabajo(f"subida:{nombre}")
+        destino = t.entrada / nombre
+        try:
+            # Por bloques: un ZIP grande no queda entero en memoria
+            with destino.open("wb") as f:
+                restante = largo
+                primero = True
+                while restante:
+                    bloque = await reader.read(min(_BLOQUE, restante))
+                    if not bloque:
+                        raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Cuerpo incompleto")
+                    if primero and not bloque.startswith(b"PK"):
+                        raise ErrorHTTP(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "El cuerpo no es un ZIP")
+                    primero = False
+                    f.write(bloque)
+                    restante -= len(bloque)
+            if largo == 0:
+                raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Cuerpo vacío")
+        except BaseException:
+            del self.trabajos[t.id]
+            shutil.rmtree(t.carpeta, ignore_errors=True)
+            raise
+        self._encolar(t)
+        return HTTPStatus.ACCEPTED, t.estado_json()
+
+    async def _trabajo_desde_ruta(self, ruta: Path) -> tuple:
+        if not self.permitir_rutas:
+            raise ErrorHTTP(HTTPStatus.FORBIDDEN, "Rutas locales deshabilitadas")
+        if not ruta.is_absolute():
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "La ruta debe ser absoluta")
+        if ruta.is_file() and ruta.suffix.lower() == ".zip":
+            t = self._nuevo_trabajo(f"ruta:{ruta}")
+            (t.entrada / ruta.name).symlink_to(ruta)
+        elif ruta.is_dir():
+            # La carpeta se procesa en su lugar, sin copiar los ZIP
+            t = self._nuevo_trabajo(f"ruta:{ruta}")
+            t.entrada.rmdir()
+            t.entrada = ruta
+        else:
+            raise ErrorHTTP(HTTPStatus.BAD_REQUEST, f"No es un ZIP ni una carpeta: {ruta}")
+        self._encolar(t)
+        return HTTPStatus.ACCEPTED, t.estado_json()
+
+    async def _get(self, partes: list[str], query: dict) -> tuple:
+        if partes == ["salud"]:
+            activos = sum(t.estado in (EN_COLA, PROCESANDO) for t in self.trabajos.values())
+            return HTTPStatus.OK, {"estado": "ok", "trabajos_activos": activos}
+        if partes == ["trabajos"]:
+            return HTTPStatus.OK, [t.estado_json(con_avance=False) for t in self.trabajos.values()]
+
+        t = self._trabajo(partes[1])
+        if len(partes) == 2:
+            datos = t.estado_json()
+            if t.resumen is not None:
+                datos["resumen"] = t.resumen
+            return HTTPStatus.OK, datos
+
+        if t.estado != TERMINADO:
+            raise ErrorHTTP(HTTPStatus.CONFLICT, f"El trabajo está {t.estado}")
+        if partes[2:] == ["resumen"]:
+            return HTTPStatus.OK, t.resumen
+        if partes[2:] == ["facturas"]:
+            return HTTPStatus.OK, [_registro_json(r) for r in t.registros]
+
+        # /trabajos/{id}/facturas/{id_factura}
+        candidatos = t.registros_de(partes[3])
+        if "zip" in query:
+            candidatos = [r for r in candidatos if r[1] == query["zip"][0]]
+        if not candidatos:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, f"Factura inexistente: {partes[3]}")
+        if len(candidatos) > 1:
+            raise ErrorHTTP(
+                HTTPStatus.CONFLICT,
+                f"La factura está en varios ZIP, indica ?zip=: {[r[1] for r in candidatos]}",
+            )
+        ruta = candidatos[0][5]
+        if not ruta:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, "El trabajo no guardó resultados por factura")
+        return HTTPStatus.OK, await asyncio.to_thread(_leer_detalle, ruta)
+
+    async def _despachar(self, metodo: str, ruta: str, cabeceras: dict, reader) -> tuple:
+        url = urlsplit(ruta)
+        partes = [unquote(p) for p in url.path.strip("/").split("/") if p]
+        query = parse_qs(url.query)
+
+        if partes == ["trabajos"] and metodo == "POST":
+            return await self._post_trabajos(cabeceras, query, reader)
+
+        valida = partes in (["salud"], ["trabajos"]) or (
+            partes[:1] == ["trabajos"]
+            and (
+                len(partes) == 2
+                or (len(partes) == 3 and partes[2] in ("resumen", "facturas"))
+                or (len(partes) == 4 and partes[2] == "facturas")
+            )
+        )
+        if not valida:
+            raise ErrorHTTP(HTTPStatus.NOT_FOUND, f"Ruta desconocida: {url.path}")
+        if metodo not in ("GET", "HEAD"):
+            raise ErrorHTTP(HTTPStatus.METHOD_NOT_ALLOWED, f"Método no permitido: {metodo}")
+        if _largo(cabeceras):
+            await reader.readexactly(_largo(cabeceras))
+        return await self._get(partes, query)
+
+    # ==== HTTP ====
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                peticion = await _leer_cabeceras(reader)
+                if peticion is None:
+                    break
+                metodo, ruta, version, cabeceras = peticion
+                mantener = (
+                    cabeceras.get("connection", "").lower() != "close"
+                    if version == "HTTP/1.1"
+                    else cabeceras.get("connection", "").lower() == "keep-alive"
+                )
+                try:
+                    estado, cuerpo = await self._despachar(metodo, ruta, cabeceras, reader)
+                except ErrorHTTP as e:
+                    estado, cuerpo = e.estado, {"error": str(e)}
+                    # El cuerpo de la petición puede haber quedado a medias
+                    mantener = False
+                except Exception as e:
+                    estado, cuerpo = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)}
+                    mantener = False
+                writer.write(_respuesta(estado, cuerpo, mantener, metodo == "HEAD"))
+                await writer.drain()
+                if not mantener:
+                    break
+        except ErrorHTTP as e:
+            writer.write(_respuesta(e.estado, {"error": str(e)}, False))
+            with contextlib.suppress(ConnectionError):
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            with contextlib.suppress(ConnectionError):
+                writer.close()
+                await writer.wait_closed()
+
+
+def _largo(cabeceras: dict) -> int:
+    if "chunked" in cabeceras.get("transfer-encoding", "").lower():
+        raise ErrorHTTP(HTTPStatus.LENGTH_REQUIRED, "Se requiere Content-Length")
+    try:
+        largo = int(cabeceras.get("content-length", 0))
+    except ValueError:
+        raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+    if largo < 0:
+        raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Content-Length inválido")
+    return largo
+
+
+async def _leer_cabeceras(reader: asyncio.StreamReader):
+    """(método, ruta, versión, cabeceras) o None si el cliente cerró."""
+    try:
+        linea = await reader.readline()
+    except ValueError:  # línea más larga que el límite del stream
+        raise ErrorHTTP(HTTPStatus.REQUEST_URI_TOO_LONG, "Línea de petición demasiado larga")
+    if not linea.strip():
+        return None
+    try:
+        metodo, ruta, version = linea.decode("latin-1").split()
+    except ValueError:
+        raise ErrorHTTP(HTTPStatus.BAD_REQUEST, "Línea de petición inválida")
+
+    cabeceras = {}
+    for _ in range(_MAX_CABECERAS):
+        try:
+            linea = await reader.readline()
+        except ValueError:
+            raise ErrorHTTP(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Cabecera demasiado larga")
+        if linea in (b"\r\n", b"\n", b""):
+            return metodo.upper(), ruta, version.upper(), cabeceras
+        nombre, _, valor = linea.decode("latin-1").partition(":")
+        cabeceras[nombre.strip().lower()] = valor.strip()
+    raise ErrorHTTP(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Demasiadas cabeceras")
+
+
+def _respuesta(estado: HTTPStatus, cuerpo, mantener: bool, sin_cuerpo: bool = False) -> bytes:
+    datos = json.dumps(cuerpo, ensure_ascii=False, default=str).encode("utf-8")
+    cabecera = (
+        f"HTTP/1.1 {estado.value} {estado.phrase}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(datos)}\r\n"
+        f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n"
+    ).encode("latin-1")
+    return cabecera if sin_cuerpo else cabecera + datos
+
+
+def _leer_detalle(ruta: str) -> dict:
+    from .serializacion import forma_json, leer_resultado
+
+    return forma_json(leer_resultado(ruta))
+
+
+def servir(config: dict | None = None):
+    """Bloquea sirviendo hasta Ctrl+C."""
+    servicio = ServicioCafe(config)
+    with contextlib.suppress(KeyboardInterrupt, asyncio.CancelledError):
+        asyncio.run(servicio.servir_siempre())
@@ -0,0 +1,279 @@
+"""
+Simulador "¿qué pasaría si?" de políticas de conciliación sobre el histórico.
+
+Antes de cambiar comparacion.tolerancia_montos o prioridad_fuente, cuenta
+sobre los resultados ya guardados en data/processed cuántas facturas
+quedarían en revisión con cada política candidata, sin escribir nada:
+
+    historial = cargar_historial(Path("data/processed"), workers=4)
+    actual = Politica.desde_config(CONFIG)
+    informe = simular(historial, rejilla(actual, tolerancias=["0.01", "1", "100"]), actual)
+
+Solo se leen los valores normalizados que guardó la conciliación
+(valor_pdf_normalizado / valor_xml_normalizado de cada campo); de ahí salen
+columnas numpy por factura y campo. Con las reglas de conciliar_campo:
+
+- La revisión de cufe, numero, nit_emisor y fechas no depende de la
+  política (es la que quedó guardada).
+- Un monto con valor en ambas fuentes y distinto pide revisión si la
+  diferencia, en centavos, supera la tolerancia: todas las políticas se
+  evalúan de una vez comparando la columna de diferencias contra el vector
+  de tolerancias (un arreglo políticas x facturas x montos). Los montos que
+  no son un entero de centavos se comparan aparte con Decimal.
+- La prioridad de fuentes no mueve facturas entre OK y revisión: cambia el
+  valor resuelto donde PDF y XML difieren. Se cuenta cuántos valores
+  resueltos cambiarían respecto de la política actual.
+
+El informe trae, por política, facturas en revisión, cuántas pasan de OK a
+revisión y al revés frente a la política actual, valores resueltos que
+cambian, revisiones por campo y facturas en revisión por NIT (el NIT de la
+factura tal como quedó guardado, igual para todas las políticas).
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from pathlib import Path
+from typing import NamedTuple
+
+from .conciliacion import CAMPOS, MONTOS, _tolerancia, _tolerancia_centavos
+from .normalizacion import decimal_a_centavos
+from .reconciliacion import carpetas_con_resultados, monto_guardado, rutas_resultados
+from .serializacion import leer_resultado
+
+# Campos que resuelve la prioridad "nit" (el resto, salvo fecha_vencimiento
+# y los montos fuera de tolerancia, la de "textos_libres")
+CAMPOS_NIT = ("cufe", "numero", "nit_emisor")
+_MONTOS = [CAMPOS.index(campo) for campo in MONTOS]
+# Por encima de esto la resta de dos montos podría desbordar int64
+_MAX_RESTA = 2**62
+
+
+class Politica(NamedTuple):
+    """Lo que la simulación deja variar de la configuración."""
+
+    tolerancia_montos: str
+    montos: str        # prioridad_fuente["montos"]
+    nit: str           # prioridad_fuente["nit"]
+    textos_libres: str  # prioridad_fuente["textos_libres"]
+
+    @classmethod
+    def desde_config(cls, config: dict) -> "Politica":
+        prioridad = config.get("prioridad_fuente", {})
+        return cls(
+            str(config["comparacion"]["tolerancia_montos"]),
+            prioridad.get("montos", "xml"),
+            prioridad.get("nit", "xml"),
+            prioridad.get("textos_libres", "pdf"),
+        )
+
+    def etiqueta(self) -> str:
+        return (
+            f"tol={self.tolerancia_montos} montos={self.montos} "
+            f"nit={self.nit} textos={self.textos_libres}"
+        )
+
+
+def rejilla(
+    actual: Politica,
+    tolerancias=None,
+    montos=None,
+    nit=None,
+    textos_libres=None,
+) -> list[Politica]:
+    """Todas las combinaciones; la dimensión que no venga queda como en `actual`."""
+    return [
+        Politica(str(t), m, n, x)
+        for t, m, n, x in product(
+            tolerancias or [actual.tolerancia_montos],
+            montos or [actual.montos],
+            nit or [actual.nit],
+            textos_libres or [actual.textos_libres],
+        )
+    ]
+
+
+def _columnas_carpeta(carpeta: Path) -> dict:
+    """Valores de cada factura conciliada de una carpeta de ZIP, como listas."""
+    from .agente_supervisor import AgenteSupervisor  # diferido: _registro
+
+    filas = {
+        "nit": [], "revision_guardada": [], "revision_fija": [], "difieren": [],
+        "comparables": [], "diferencia": [], "exactas": [],
+    }
+    errores = 0
+    for ruta in rutas_resultados(Path(carpeta)):
+        res = leer_resultado(ruta)
+        conciliacion = res.get("conciliacion")
+        if res.get("error") or not conciliacion:
+            errores += 1
+            continue
+        i = len(filas["nit"])
+        filas["nit"].append(AgenteSupervisor._registro(res, "", "").nit or "")
+        filas["revision_guardada"].append(bool(res.get("requiere_revision_global")))
+        fija, difieren = [], []
+        comparables, diferencia = [], []
+        for campo in CAMPOS:
+            detalle = conciliacion.get(campo) or {}
+            v_pdf = detalle.get("valor_pdf_normalizado")
+            v_xml = detalle.get("valor_xml_normalizado")
+            if campo not in MONTOS:
+                fija.append(bool(detalle.get("requiere_revision")))
+                difieren.append(
+                    campo != "fecha_vencimiento"
+                    and (v_pdf is not None or v_xml is not None)
+                    and str(v_pdf) != str(v_xml)
+                )
+                continue
+            d_pdf, d_xml = monto_guardado(v_pdf), monto_guardado(v_xml)
+            fija.append(False)
+            # Con un solo lado se aplica la prioridad de textos libres
+            difieren.append((d_pdf is None) != (d_xml is None))
+            c_pdf, c_xml = decimal_a_centavos(d_pdf), decimal_a_centavos(d_xml)
+            if d_pdf is None or d_xml is None:
+                comparables.append(False)
+                diferencia.append(0)
+            elif isinstance(c_pdf, int) and isinstance(c_xml, int) and max(abs(c_pdf), abs(c_xml)) < _MAX_RESTA:
+                comparables.append(c_pdf != c_xml)
+                diferencia.append(abs(c_pdf - c_xml))
+            elif d_pdf != d_xml:
+                # Fracción de centavo o fuera de int64: con Decimal, una por política
+                comparables.append(False)
+                diferencia.append(0)
+                filas["exactas"].append((i, len(comparables) - 1, abs(d_pdf - d_xml)))
+            else:
+                comparables.append(False)
+                diferencia.append(0)
+        filas["revision_fija"].append(fija)
+        filas["difieren"].append(difieren)
+        filas["comparables"].append(comparables)
+        filas["diferencia"].append(diferencia)
+    filas["errores"] = errores
+    return filas
+
+
+class Historial:
+    """
+    Columnas numpy de los resultados guardados (solo facturas conciliadas):
+      nit_codigo (n,), nits (NIT de cada código), revision_guardada (n,),
+      revision_fija (n, campos) y difieren (n, campos) en el orden de CAMPOS,
+      comparables y diferencia (centavos) (n, montos) en el orden de MONTOS,
+      exactas [(factura, monto, diferencia Decimal)], errores.
+    """
+
+    def __init__(self, partes: list[dict]):
+        import numpy as np
+
+        def unir(clave, dtype, ancho=None):
+            filas = [f for parte in partes for f in parte[clave]]
+            if not filas and ancho:
+                return np.zeros((0, ancho), dtype=dtype)
+            return np.array(filas, dtype=dtype)
+
+        self.errores = sum(parte["errores"] for parte in partes)
+        self.revision_guardada = unir("revision_guardada", bool)
+        self.revision_fija = unir("revision_fija", bool, len(CAMPOS))
+        self.difieren = unir("difieren", bool, len(CAMPOS))
+        self.comparables = unir("comparables", bool, len(MONTOS))
+        self.diferencia = unir("diferencia", np.int64, len(MONTOS))
+        self.exactas = []
+        desplazamiento = 0
+        for parte in partes:
+            self.exactas.extend((i + desplazamiento, a, d) for i, a, d in parte["exactas"])
+            desplazamiento += len(parte["nit"])
+        nits = [nit for parte in partes for nit in parte["nit"]]
+        self.nits, self.nit_codigo = np.unique(np.array(nits, dtype=object).astype(str), return_inverse=True)
+        self.nit_codigo = self.nit_codigo.reshape(-1)
+
+    def __len__(self) -> int:
+        return len(self.revision_guardada)
+
+
+def cargar_historial(dir_processed: Path, workers: int = 1) -> Historial:
+    """Lee los resultados de data/processed (carpetas en paralelo con workers > 1)."""
+    carpetas = carpetas_con_resultados(dir_processed)
+    if workers <= 1 or len(carpetas) <= 1:
+        partes = [_columnas_carpeta(c) for c in carpetas]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(carpetas))) as pool:
+            partes = list(pool.map(_columnas_carpeta, carpetas))
+    return Historial(partes)
+
+
+def _tolerancias_centavos(politicas: list[Politica]) -> list[int]:
+    tolerancias = []
+    for politica in politicas:
+        centavos = _tolerancia_centavos(politica.tolerancia_montos)
+        if centavos is None:
+            raise ValueError(f"Tolerancia no finita: {politica.tolerancia_montos}")
+        tolerancias.append(centavos)
+    return tolerancias
+
+
+def simular(historial: Historial, politicas: list[Politica], actual: Politica) -> dict:
+    """
+    Evalúa `actual` y todas las `politicas` sobre el historial. Devuelve
+    {"facturas", "errores", "revision_guardada", "actual", "politicas": [...]}
+    con, por política: facturas_revision, a_revision, a_ok, valores_cambiados,
+    por_campo {campo: facturas} y por_nit {nit: facturas en revisión}.
+    """
+    import numpy as np
+
+    todas = [actual, *politicas]
+    tolerancias = np.array(_tolerancias_centavos(todas), dtype=np.int64)
+
+    # (políticas, facturas, montos): fuera de tolerancia
+    fuera = historial.comparables[None, :, :] & (
+        historial.diferencia[None, :, :] > tolerancias[:, None, None]
+    )
+    for i, a, diferencia in historial.exactas:
+        for k, politica in enumerate(todas):
+            fuera[k, i, a] = diferencia > _tolerancia(politica.tolerancia_montos)
+
+    fija = historial.revision_fija.any(axis=1)
+    revision = fija[None, :] | fuera.any(axis=2)   # (políticas, facturas)
+    por_campo_fija = historial.revision_fija.sum(axis=0)
+    por_monto = fuera.sum(axis=1)                  # (políticas, montos)
+
+    # Prioridad: valores resueltos que cambian frente a la política actual
+    indice_nit = [CAMPOS.index(c) for c in CAMPOS_NIT]
+    indice_textos = [
+        i for i, c in enumerate(CAMPOS) if c not in CAMPOS_NIT and c != "fecha_vencimiento"
+    ]
+    distintos_nit = int(historial.difieren[:, indice_nit].sum())
+    distintos_textos = int(historial.difieren[:, indice_textos].sum())
+    # Monto fuera de tolerancia: se resuelve con el PDF si la prioridad no es "xml"
+    elige_pdf = fuera & np.array([p.montos != "xml" for p in todas])[:, None, None]
+
+    n_nits = len(historial.nits)
+    salida = []
+    for k, politica in enumerate(todas):
+        cambiados = int((elige_pdf[k] != elige_pdf[0]).sum())
+        if (politica.nit == "xml") != (actual.nit == "xml"):
+            cambiados += distintos_nit
+        if (politica.textos_libres == "xml") != (actual.textos_libres == "xml"):
+            cambiados += distintos_textos
+        por_nit = np.bincount(historial.nit_codigo, weights=revision[k], minlength=n_nits)
+        por_campo = {campo: int(por_campo_fija[i]) for i, campo in enumerate(CAMPOS)}
+        for j, i in enumerate(_MONTOS):
+            por_campo[CAMPOS[i]] = int(por_monto[k, j])
+        salida.append({
+            "politica": politica._asdict(),
+            "facturas_revision": int(revision[k].sum()),
+            "a_revision": int((revision[k] & ~revision[0]).sum()),
+            "a_ok": int((revision[0] & ~revision[k]).sum()),
+            "valores_cambiados": cambiados,
+            "por_campo": por_campo,
+            "por_nit": {
+                str(historial.nits[m]): int(por_nit[m]) for m in np.flatnonzero(por_nit)
+            },
+        })
+
+    return {
+        "facturas": len(historial),
+        "errores": historial.errores,
+        "revision_guardada": int(historial.revision_guardada.sum()),
+        "actual": salida[0],
+        "politicas": salida[1:],
+    }
@@ -7,12 +7,8 @@ Interfaz sencilla por consola para el proyecto CAFE.
 """
 
 from pathlib import Path
-from config import CONFIG
+from config import obtener_config
 from .agente_supervisor import AgenteSupervisor
-from dotenv import load_dotenv
-from pathlib import Path
-
-load_dotenv(Path(__file__).resolve().parent.parent / ".env")
 
 
 def seleccionar_carpeta_zips() -> Path:
@@ -44,8 +40,10 @@ def seleccionar_carpeta_zips() -> Path:
 def main():
     print("=== CAPTURA AUTOMATIZADA DE FACTURAS ELECTRÓNICAS (CAFE) ===\n")
 
-    base_dir = CONFIG["rutas"]["base_dir"]
-    ruta_defecto = CONFIG["rutas"]["datos_adjuntos_default"]
+    # Resuelve la configuración (incluye cargar el .env de la raíz del proyecto)
+    config = obtener_config()
+    base_dir = config["rutas"]["base_dir"]
+    ruta_defecto = config["rutas"]["datos_adjuntos_default"]
 
     print("Deja vacío y presiona ENTER para usar la ruta por defecto:")
     print(f"  {ruta_defecto}\n")
@@ -60,7 +58,7 @@ def main():
 
     agente = AgenteSupervisor(
         base_dir=base_dir,
-        config=CONFIG,
+        config=config,
         carpeta_zips=carpeta_zips,
     )
     resumen = agente.ciclo_principal()
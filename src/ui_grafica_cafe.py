@@ -2,8 +2,14 @@ from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
-from .agente_supervisor import AgenteSupervisor
-from config import CONFIG
+from .ui_lista_virtual import ListaVirtual, cargar_detalle
+from .ui_trabajador import (
+    INTERVALO_SONDEO_MS,
+    TrabajadorAgente,
+    cerrar_al_terminar,
+    texto_progreso,
+)
+from config import obtener_config
 
 
 class AppCAFE(tk.Tk):
@@ -11,11 +17,11 @@ class AppCAFE(tk.Tk):
         super().__init__()
 
         self.title("CAFE – Captura Automatizada de Facturas Electrónicas")
-        self.geometry("900x550")
+        self.geometry("1000x760")
         self.resizable(False, False)
 
         # Ruta por defecto (la misma que usas en la consola)
-        self.default_zip_dir: Path = CONFIG["rutas"]["datos_adjuntos_default"]
+        self.default_zip_dir: Path = obtener_config()["rutas"]["datos_adjuntos_default"]
 
         # --- ESTADO ---
         self.var_ruta_zips = tk.StringVar(value=str(self.default_zip_dir))
@@ -24,8 +30,14 @@ class AppCAFE(tk.Tk):
         self.var_revision = tk.IntVar(value=0)
         self.var_error = tk.IntVar(value=0)
 
+        self.var_estado = tk.StringVar(value="")
+        self.var_filtro = tk.StringVar(value="")
+        self._filtro_pendiente = None
+        self.trabajador: TrabajadorAgente | None = None
+
         # --- UI ---
         self._construir_ui()
+        self.protocol("WM_DELETE_WINDOW", self._al_cerrar)
 
     def _construir_ui(self):
         # Frame de selección de carpeta
@@ -45,8 +57,8 @@ class AppCAFE(tk.Tk):
         frame_mid = ttk.LabelFrame(self, text="2. Procesamiento")
         frame_mid.pack(fill="x", padx=10, pady=5)
 
-        btn_procesar = ttk.Button(frame_mid, text="Procesar ZIPs", command=self.procesar_zips)
-        btn_procesar.grid(row=0, column=0, padx=10, pady=10)
+        self.btn_procesar = ttk.Button(frame_mid, text="Procesar ZIPs", command=self.procesar_zips)
+        self.btn_procesar.grid(row=0, column=0, padx=10, pady=10)
 
         lbl_hint = ttk.Label(
             frame_mid,
@@ -55,6 +67,17 @@ class AppCAFE(tk.Tk):
         )
         lbl_hint.grid(row=0, column=1, padx=10, pady=10, sticky="w")
 
+        self.btn_cancelar = ttk.Button(
+            frame_mid, text="Cancelar", command=self.cancelar_proceso, state="disabled"
+        )
+        self.btn_cancelar.grid(row=1, column=0, padx=10, pady=(0, 10))
+
+        self.barra_progreso = ttk.Progressbar(frame_mid, mode="determinate", length=600)
+        self.barra_progreso.grid(row=1, column=1, padx=10, pady=(0, 10), sticky="w")
+
+        lbl_estado = ttk.Label(frame_mid, textvariable=self.var_estado)
+        lbl_estado.grid(row=2, column=1, padx=10, pady=(0, 10), sticky="w")
+
         # Frame de resumen
         frame_bottom = ttk.LabelFrame(self, text="3. Resultados del agente")
         frame_bottom.pack(fill="both", expand=True, padx=10, pady=10)
@@ -72,31 +95,47 @@ class AppCAFE(tk.Tk):
         ttk.Label(frame_counts, text="Facturas con error:").grid(row=0, column=4, sticky="w", padx=5)
         ttk.Label(frame_counts, textvariable=self.var_error).grid(row=0, column=5, sticky="w", padx=5)
 
-        # Subframe: listas de IDs
+        # Subframe: filtro (ID, NIT o campo a revisar)
+        frame_filtro = ttk.Frame(frame_bottom)
+        frame_filtro.pack(fill="x", pady=(0, 5))
+
+        ttk.Label(frame_filtro, text="Filtrar (ID, NIT o campo):").pack(side="left", padx=5)
+        entry_filtro = ttk.Entry(frame_filtro, textvariable=self.var_filtro, width=50)
+        entry_filtro.pack(side="left", padx=5)
+        self.var_filtro.trace_add("write", self._al_cambiar_filtro)
+
+        # Subframe: listas de IDs (virtualizadas: solo dibujan lo visible)
         frame_lists = ttk.Frame(frame_bottom)
         frame_lists.pack(fill="both", expand=True)
 
-        # Listbox de OK
+        # Lista de OK
         frame_ok = ttk.LabelFrame(frame_lists, text="IDs facturas OK")
         frame_ok.pack(side="left", fill="both", expand=True, padx=5, pady=5)
 
-        self.list_ok = tk.Listbox(frame_ok)
+        self.list_ok = ListaVirtual(frame_ok, al_seleccionar=self.mostrar_detalle)
         self.list_ok.pack(fill="both", expand=True, padx=5, pady=5)
 
-        # Listbox de revisión
+        # Lista de revisión
         frame_rev = ttk.LabelFrame(frame_lists, text="IDs facturas con revisión")
         frame_rev.pack(side="left", fill="both", expand=True, padx=5, pady=5)
 
-        self.list_revision = tk.Listbox(frame_rev)
+        self.list_revision = ListaVirtual(frame_rev, al_seleccionar=self.mostrar_detalle)
         self.list_revision.pack(fill="both", expand=True, padx=5, pady=5)
 
-        # Listbox de error
+        # Lista de error
         frame_err = ttk.LabelFrame(frame_lists, text="IDs facturas con error")
         frame_err.pack(side="left", fill="both", expand=True, padx=5, pady=5)
 
-        self.list_error = tk.Listbox(frame_err)
+        self.list_error = ListaVirtual(frame_err, al_seleccionar=self.mostrar_detalle)
         self.list_error.pack(fill="both", expand=True, padx=5, pady=5)
 
+        # Detalle de la factura seleccionada (se lee de disco al seleccionar)
+        frame_detalle = ttk.LabelFrame(frame_bottom, text="Detalle de conciliación")
+        frame_detalle.pack(fill="x", padx=5, pady=5)
+
+        self.txt_detalle = tk.Text(frame_detalle, height=8, wrap="none", state="disabled")
+        self.txt_detalle.pack(fill="x", padx=5, pady=5)
+
     # ======================= ACCIONES =======================
 
     def seleccionar_carpeta(self):
@@ -108,7 +147,10 @@ class AppCAFE(tk.Tk):
             self.var_ruta_zips.set(carpeta)
 
     def procesar_zips(self):
-        """Ejecuta el ciclo principal del agente y actualiza la UI."""
+        """Lanza el agente en segundo plano; la UI sigue respondiendo."""
+        if self.trabajador is not None and self.trabajador.activo:
+            return
+
         ruta_str = self.var_ruta_zips.get().strip()
         if not ruta_str:
             ruta_str = str(self.default_zip_dir)
@@ -123,40 +165,81 @@ class AppCAFE(tk.Tk):
             )
             return
 
-        try:
-            # Instanciamos el agente usando esta carpeta de ZIPs
-            agente = AgenteSupervisor(carpeta_zips=carpeta_zips)
-
-            # Esto ejecuta todo el flujo y devuelve el resumen global
-            resumen = agente.ciclo_principal()
-
-        except Exception as e:
-            messagebox.showerror(
-                "Error al procesar",
-                f"Ocurrió un error durante el procesamiento:\n{e}"
-            )
+        self.btn_procesar.configure(state="disabled")
+        self.btn_cancelar.configure(state="normal")
+        self.barra_progreso.configure(value=0, maximum=1)
+        self.var_estado.set("Iniciando...")
+
+        self.trabajador = TrabajadorAgente(carpeta_zips)
+        self.trabajador.iniciar()
+        self.after(INTERVALO_SONDEO_MS, self._sondear_trabajador)
+
+    def cancelar_proceso(self):
+        if self.trabajador is not None and self.trabajador.activo:
+            self.trabajador.cancelar()
+            self.btn_cancelar.configure(state="disabled")
+            self.var_estado.set("Cancelando tras la factura en curso...")
+
+    def _al_cerrar(self):
+        # Sin más eventos ni avisos: la ventana se cierra cuando el agente pare
+        trabajador, self.trabajador = self.trabajador, None
+        if trabajador is not None and trabajador.activo:
+            self.var_estado.set("Cerrando tras la factura en curso...")
+        cerrar_al_terminar(self, trabajador)
+
+    def _sondear_trabajador(self):
+        """Consume los eventos del hilo trabajador (siempre en el hilo de Tk)."""
+        if self.trabajador is None:
             return
 
+        for evento in self.trabajador.drenar():
+            tipo = evento["tipo"]
+            if tipo == "inicio":
+                self.barra_progreso.configure(maximum=max(evento["zips_total"], 1))
+            elif tipo == "zip":
+                self.barra_progreso.configure(value=evento["zip_actual"])
+                self.var_estado.set(texto_progreso(evento))
+            elif tipo == "fin":
+                self._terminar_proceso()
+                self._mostrar_resumen(evento["resumen"], evento["registros"])
+                return
+            elif tipo == "error":
+                self._terminar_proceso()
+                messagebox.showerror(
+                    "Error al procesar",
+                    f"Ocurrió un error durante el procesamiento:\n{evento['mensaje']}"
+                )
+                return
+
+        self.after(INTERVALO_SONDEO_MS, self._sondear_trabajador)
+
+    def _terminar_proceso(self):
+        self.trabajador = None
+        self.btn_procesar.configure(state="normal")
+        self.btn_cancelar.configure(state="disabled")
+
+    def _mostrar_resumen(self, resumen: dict, registros: list):
+        """Vuelca el resumen global en contadores y listas."""
         # Actualizamos contadores
         self.var_ok.set(resumen.get("facturas_ok", 0))
         self.var_revision.set(resumen.get("facturas_con_revision", 0))
         self.var_error.set(resumen.get("facturas_error", 0))
 
-        # Limpiamos listas
-        self.list_ok.delete(0, tk.END)
-        self.list_revision.delete(0, tk.END)
-        self.list_error.delete(0, tk.END)
-
-        # Rellenamos listas con los IDs
-        for fid in resumen.get("ids_facturas_ok", []):
-            self.list_ok.insert(tk.END, fid)
-
-        for fid in resumen.get("ids_facturas_con_revision", []):
-            self.list_revision.insert(tk.END, fid)
-
-        for fid in resumen.get("ids_facturas_error", []):
-            self.list_error.insert(tk.END, fid)
+        # Rellenamos listas con los registros (solo se dibuja lo visible)
+        self.list_ok.cargar([r for r in registros if r.estado == "ok"])
+        self.list_revision.cargar([r for r in registros if r.estado == "revision"])
+        self.list_error.cargar([r for r in registros if r.estado == "error"])
+
+        if resumen.get("cancelado"):
+            self.var_estado.set("Proceso cancelado: resultados parciales.")
+            messagebox.showwarning(
+                "Proceso cancelado",
+                "Se detuvo el agente. Los ZIP ya procesados quedaron guardados\n"
+                "en data/processed y el resumen parcial en data/logs."
+            )
+            return
 
+        self.var_estado.set("Proceso completado.")
         messagebox.showinfo(
             "Proceso completado",
             "El agente terminó de procesar los ZIP.\n"
@@ -165,6 +248,44 @@ class AppCAFE(tk.Tk):
         )
 
 
+    # ======================= FILTRO / DETALLE =======================
+
+    def _al_cambiar_filtro(self, *_):
+        # Pequeña espera para no refiltrar 100k filas en cada tecla
+        if self._filtro_pendiente is not None:
+            self.after_cancel(self._filtro_pendiente)
+        self._filtro_pendiente = self.after(150, self._aplicar_filtro)
+
+    def _aplicar_filtro(self):
+        self._filtro_pendiente = None
+        texto = self.var_filtro.get()
+        for lista in (self.list_ok, self.list_revision, self.list_error):
+            lista.filtrar(texto)
+
+    def mostrar_detalle(self, registro):
+        """Carga de disco la conciliación de la factura seleccionada."""
+        try:
+            res = cargar_detalle(registro)
+        except Exception as e:
+            lineas = [f"No se pudo leer {registro.ruta}:", str(e)]
+        else:
+            lineas = [f"Factura {res.get('id_factura')}  (ZIP {registro.zip})"]
+            if res.get("error"):
+                lineas.append(f"ERROR: {res['error']}")
+            for campo, det in (res.get("conciliacion") or {}).items():
+                marca = "REVISAR" if det.get("requiere_revision") else "ok"
+                lineas.append(
+                    f"[{marca:>7}] {campo:<18} PDF={det.get('valor_pdf_normalizado')}  "
+                    f"XML={det.get('valor_xml_normalizado')}  "
+                    f"-> {det.get('valor_resuelto')} ({det.get('fuente_elegida')})"
+                )
+
+        self.txt_detalle.configure(state="normal")
+        self.txt_detalle.delete("1.0", tk.END)
+        self.txt_detalle.insert(tk.END, "\n".join(lineas))
+        self.txt_detalle.configure(state="disabled")
+
+
 def main():
     app = AppCAFE()
     app.mainloop()
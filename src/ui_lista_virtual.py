@@ -0,0 +1,153 @@
+"""
+Lista virtualizada para la interfaz Tk.
+
+Un tk.Listbox con 100k `insert` tarda y consume mucha memoria. Aquí el
+Listbox solo contiene las filas VISIBLES (una ventana de ~15 renglones);
+al desplazarse se reescribe esa ventana a partir de un arreglo en memoria.
+
+- Las filas son RegistroFactura (id, zip, estado, nit, campos, ruta).
+- filtrar(texto) busca en ID, NIT y campos a revisar (sin distinguir
+  mayúsculas) y solo guarda los índices que coinciden.
+- Al seleccionar una fila se llama al callback con su RegistroFactura;
+  el detalle se carga de disco en ese momento (cargar_detalle).
+"""
+
+from __future__ import annotations
+
+import tkinter as tk
+from tkinter import font as tkfont
+from tkinter import ttk
+
+from .serializacion import leer_resultado
+
+
+def texto_fila(reg) -> str:
+    """Renglón que se muestra para un RegistroFactura."""
+    texto = reg.id_factura
+    if reg.nit:
+        texto += f"  ·  NIT {reg.nit}"
+    if reg.campos_a_revisar:
+        texto += f"  ·  {', '.join(reg.campos_a_revisar)}"
+    return texto
+
+
+def cargar_detalle(reg) -> dict:
+    """Lee (bajo demanda) el resultado completo de una factura, en
+    cualquiera de los formatos de salida (ver serializacion.py)."""
+    return leer_resultado(reg.ruta)
+
+
+class ListaVirtual(ttk.Frame):
+    def __init__(self, master, alto: int = 15, al_seleccionar=None, **kwargs):
+        super().__init__(master, **kwargs)
+
+        self.alto = alto
+        self.al_seleccionar = al_seleccionar
+
+        self._filas: list = []          # arreglo de respaldo (RegistroFactura)
+        self._buscables: list[str] = []  # texto en minúsculas por fila
+        self._visibles: list[int] | range = range(0)  # índices tras el filtro
+        self._inicio = 0                 # primera fila visible (en _visibles)
+        self._filtro = ""
+
+        self.lista = tk.Listbox(
+            self, height=alto, activestyle="none", exportselection=False
+        )
+        self.scroll = ttk.Scrollbar(self, orient="vertical", command=self._al_scroll)
+        self.lista.pack(side="left", fill="both", expand=True)
+        self.scroll.pack(side="right", fill="y")
+
+        self.lista.bind("<<ListboxSelect>>", self._al_click)
+        self.lista.bind("<MouseWheel>", self._al_rueda)
+        self.lista.bind("<Button-4>", lambda e: self._mover(-3))
+        self.lista.bind("<Button-5>", lambda e: self._mover(3))
+        self.lista.bind("<Up>", self._al_tecla)
+        self.lista.bind("<Down>", self._al_tecla)
+        self.lista.bind("<Configure>", self._al_redimensionar)
+
+    # ==== Datos ====
+    def cargar(self, filas: list):
+        self._filas = list(filas)
+        self._buscables = [
+            f"{r.id_factura} {r.nit or ''} {' '.join(r.campos_a_revisar)}".lower()
+            for r in self._filas
+        ]
+        self.filtrar(self._filtro)
+
+    def filtrar(self, texto: str):
+        self._filtro = texto.strip().lower()
+        if not self._filtro:
+            self._visibles = range(len(self._filas))
+        else:
+            f = self._filtro
+            self._visibles = [i for i, t in enumerate(self._buscables) if f in t]
+        self._inicio = 0
+        self._render()
+
+    def __len__(self):
+        return len(self._visibles)
+
+    # ==== Dibujo ====
+    def _render(self):
+        total = len(self._visibles)
+        self._inicio = max(0, min(self._inicio, total - self.alto))
+
+        fin = min(self._inicio + self.alto, total)
+        self.lista.delete(0, tk.END)
+        for pos in range(self._inicio, fin):
+            self.lista.insert(tk.END, texto_fila(self._filas[self._visibles[pos]]))
+
+        if total:
+            self.scroll.set(self._inicio / total, fin / total)
+        else:
+            self.scroll.set(0.0, 1.0)
+
+    def _mover(self, delta: int):
+        self._inicio += delta
+        self._render()
+
+    # ==== Eventos ====
+    def _al_scroll(self, accion, cantidad, unidad=None):
+        if accion == "moveto":
+            self._inicio = int(float(cantidad) * len(self._visibles))
+            self._render()
+        elif accion == "scroll":
+            paso = self.alto if unidad == "pages" else 1
+            self._mover(int(cantidad) * paso)
+
+    def _al_rueda(self, event):
+        self._mover(-3 if event.delta > 0 else 3)
+
+    def _al_tecla(self, event):
+        sel = self.lista.curselection()
+        if not sel:
+            return
+        # En los bordes de la ventana, desplazar en lugar de perder la selección
+        if event.keysym == "Down" and sel[0] == self.lista.size() - 1:
+            self._mover(1)
+            self._seleccionar_local(self.lista.size() - 1)
+            return "break"
+        if event.keysym == "Up" and sel[0] == 0 and self._inicio > 0:
+            self._mover(-1)
+            self._seleccionar_local(0)
+            return "break"
+
+    def _seleccionar_local(self, idx: int):
+        self.lista.selection_clear(0, tk.END)
+        self.lista.selection_set(idx)
+        self._al_click()
+
+    def _al_redimensionar(self, event):
+        alto_linea = tkfont.Font(font=self.lista.cget("font")).metrics("linespace") + 1
+        alto = max(1, event.height // alto_linea)
+        if alto != self.alto:
+            self.alto = alto
+            self._render()
+
+    def _al_click(self, event=None):
+        sel = self.lista.curselection()
+        if not sel or self.al_seleccionar is None:
+            return
+        pos = self._inicio + sel[0]
+        if pos < len(self._visibles):
+            self.al_seleccionar(self._filas[self._visibles[pos]])
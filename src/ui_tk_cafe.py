@@ -1,10 +1,15 @@
 import os
 from pathlib import Path
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
 
-from config import CONFIG
-from .agente_supervisor import AgenteSupervisor
+from config import obtener_config
+from .ui_trabajador import (
+    INTERVALO_SONDEO_MS,
+    TrabajadorAgente,
+    cerrar_al_terminar,
+    texto_progreso,
+)
 
 # Paleta de colores similar a tus mockups
 COLOR_HEADER = "#204A83"
@@ -27,6 +32,7 @@ class CafeApp(tk.Tk):
 
         self.selected_folder: Path | None = None
         self.ultimo_resumen: dict | None = None
+        self.trabajador: TrabajadorAgente | None = None
 
         # ====== LAYOUT GENERAL ======
         self._build_header()
@@ -38,6 +44,7 @@ class CafeApp(tk.Tk):
 
         # Pantalla inicial
         self.show_pantalla_carga()
+        self.protocol("WM_DELETE_WINDOW", self._al_cerrar)
 
     # ------------------------------------------------------------------
     # HEADER / FOOTER
@@ -133,7 +140,7 @@ class CafeApp(tk.Tk):
 
     def seleccionar_carpeta(self):
         # Ruta por defecto de datos_adjuntos (la que tienes en CONFIG)
-        default_dir = CONFIG["rutas"]["datos_adjuntos_default"]
+        default_dir = obtener_config()["rutas"]["datos_adjuntos_default"]
         initial_dir = str(default_dir.parent) if default_dir.exists() else str(Path.home())
 
         carpeta = filedialog.askdirectory(
@@ -187,16 +194,103 @@ class CafeApp(tk.Tk):
         if self.selected_folder is None:
             messagebox.showerror("Error", "Primero debes seleccionar una carpeta.")
             return
+        if self.trabajador is not None and self.trabajador.activo:
+            return
 
-        try:
-            agente = AgenteSupervisor(carpeta_zips=self.selected_folder)
-            resumen = agente.ciclo_principal()
-            self.ultimo_resumen = resumen
+        # El agente corre en un hilo aparte; la ventana sigue respondiendo
+        self.trabajador = TrabajadorAgente(carpeta_zips=self.selected_folder)
+        self.show_pantalla_procesando()
+        self.trabajador.iniciar()
+        self.after(INTERVALO_SONDEO_MS, self._sondear_trabajador)
+
+    def cancelar_proceso(self):
+        if self.trabajador is not None and self.trabajador.activo:
+            self.trabajador.cancelar()
+            self.btn_cancelar.configure(state="disabled")
+            self.var_estado.set("Cancelando tras la factura en curso...")
+
+    def _al_cerrar(self):
+        # Sin más eventos ni avisos: la ventana se cierra cuando el agente pare
+        trabajador, self.trabajador = self.trabajador, None
+        if trabajador is not None and trabajador.activo:
+            self.var_estado.set("Cerrando tras la factura en curso...")
+        cerrar_al_terminar(self, trabajador)
+
+    def _sondear_trabajador(self):
+        """Consume los eventos del hilo trabajador (siempre en el hilo de Tk)."""
+        if self.trabajador is None:
+            return
 
-            self.show_pantalla_resultados()
+        for evento in self.trabajador.drenar():
+            tipo = evento["tipo"]
+            if tipo == "inicio":
+                self.barra_progreso.configure(maximum=max(evento["zips_total"], 1))
+            elif tipo == "zip":
+                self.barra_progreso.configure(value=evento["zip_actual"])
+                self.var_estado.set(texto_progreso(evento))
+            elif tipo == "fin":
+                self.trabajador = None
+                self.ultimo_resumen = evento["resumen"]
+                self.show_pantalla_resultados()
+                if self.ultimo_resumen.get("cancelado"):
+                    messagebox.showwarning(
+                        "Proceso cancelado",
+                        "Se detuvo el agente. Los resultados mostrados son parciales.",
+                    )
+                return
+            elif tipo == "error":
+                self.trabajador = None
+                self.show_pantalla_archivo_cargado()
+                messagebox.showerror("Error al procesar", evento["mensaje"])
+                return
+
+        self.after(INTERVALO_SONDEO_MS, self._sondear_trabajador)
+
+    # ------------------------------------------------------------------
+    # PANTALLA 2b – PROCESANDO (progreso + cancelar)
+    # ------------------------------------------------------------------
+    def show_pantalla_procesando(self):
+        self._clear_content()
+
+        marco = tk.Frame(self.content_frame, bg=COLOR_BODY)
+        marco.pack(expand=True)
 
-        except Exception as e:
-            messagebox.showerror("Error al procesar", str(e))
+        lbl = tk.Label(
+            marco,
+            text="PROCESANDO FACTURAS...",
+            bg=COLOR_BOTON,
+            fg=COLOR_BOTON_TEXTO,
+            font=("Segoe UI", 16, "bold"),
+            width=30,
+            height=2,
+        )
+        lbl.pack(pady=40)
+
+        self.barra_progreso = ttk.Progressbar(marco, mode="determinate", length=450)
+        self.barra_progreso.pack(pady=10)
+
+        self.var_estado = tk.StringVar(value="Iniciando...")
+        lbl_estado = tk.Label(
+            marco,
+            textvariable=self.var_estado,
+            bg=COLOR_BODY,
+            fg=COLOR_TEXTO_NORMAL,
+            font=("Segoe UI", 11),
+        )
+        lbl_estado.pack(pady=5)
+
+        self.btn_cancelar = tk.Button(
+            marco,
+            text="CANCELAR",
+            command=self.cancelar_proceso,
+            bg=COLOR_BOTON,
+            fg=COLOR_BOTON_TEXTO,
+            font=("Segoe UI", 12, "bold"),
+            padx=20,
+            pady=8,
+            relief="flat",
+        )
+        self.btn_cancelar.pack(pady=20)
 
     # ------------------------------------------------------------------
     # PANTALLA 3 – RESULTADOS / PROCESAMIENTO
@@ -346,7 +440,7 @@ class CafeApp(tk.Tk):
     # Abrir carpeta con JSON/CSV procesados
     # ------------------------------------------------------------------
     def abrir_carpeta_resultados(self):
-        processed_dir = CONFIG["rutas"]["data_processed"]
+        processed_dir = obtener_config()["rutas"]["data_processed"]
 
         if not processed_dir.exists():
             messagebox.showwarning(
@@ -0,0 +1,120 @@
+"""
+Ejecución del agente en segundo plano para las interfaces Tk.
+
+Tk no es thread-safe: el hilo trabajador NUNCA toca widgets. Solo deja
+eventos (dicts) en una cola, y la interfaz los consume con after().
+
+Eventos:
+  - {"tipo": "inicio", "zips_total": N}
+  - {"tipo": "factura", "id_factura": ..., "estado": ...}
+  - {"tipo": "zip", "zip_actual": n, "zips_total": N, "facturas": k,
+     "facturas_por_seg": x, "eta_seg": s}
+  - {"tipo": "fin", "resumen": {...}, "registros": [RegistroFactura, ...]}
+  - {"tipo": "error", "mensaje": "..."}
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from pathlib import Path
+
+from .agente_supervisor import AgenteSupervisor
+
+# Cada cuánto la interfaz revisa la cola (ms)
+INTERVALO_SONDEO_MS = 100
+
+
+class TrabajadorAgente:
+    """Corre AgenteSupervisor.ciclo_principal en un hilo aparte."""
+
+    def __init__(self, carpeta_zips: Path, config: dict | None = None):
+        self.carpeta_zips = carpeta_zips
+        self.config = config
+        self.eventos: queue.Queue = queue.Queue()
+        self.evento_cancelar = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def cancelar(self):
+        """Pide al agente que pare tras la factura en curso."""
+        self.evento_cancelar.set()
+
+    @property
+    def activo(self) -> bool:
+        return self._hilo.is_alive()
+
+    def drenar(self) -> list[dict]:
+        """Devuelve (sin bloquear) todos los eventos pendientes."""
+        eventos = []
+        while True:
+            try:
+                eventos.append(self.eventos.get_nowait())
+            except queue.Empty:
+                return eventos
+
+    def _ejecutar(self):
+        try:
+            agente = AgenteSupervisor(config=self.config, carpeta_zips=self.carpeta_zips)
+            resumen = agente.ciclo_principal(
+                progreso=self.eventos.put,
+                cancelar=self.evento_cancelar,
+            )
+            self.eventos.put({
+                "tipo": "fin",
+                "resumen": resumen,
+                "registros": agente.registros,
+            })
+        except Exception as e:
+            self.eventos.put({"tipo": "error", "mensaje": str(e)})
+
+
+def cerrar_al_terminar(ventana, trabajador: TrabajadorAgente | None):
+    """
+    Cierra la ventana sin cortar al agente a mitad de una escritura: el
+    hilo es daemon y muere con el proceso. Si sigue activo, lo cancela,
+    desactiva la ventana y la destruye cuando el hilo terminó.
+    """
+    import tkinter as tk
+
+    if trabajador is None or not trabajador.activo:
+        ventana.destroy()
+        return
+    trabajador.cancelar()
+    ventana.protocol("WM_DELETE_WINDOW", lambda: None)
+
+    pendientes = list(ventana.winfo_children())
+    while pendientes:
+        widget = pendientes.pop()
+        pendientes.extend(widget.winfo_children())
+        try:
+            widget.configure(state="disabled")
+        except tk.TclError:
+            pass  # marcos y etiquetas sin "state"
+
+    def esperar():
+        if trabajador.activo:
+            ventana.after(INTERVALO_SONDEO_MS, esperar)
+        else:
+            ventana.destroy()
+
+    esperar()
+
+
+def _mmss(segundos: float | None) -> str:
+    if segundos is None:
+        return "--:--"
+    segundos = int(segundos)
+    return f"{segundos // 60:02d}:{segundos % 60:02d}"
+
+
+def texto_progreso(evento: dict) -> str:
+    """Línea de estado legible para un evento de tipo 'zip'."""
+    return (
+        f"ZIP {evento['zip_actual']} de {evento['zips_total']}  ·  "
+        f"{evento['facturas']} facturas  ·  "
+        f"{evento['facturas_por_seg']:.1f} fact/s  ·  "
+        f"ETA {_mmss(evento['eta_seg'])}"
+    )